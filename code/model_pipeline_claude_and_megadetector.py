@@ -18,14 +18,25 @@ import os
 import sys
 import subprocess
 import warnings
+import io
+import copy
+import inspect
+import importlib
+import shutil
 import json
+import hashlib
+import sqlite3
 import base64
 import random
 import time
+import asyncio
+import threading
+import collections
+import concurrent.futures
 from datetime import datetime
-from PIL import Image, ExifTags
-import pandas as pd
-import matplotlib.pyplot as plt
+STARTED = time.perf_counter()       # Cold-start clock (before the heavy imports)
+from PIL import Image, ImageOps
+import numpy as np
 import requests
 import torch
 
@@ -45,21 +56,111 @@ OUTPUT_FOLDER = '/content/drive/MyDrive/trail_camera_results'
 # Processing settings
 VALIDATION_SIZE = 100              # Number of images for validation phase
 MAX_PRODUCTION = 1000              # Max images to process (None = all)
+BATCH_SIZE = 8                     # Images per batched MegaDetector pass
+PREFETCH_WORKERS = 4               # Threads reading/decoding upcoming images
+PREFETCH_DEPTH = 32                # Max images read ahead of inference (bounds memory)
+DECODE_DRAFT = True                # Decode JPEGs at reduced DCT scale (1/2, 1/4, 1/8) for detection
+DECODE_SIZE = 1280                 # Smallest long side kept by draft decoding (MegaDetector input)
+FULL_RES_CROP_PX = 0               # Re-crop people shorter than this (decoded px) at full resolution (0 = off)
+EXIF_READ_BYTES = 65536            # Bytes read per file for the EXIF timestamp (APP1 is at most 64 KB)
+EXIF_WORKERS = 16                  # Parallel readers when scanning timestamps for many files
 DEVICE = "cuda" if torch.cuda.is_available() else "cpu"
 
 # Model parameters
 MD_THRESHOLD = 0.35                # MegaDetector confidence threshold
 CLIP_MIN_CONFIDENCE = 0.40         # CLIP classification confidence
+CLIP_BATCH_SIZE = 32               # Person crops per CLIP forward pass
+CLIP_MODEL_NAME = "openai/clip-vit-base-patch32"
+
+# CLIP prompt ensembles: each class embedding is the mean of its prompts
+CLIP_PROMPTS = {
+    'Child': ["a photo of a child", "a trail camera photo of a child", "a photo of a kid"],
+    'Man': ["a photo of a man", "a trail camera photo of a man", "a photo of an adult man"],
+    'Woman': ["a photo of a woman", "a trail camera photo of a woman", "a photo of an adult woman"],
+}
+CLIP_LABEL_MAP = {'Child': 'Child', 'Man': 'Adult', 'Woman': 'Adult'}
+
+# Empty-frame prefilter (per-site background model)
+PREFILTER = False                  # Skip the models on frames with no foreground change
+PREFILTER_SIZE = (64, 48)          # Downsampled grayscale size used for comparison
+PREFILTER_PIXEL_DELTA = 25         # Gray-level change that counts as foreground
+PREFILTER_MIN_FOREGROUND = 0.01    # Changed-pixel fraction needed to run the models
+PREFILTER_WARMUP = 10              # Frames per site/time bucket before skipping starts
+PREFILTER_HOUR_BUCKET = 3          # Hours per time-of-day background
+
+# Burst / sequence grouping
+SEQUENCE_GROUPING = False          # Group burst frames per site by EXIF time
+SEQUENCE_GAP_SECONDS = 30          # Max gap between frames of one sequence
+SEQUENCE_CLAUDE_TOP_K = 1          # Frames per sequence sent to Claude (most people first)
+
+# Detector-first cascade
+CASCADE = False                    # Call Claude only on frames where MegaDetector fires
+CASCADE_THRESHOLD = 0.15           # Recall-oriented MegaDetector confidence that triggers Claude
+CASCADE_CLASSES = (1, 2)           # MegaDetector classes that trigger Claude (0 animal, 1 person, 2 vehicle)
+CASCADE_AUDIT_RATE = 0.05          # Fraction of untriggered frames still sent to Claude
+
+# Uncertainty-gated escalation
+ESCALATION = False                 # Call Claude only when the pipeline is unsure
+ESCALATE_BOX_CONF = 0.50           # Escalate when a counted person box is below this confidence
+ESCALATE_CLIP_MARGIN = 0.20        # Escalate when a crop's Adult/Child margin is below this
+ESCALATE_MIN_BOX_CONF = 0.15       # Also escalate on an uncounted person box above this (below MD_THRESHOLD)
+
+# Region-of-interest requests
+ROI_MODE = False                   # Send Claude only the MegaDetector regions, not the full frame
+ROI_MIN_CONF = 0.15                # MegaDetector boxes (any class) above this go into the ROI
+ROI_PADDING = 0.25                 # Padding around each box, as a fraction of its size
+ROI_MAX_AREA = 0.6                 # Send the full frame when regions cover more than this
+ROI_MAX_DIM = 1024                 # Longest side of the ROI image sent to Claude
 
 # Claude API settings
 CLAUDE_API_KEY_NAME = 'CLAUDE_API_KEY'  # Name of userdata key in Colab
 CLAUDE_MODEL = "claude-haiku-4-5-20251001"
 CLAUDE_MAX_TOKENS = 400
+CLAUDE_CONCURRENCY = 8                  # Max Claude requests in flight
+CLAUDE_MAX_RETRIES = 5                  # Retries on 429/5xx (jittered backoff)
+CLAUDE_MAX_COST_USD = None              # Stop calling Claude after this spend (None = no limit)
+CLAUDE_MAX_RUN_TOKENS = None            # Stop after this many input+output tokens (None = no limit)
+CLAUDE_PRICE_PER_MTOK = (1.00, 5.00)    # USD per million (input, output) tokens for CLAUDE_MODEL
 
 # Output settings
 VALIDATION_SHEETS = True           # Generate visual validation sheets
-SAVE_INTERVAL = 50                 # Save checkpoint every N images
+SAVE_INTERVAL = 50                 # Sync the result journal to disk every N images
+OUTPUT_FORMAT = "csv"              # "csv", "parquet" (partitioned by Site/Date) or "both"
 TIMESTAMP = datetime.now().strftime("%Y%m%d_%H%M%S")
+RANDOM_SEED = 42                   # Fixed image order, so --resume picks the same files
+RESUME = '--resume' in sys.argv    # Continue the previous run from its journal
+JOURNAL_PATH = os.path.join(OUTPUT_FOLDER, 'results_journal_full_pipeline.jsonl')
+# WAL needs a local disk (not the Drive mount); it is rebuilt from the journal on --resume
+RESULTS_DB_PATH = os.path.join('/content' if os.path.isdir('/content') else OUTPUT_FOLDER,
+                               'results_full_pipeline.sqlite')
+
+# Cache settings
+CACHE_FOLDER = os.path.join(OUTPUT_FOLDER, 'cache')  # Label bank + result cache (reused across runs)
+RESULT_CACHE = True                # Reuse results for unchanged images and settings
+CACHE_MAX_ENTRIES = 500000         # Oldest-used results are evicted beyond this
+
+# Model files
+OFFLINE_MODELS = True              # Keep weights, YOLOv5 code and CLIP locally; no network after the first run
+MODEL_FOLDER = os.path.join(CACHE_FOLDER, 'models')
+
+# Inference backend
+BACKEND = "torch"                  # "torch" or "onnx" (ONNX Runtime on CPU, exported on first use)
+ONNX_INTRA_THREADS = None          # Threads within one operator (None = torch's thread count)
+ONNX_INTER_THREADS = 1             # Operators run side by side (>1 enables parallel execution)
+ONNX_OPSET = 17
+
+# File manifest
+MANIFEST = True                    # Index input folders (recursively) in a SQLite manifest
+MANIFEST_PATH = os.path.join(CACHE_FOLDER, 'manifest.sqlite')
+MANIFEST_HASH = False              # Also store SHA-256 of new/changed files (reads each file once)
+ONLY_UNPROCESSED = False           # Skip files this script processed in an earlier run
+RESCAN = '--rescan' in sys.argv    # List every folder again, even if its mtime is unchanged
+
+# Watch mode (long-running, for continuous uploads)
+WATCH = '--watch' in sys.argv      # Keep models loaded and process new uploads as they arrive
+WATCH_POLL_SECONDS = 10            # Rescan interval when file events are unavailable
+WATCH_SETTLE_SECONDS = 3           # A file must be unchanged this long before processing
+WATCH_MAX_BATCH = 32               # Max new images per micro-batch
 
 # ===========================================================================
 # SETUP & INITIALIZATION
@@ -82,87 +183,1019 @@ except:
 os.makedirs(OUTPUT_FOLDER, exist_ok=True)
 print(f"✓ Output directory: {OUTPUT_FOLDER}")
 
-# Install required packages
-print("\n🛠️ Installing dependencies...")
+# Packages are imported by the stage that needs them; pip only runs for missing ones
 def install(package):
     subprocess.check_call([sys.executable, "-m", "pip", "install", "-q", package])
 
-packages = ["urllib3<2.0.0", "ultralytics", "anthropic", "transformers", "requests"]
-for pkg in packages:
+def require(module, package=None):
+    """Import a module, pip-installing its package first if it is missing."""
     try:
-        __import__(pkg.split('[')[0].replace('-', '_'))
+        return importlib.import_module(module)
     except ImportError:
-        print(f"  Installing {pkg}...")
-        install(pkg)
+        print(f"  Installing {package or module}...")
+        install(package or module)
+        importlib.invalidate_caches()
+        return importlib.import_module(module)
 
-from transformers import CLIPProcessor, CLIPModel
 try:
-    from anthropic import Anthropic
+    require('anthropic')
+    from anthropic import AsyncAnthropic, APIStatusError, APIConnectionError
     CLAUDE_AVAILABLE = True
-except ImportError:
+except (ImportError, subprocess.CalledProcessError):
     print("⚠ Anthropic library not available - Claude will be skipped")
     CLAUDE_AVAILABLE = False
 
 warnings.filterwarnings("ignore")
-print(f"✓ Dependencies installed")
 print(f"✓ Device: {DEVICE.upper()}")
 
 # ===========================================================================
 # UTILITY FUNCTIONS
 # ===========================================================================
 
-def encode_image(image_path):
-    """Encode image to base64 for API."""
-    with open(image_path, "rb") as f:
-        return base64.b64encode(f.read()).decode('utf-8')
+def encode_image(image):
+    """Encode image bytes (or the file at a path) to base64 for API."""
+    if not isinstance(image, (bytes, bytearray)):
+        with open(image, "rb") as f:
+            image = f.read()
+    return base64.b64encode(image).decode('utf-8')
 
-def resize_for_api(image_path, max_dim=1500):
-    """Resize image if needed for API processing."""
+def resize_for_api(image, max_dim=1500):
+    """JPEG bytes for API processing, resized in memory if needed.
+    
+    Accepts a path or the file bytes. Small JPEGs are returned unchanged;
+    anything else is decoded in JPEG draft mode (libjpeg scales by 1/2, 1/4
+    or 1/8 while decoding), downscaled and re-encoded. Nothing touches disk,
+    so concurrent calls are safe.
+    """
     try:
-        img = Image.open(image_path)
+        if not isinstance(image, (bytes, bytearray)):
+            with open(image, "rb") as f:
+                image = f.read()
+        img = Image.open(io.BytesIO(image))
+        if img.format == 'JPEG' and max(img.size) <= max_dim:
+            return image
+        
+        img.draft('RGB', (max_dim, max_dim))
+        img = ImageOps.exif_transpose(img)
         if img.mode != 'RGB':
             img = img.convert('RGB')
-        
         if max(img.size) > max_dim:
             img.thumbnail((max_dim, max_dim))
-            temp_path = "/tmp/temp_resized.jpg"
-            img.save(temp_path, quality=85)
-            return temp_path
-        return image_path
+        
+        buffer = io.BytesIO()
+        img.save(buffer, format='JPEG', quality=85)
+        return buffer.getvalue()
     except Exception as e:
-        print(f"Error resizing {image_path}: {e}")
+        print(f"Error resizing image: {e}")
         return None
 
-def get_exif_data(image_path):
-    """Extract date and time from image EXIF data."""
+def read_exif_datetime(source, max_bytes=None):
+    """EXIF DateTimeOriginal (tag 0x9003) as a datetime, or None if missing.
+    
+    Reads only the first EXIF_READ_BYTES of the file (source is a path or the
+    file bytes), finds the APP1 Exif segment and walks the TIFF IFDs straight
+    to the tag - no PIL, no full EXIF dict.
+    """
     try:
-        img = Image.open(image_path)
-        exif = img._getexif()
-        if not exif:
-            return "Unknown", "Unknown"
-        
-        for tag, value in ExifTags.TAGS.items():
-            if value == 'DateTimeOriginal':
-                if tag in exif:
-                    dt = str(exif[tag]).split(' ')
-                    if len(dt) == 2:
-                        return dt[0].replace(':', '/'), dt[1]
-    except:
+        if isinstance(source, (bytes, bytearray)):
+            head = source[:max_bytes or EXIF_READ_BYTES]
+        else:
+            with open(source, 'rb') as f:
+                head = f.read(max_bytes or EXIF_READ_BYTES)
+        
+        if head[:2] != b'\xff\xd8':
+            return None
+        
+        # APP1 sits among the markers before the image data
+        pos = 2
+        while pos + 4 <= len(head):
+            if head[pos] != 0xFF:
+                return None
+            marker = head[pos + 1]
+            if marker == 0xFF:
+                pos += 1
+                continue
+            if marker in (0xD9, 0xDA):
+                return None
+            length = int.from_bytes(head[pos + 2:pos + 4], 'big')
+            if marker == 0xE1 and head[pos + 4:pos + 10] == b'Exif\x00\x00':
+                return _tiff_datetime_original(head[pos + 10:pos + 2 + length])
+            pos += 2 + length
+    except Exception:
         pass
     
-    return "Unknown", "Unknown"
+    return None
+
+def _tiff_datetime_original(tiff):
+    """DateTimeOriginal from a TIFF-structured EXIF block (raises if malformed)."""
+    order = {b'II': 'little', b'MM': 'big'}[tiff[:2]]
+    
+    def u16(offset):
+        return int.from_bytes(tiff[offset:offset + 2], order)
+    
+    def u32(offset):
+        return int.from_bytes(tiff[offset:offset + 4], order)
+    
+    def find(ifd, tag):
+        for entry in range(ifd + 2, ifd + 2 + 12 * u16(ifd), 12):
+            if u16(entry) == tag:
+                return entry
+        return None
+    
+    # IFD0 -> Exif sub-IFD (0x8769) -> DateTimeOriginal (0x9003, ASCII)
+    exif_ifd = find(u32(4), 0x8769)
+    if exif_ifd is None:
+        return None
+    entry = find(u32(exif_ifd + 8), 0x9003)
+    if entry is None:
+        return None
+    count = u32(entry + 4)
+    offset = entry + 8 if count <= 4 else u32(entry + 8)
+    text = tiff[offset:offset + count].split(b'\x00')[0].decode('ascii').strip()
+    return datetime.strptime(text, "%Y:%m:%d %H:%M:%S")
+
+def read_exif_datetimes(paths, workers=None):
+    """read_exif_datetime for many files in parallel; results in input order."""
+    with concurrent.futures.ThreadPoolExecutor(workers or EXIF_WORKERS) as pool:
+        return list(pool.map(read_exif_datetime, paths))
+
+def get_exif_data(image):
+    """(date, time) strings from EXIF DateTimeOriginal, or (None, None).
+    
+    image is a path or the file bytes; only the header is read.
+    """
+    stamp = read_exif_datetime(image)
+    if stamp is None:
+        return None, None
+    return stamp.strftime("%Y/%m/%d"), stamp.strftime("%H:%M:%S")
+
+# ===========================================================================
+# IMAGE CONTEXT
+# ===========================================================================
+
+class ImageContext:
+    """One image, read once and decoded once, shared by every stage.
+    
+    Bytes, EXIF and the decoded RGB image are loaded lazily on first use, so
+    a cache hit only pays for reading and hashing the file. Call release()
+    once the row is written to drop the buffers.
+    
+    With DECODE_DRAFT the decoded image may be smaller than the file; boxes
+    passed to crop() are always in full-resolution pixels.
+    """
+    
+    def __init__(self, image_path, data=None):
+        self.path = image_path
+        self.name = os.path.basename(image_path)
+        self._lock = threading.Lock()
+        self._data = data  # Bytes already in memory (e.g. an upload); read from path otherwise
+        self._hash = None
+        self._exif = None
+        self._image = None
+        self._full_image = None
+        self.scale = 1.0
+    
+    @property
+    def data(self):
+        """Raw file bytes (read once)."""
+        with self._lock:
+            if self._data is None:
+                with open(self.path, 'rb') as f:
+                    self._data = f.read()
+            return self._data
+    
+    @property
+    def sha256(self):
+        """Content hash used as the result cache key."""
+        if self._hash is None:
+            self._hash = hashlib.sha256(self.data).hexdigest()
+        return self._hash
+    
+    @property
+    def exif(self):
+        """(date, time) from EXIF DateTimeOriginal (header only, no decode)."""
+        if self._exif is None:
+            self._exif = get_exif_data(self.data)
+        return self._exif
+    
+    @property
+    def image(self):
+        """Decoded, orientation-corrected RGB image (decoded once).
+        
+        With DECODE_DRAFT, JPEGs are decoded at the smallest DCT scale whose
+        long side is still at least DECODE_SIZE; `scale` maps its pixels back
+        to the full-resolution image.
+        """
+        data = self.data
+        with self._lock:
+            if self._image is None:
+                img = Image.open(io.BytesIO(data))
+                full_long = max(img.size)
+                if DECODE_DRAFT and full_long > DECODE_SIZE:
+                    ratio = DECODE_SIZE / full_long
+                    img.draft('RGB', (int(img.width * ratio + 0.999), int(img.height * ratio + 0.999)))
+                self._image = ImageOps.exif_transpose(img).convert("RGB")
+                self.scale = full_long / max(self._image.size)
+            return self._image
+    
+    @property
+    def full_image(self):
+        """Full-resolution image for small crops (decoded once, only when asked)."""
+        img = self.image
+        if self.scale == 1.0:
+            return img
+        data = self.data
+        with self._lock:
+            if self._full_image is None:
+                self._full_image = ImageOps.exif_transpose(Image.open(io.BytesIO(data))).convert("RGB")
+            return self._full_image
+    
+    @property
+    def array(self):
+        """RGB image as an HxWx3 uint8 array."""
+        return np.asarray(self.image)
+    
+    def crop(self, box):
+        """Crop a full-resolution (x1, y1, x2, y2) box, clipped to the image.
+        
+        Boxes shorter than FULL_RES_CROP_PX in the decoded image are cut from
+        the full-resolution image instead, so distant people keep their detail.
+        """
+        img = self.image
+        scale = self.scale
+        if scale > 1 and FULL_RES_CROP_PX and (box[3] - box[1]) / scale < FULL_RES_CROP_PX:
+            img, scale = self.full_image, 1.0
+        x1, y1, x2, y2 = (int(v / scale) for v in box)
+        return img.crop((
+            max(0, x1), max(0, y1),
+            min(img.width, x2), min(img.height, y2)
+        ))
+    
+    def thumbnail(self, max_dim=800):
+        """Small copy for validation sheets, kept after release().
+        
+        Falls back to the path if the image can't be decoded.
+        """
+        try:
+            thumb = self.image.copy()
+        except Exception:
+            return self.path
+        thumb.thumbnail((max_dim, max_dim))
+        return thumb
+    
+    def api_jpeg(self, max_dim=1500):
+        """Base64 JPEG for the Claude API, downscaled in memory if needed.
+        
+        Works from the file bytes with a draft-mode decode, so it does not
+        need (or wait for) the full-resolution image.
+        """
+        data = resize_for_api(self.data, max_dim)
+        if data is None:
+            raise ValueError(f"could not prepare {self.name} for the API")
+        return encode_image(data)
+    
+    def roi_jpeg(self, boxes, padding=0.25, max_dim=1024, max_area=0.6):
+        """Base64 JPEG of just the boxed regions, or None when it would not help.
+        
+        Boxes are padded and overlapping ones merged. A single region is sent
+        as a plain crop; several are packed in rows on a gray canvas. Returns
+        None when the regions cover more than max_area of the frame.
+        """
+        img = self.image
+        width, height = img.size
+        regions = []
+        # Full-resolution boxes to decoded-image pixels
+        boxes = [[v / self.scale for v in box] for box in boxes]
+        for x1, y1, x2, y2 in boxes:
+            pad_x = max(16, (x2 - x1) * padding)
+            pad_y = max(16, (y2 - y1) * padding)
+            regions.append([
+                max(0, x1 - pad_x), max(0, y1 - pad_y),
+                min(width, x2 + pad_x), min(height, y2 + pad_y)
+            ])
+        
+        # Merge overlapping regions until none overlap
+        merged = True
+        while merged:
+            merged = False
+            for a in range(len(regions)):
+                for b in range(a + 1, len(regions)):
+                    ra, rb = regions[a], regions[b]
+                    if ra[0] < rb[2] and rb[0] < ra[2] and ra[1] < rb[3] and rb[1] < ra[3]:
+                        regions[a] = [min(ra[0], rb[0]), min(ra[1], rb[1]),
+                                      max(ra[2], rb[2]), max(ra[3], rb[3])]
+                        del regions[b]
+                        merged = True
+                        break
+                if merged:
+                    break
+        
+        area = sum((r[2] - r[0]) * (r[3] - r[1]) for r in regions)
+        if not regions or area > max_area * width * height:
+            return None
+        
+        tiles = [img.crop(tuple(int(round(v)) for v in r)) for r in regions]
+        if len(tiles) == 1:
+            mosaic = tiles[0]
+        else:
+            # Shelf packing: rows about as wide as the square root of the tile area
+            gap = 8
+            row_width = max(max(t.width for t in tiles), int(area ** 0.5))
+            rows, row = [], []
+            for tile in sorted(tiles, key=lambda t: -t.height):
+                if row and sum(t.width + gap for t in row) + tile.width > row_width:
+                    rows.append(row)
+                    row = []
+                row.append(tile)
+            rows.append(row)
+            
+            mosaic = Image.new('RGB', (
+                max(sum(t.width for t in r) + gap * (len(r) - 1) for r in rows),
+                sum(max(t.height for t in r) for r in rows) + gap * (len(rows) - 1)
+            ), (128, 128, 128))
+            y = 0
+            for r in rows:
+                x = 0
+                for tile in r:
+                    mosaic.paste(tile, (x, y))
+                    x += tile.width + gap
+                y += max(t.height for t in r) + gap
+        
+        if max(mosaic.size) > max_dim:
+            mosaic.thumbnail((max_dim, max_dim))
+        buffer = io.BytesIO()
+        mosaic.save(buffer, format='JPEG', quality=85)
+        return base64.b64encode(buffer.getvalue()).decode('utf-8')
+    
+    def load(self, decode=True):
+        """Read and parse EXIF now, and decode unless decode=False (e.g. from a prefetch thread).
+        
+        Errors are left for the consuming stage to report.
+        """
+        try:
+            self.exif
+            if decode:
+                self.image
+        except Exception:
+            pass
+    
+    def release(self):
+        """Drop the file bytes and decoded image."""
+        with self._lock:
+            self._data = None
+            self._image = None
+            self._full_image = None
+
+# ===========================================================================
+# PREFETCH
+# ===========================================================================
+
+def batch_slices(items, batch_size):
+    """(start, end) ranges of about batch_size items that never split a sequence."""
+    slices, start = [], 0
+    while start < len(items):
+        end = min(start + batch_size, len(items))
+        sequence = items[end - 1].get('sequence')
+        while sequence is not None and end < len(items) and items[end].get('sequence') == sequence:
+            end += 1
+        slices.append((start, end))
+        start = end
+    return slices
+
+class Prefetcher:
+    """Reads, parses EXIF and decodes upcoming batches in a thread pool.
+    
+    With a `decode(ctx)` predicate, only images it returns True for are
+    decoded ahead (e.g. result cache misses); the rest are decoded later,
+    and only if a stage needs the pixels. At most `depth` images (but always
+    at least one batch) are held ahead of inference, which bounds memory.
+    Time spent waiting for a batch that was not ready yet is recorded as
+    I/O wait.
+    """
+    
+    def __init__(self, workers=None, depth=None, decode=None):
+        self.pool = concurrent.futures.ThreadPoolExecutor(max_workers=workers or PREFETCH_WORKERS)
+        self.depth = depth or PREFETCH_DEPTH
+        self.decode = decode
+        self.io_wait = 0.0
+        self.stalls = 0
+        self.batch_count = 0
+    
+    def batches(self, items, batch_size):
+        """Yield (start, batch, contexts) with every context already loaded."""
+        slices = iter(batch_slices(items, batch_size))
+        pending = collections.deque()
+        queued = 0
+        
+        while True:
+            # Keep the read-ahead window full
+            while not pending or queued < self.depth:
+                start, end = next(slices, (None, None))
+                if start is None:
+                    break
+                batch = items[start:end]
+                futures = [self.pool.submit(self._load, item['path']) for item in batch]
+                pending.append((start, batch, futures))
+                queued += len(batch)
+            
+            if not pending:
+                return
+            
+            start, batch, futures = pending.popleft()
+            queued -= len(batch)
+            
+            waited = time.perf_counter()
+            contexts = [future.result() for future in futures]
+            waited = time.perf_counter() - waited
+            
+            self.batch_count += 1
+            self.io_wait += waited
+            if waited > 0.01:
+                self.stalls += 1
+            
+            yield start, batch, contexts
+    
+    def _load(self, image_path):
+        ctx = ImageContext(image_path)
+        try:
+            decode = self.decode is None or self.decode(ctx)
+        except Exception:
+            decode = True  # Let the consuming stage report unreadable files
+        ctx.load(decode=decode)
+        return ctx
+    
+    def report(self):
+        """Print how often inference waited on storage."""
+        if not self.batch_count:
+            return
+        print(f"  Inference waited on I/O in {self.stalls}/{self.batch_count} batches "
+              f"({self.stalls / self.batch_count:.0%}), {self.io_wait:.1f} sec total")
+    
+    def close(self):
+        self.pool.shutdown(wait=False)
+
+# ===========================================================================
+# EMPTY-FRAME PREFILTER
+# ===========================================================================
+
+class BackgroundModel:
+    """Running background per site and time of day, from tiny grayscale frames.
+    
+    A frame whose downsampled image barely differs from its site/hour
+    background is marked empty, so neither model has to run on it.
+    """
+    
+    def __init__(self):
+        self.backgrounds = {}
+    
+    def check(self, site, ctx):
+        """Return {'foreground': fraction, 'empty': bool}, or None if unreadable."""
+        try:
+            small = ctx.image.convert('L').resize(PREFILTER_SIZE, Image.BILINEAR)
+            _, time_str = ctx.exif
+        except Exception:
+            return None
+        
+        # Remove overall brightness so exposure changes don't count as motion
+        frame = np.asarray(small, dtype=np.float32)
+        frame -= frame.mean()
+        
+        try:
+            bucket = int(time_str.split(':')[0]) // PREFILTER_HOUR_BUCKET
+        except (ValueError, AttributeError):
+            bucket = 'unknown'
+        key = (site, bucket)
+        
+        background, count = self.backgrounds.get(key, (None, 0))
+        if background is None:
+            foreground = 1.0
+        else:
+            foreground = float((np.abs(frame - background) > PREFILTER_PIXEL_DELTA).mean())
+        
+        empty = count >= PREFILTER_WARMUP and foreground < PREFILTER_MIN_FOREGROUND
+        
+        # Learn from background-like frames (and everything while warming up)
+        if background is None:
+            self.backgrounds[key] = (frame, 1)
+        elif count < PREFILTER_WARMUP or foreground < PREFILTER_MIN_FOREGROUND:
+            alpha = max(1.0 / (count + 1), 0.05)
+            self.backgrounds[key] = ((1 - alpha) * background + alpha * frame, count + 1)
+        
+        return {'foreground': round(foreground, 4), 'empty': empty}
+
+background_model = BackgroundModel()
+
+# ===========================================================================
+# SEQUENCE GROUPING
+# ===========================================================================
+
+def build_sequences(files):
+    """Group frames into bursts: same site, EXIF times within SEQUENCE_GAP_SECONDS.
+    
+    Sets item['sequence'] on every file and returns the sequences (lists of
+    items in time order). Frames without a timestamp are their own sequence.
+    Timestamps already known from the file manifest are not read again.
+    """
+    missing = [item for item in files if 'timestamp' not in item]
+    for item, stamp in zip(missing, read_exif_datetimes([item['path'] for item in missing])):
+        item['timestamp'] = stamp
+    stamps = [item['timestamp'] for item in files]
+    
+    by_site = collections.defaultdict(list)
+    sequences = []
+    for item, stamp in zip(files, stamps):
+        if stamp is None:
+            sequences.append([item])
+        else:
+            by_site[item['site']].append((stamp, item))
+    
+    for frames in by_site.values():
+        frames.sort(key=lambda frame: frame[0])
+        current, last = [], None
+        for stamp, item in frames:
+            if current and (stamp - last).total_seconds() > SEQUENCE_GAP_SECONDS:
+                sequences.append(current)
+                current = []
+            current.append(item)
+            last = stamp
+        sequences.append(current)
+    
+    counters = collections.Counter()
+    for sequence in sequences:
+        site = sequence[0]['site']
+        counters[site] += 1
+        for item in sequence:
+            item['sequence'] = f"{site}_{counters[site]:05d}"
+    
+    return sequences
+
+def summarize_sequences(results_df):
+    """One row per sequence: frame count, time span and max count per column.
+    
+    The max over frames is the number of visitors seen together, so a burst
+    of one hiker counts once instead of once per frame.
+    """
+    import pandas as pd
+    count_columns = [
+        c for c in results_df.columns
+        if c.startswith(('Claude_', 'Pipeline_')) and pd.api.types.is_numeric_dtype(results_df[c])
+        and not c.startswith('Claude_Tokens')
+    ]
+    df = results_df.dropna(subset=['Sequence_ID'])
+    stamps = pd.to_datetime(
+        df['Date'].astype(str) + ' ' + df['Time'].astype(str),
+        format='%Y/%m/%d %H:%M:%S', errors='coerce'
+    )
+    grouped = df.assign(Timestamp=stamps).groupby('Sequence_ID')
+    summary = grouped[count_columns].max()
+    summary.insert(0, 'Site', grouped['Site'].first())
+    summary.insert(1, 'Frames', grouped.size())
+    summary.insert(2, 'Start', grouped['Timestamp'].min())
+    summary.insert(3, 'End', grouped['Timestamp'].max())
+    return summary.reset_index()
+
+# ===========================================================================
+# RESULT CACHE
+# ===========================================================================
+
+def cache_namespace(*params):
+    """Short fingerprint of the model identity and parameters."""
+    return hashlib.sha1(json.dumps(params, default=str).encode('utf-8')).hexdigest()[:16]
+
+class ResultCache:
+    """On-disk result cache keyed by image content hash + model parameters.
+    
+    Entries are evicted least-recently-used once more than max_entries are
+    stored. Safe to share between the Claude thread and the main thread.
+    Hits only note the last-use time in memory; those times and new entries
+    are committed every COMMIT_INTERVAL changes and on flush(), so a rerun
+    over cached images does not write once per image.
+    """
+    
+    COMMIT_INTERVAL = 200
+    
+    def __init__(self, path, max_entries=None):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.max_entries = max_entries or CACHE_MAX_ENTRIES
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS results "
+            "(key TEXT PRIMARY KEY, value TEXT NOT NULL, used REAL NOT NULL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS results_used ON results (used)")
+        self.conn.commit()
+        self.size = self.conn.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+        self.touched = {}
+        self.pending = 0
+        self.hits = {}
+        self.misses = {}
+    
+    def get(self, key, kind):
+        """Return the cached result dict, or None."""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT value FROM results WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses[kind] = self.misses.get(kind, 0) + 1
+                return None
+            self.touched[key] = time.time()
+            self.hits[kind] = self.hits.get(kind, 0) + 1
+            if len(self.touched) >= self.COMMIT_INTERVAL:
+                self._write_back()
+            return json.loads(row[0])
+    
+    def put(self, key, value):
+        """Store a result dict, evicting the least recently used entries."""
+        with self.lock:
+            row = (json.dumps(value), time.time(), key)
+            cursor = self.conn.execute("UPDATE results SET value = ?, used = ? WHERE key = ?", row)
+            if not cursor.rowcount:
+                self.conn.execute("INSERT INTO results (value, used, key) VALUES (?, ?, ?)", row)
+                self.size += 1
+            self.touched.pop(key, None)
+            self.pending += 1
+            
+            if self.size > self.max_entries:
+                self._write_back()  # Eviction order needs the buffered use times
+                self.conn.execute(
+                    "DELETE FROM results WHERE key IN "
+                    "(SELECT key FROM results ORDER BY used LIMIT ?)",
+                    (self.size - self.max_entries,)
+                )
+                self.size = self.max_entries
+            if self.pending >= self.COMMIT_INTERVAL:
+                self._write_back()
+    
+    def flush(self):
+        """Commit buffered use times and new entries."""
+        with self.lock:
+            self._write_back()
+    
+    def _write_back(self):
+        if self.touched:
+            self.conn.executemany(
+                "UPDATE results SET used = ? WHERE key = ?",
+                [(used, key) for key, used in self.touched.items()]
+            )
+            self.touched = {}
+        self.conn.commit()
+        self.pending = 0
+    
+    def contains(self, key):
+        """True if the key is cached (not counted as a hit or miss)."""
+        with self.lock:
+            return self.conn.execute(
+                "SELECT 1 FROM results WHERE key = ?", (key,)
+            ).fetchone() is not None
+    
+    def report(self):
+        """Print hit/miss counters per model."""
+        for kind in sorted(set(self.hits) | set(self.misses)):
+            hits, misses = self.hits.get(kind, 0), self.misses.get(kind, 0)
+            rate = hits / (hits + misses) if hits + misses else 0
+            print(f"  {kind}: {hits} hits / {misses} misses ({rate:.0%} hit rate)")
+
+# ===========================================================================
+# FILE MANIFEST
+# ===========================================================================
+
+def file_sha256(path):
+    """SHA-256 of a file's contents, read in 1 MB chunks."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class FileManifest:
+    """Persistent SQLite index of the image files under every site folder.
+    
+    Holds (site, relative path, size, mtime, content hash, EXIF time) per
+    file, found recursively with os.scandir. Rescans only stat directories:
+    a folder whose mtime is unchanged is not listed again, so new card dumps
+    are picked up without re-walking Drive. Files are also marked processed
+    per run mode, so unprocessed files of a site are one query away.
+    """
+    
+    def __init__(self, path, mode):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.mode = mode
+        self.roots = {}
+        self.paths = {}
+        self.pending = []
+        self.conn = sqlite3.connect(path, timeout=30)
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS files (
+                site TEXT, relpath TEXT, dir TEXT, size INTEGER, mtime REAL,
+                sha256 TEXT, exif_ts TEXT, PRIMARY KEY (site, relpath));
+            CREATE INDEX IF NOT EXISTS files_dir ON files (site, dir);
+            CREATE TABLE IF NOT EXISTS dirs (
+                site TEXT, relpath TEXT, mtime REAL, PRIMARY KEY (site, relpath));
+            CREATE TABLE IF NOT EXISTS processed (
+                site TEXT, relpath TEXT, mode TEXT, size INTEGER, mtime REAL,
+                PRIMARY KEY (site, relpath, mode));
+        """)
+    
+    def scan(self, site, root, full=False):
+        """Bring one site up to date; returns (new or changed, removed) file counts.
+        
+        full=True lists every folder even if its mtime is unchanged (catches
+        files rewritten in place, which do not touch the folder mtime).
+        """
+        self.roots[site] = root
+        known = dict(self.conn.execute("SELECT relpath, mtime FROM dirs WHERE site = ?", (site,)))
+        children = collections.defaultdict(list)
+        for rel in known:
+            if rel:
+                children[os.path.dirname(rel)].append(rel)
+        
+        seen, listed = set(), []
+        stack = ['']
+        while stack:
+            rel = stack.pop()
+            folder = os.path.join(root, rel)
+            try:
+                mtime = os.stat(folder).st_mtime
+            except OSError:
+                continue
+            seen.add(rel)
+            if not full and known.get(rel) == mtime:
+                # Unchanged folder: visit its known subfolders without listing it
+                stack.extend(children[rel])
+                continue
+            
+            entries = {}
+            with os.scandir(folder) as it:
+                for entry in it:
+                    child = os.path.join(rel, entry.name)
+                    if entry.is_dir():
+                        stack.append(child)
+                    elif entry.name.lower().endswith(('.jpg', '.jpeg', '.png')):
+                        stat = entry.stat()
+                        entries[child] = (stat.st_size, stat.st_mtime)
+            listed.append((rel, mtime, entries))
+        
+        changed, removed = [], []
+        for rel, _, entries in listed:
+            stored = {
+                relpath: (size, mtime) for relpath, size, mtime in self.conn.execute(
+                    "SELECT relpath, size, mtime FROM files WHERE site = ? AND dir = ?", (site, rel)
+                )
+            }
+            changed += [(rel, relpath, *stat) for relpath, stat in entries.items()
+                        if stored.get(relpath) != stat]
+            removed += [relpath for relpath in stored if relpath not in entries]
+        gone = [rel for rel in known if rel not in seen]
+        for rel in gone:
+            removed += [relpath for (relpath,) in self.conn.execute(
+                "SELECT relpath FROM files WHERE site = ? AND dir = ?", (site, rel)
+            )]
+        
+        # Header-only EXIF (and optionally a content hash) for new or changed files
+        paths = [os.path.join(root, relpath) for _, relpath, _, _ in changed]
+        stamps = read_exif_datetimes(paths)
+        if MANIFEST_HASH:
+            with concurrent.futures.ThreadPoolExecutor(EXIF_WORKERS) as pool:
+                hashes = list(pool.map(file_sha256, paths))
+        else:
+            hashes = [None] * len(paths)
+        
+        with self.conn:
+            self.conn.executemany("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?)", [
+                (site, relpath, rel, size, mtime, digest, stamp.isoformat() if stamp else None)
+                for (rel, relpath, size, mtime), stamp, digest in zip(changed, stamps, hashes)
+            ])
+            self.conn.executemany("DELETE FROM files WHERE site = ? AND relpath = ?",
+                                  [(site, relpath) for relpath in removed])
+            self.conn.executemany("DELETE FROM dirs WHERE site = ? AND relpath = ?",
+                                  [(site, rel) for rel in gone])
+            self.conn.executemany("INSERT OR REPLACE INTO dirs VALUES (?, ?, ?)",
+                                  [(site, rel, mtime) for rel, mtime, _ in listed])
+        
+        return len(changed), len(removed)
+    
+    def files(self, site, unprocessed=False):
+        """Image items for a scanned site, ordered by relative path.
+        
+        With unprocessed=True, files this run mode already processed (at
+        their current size and mtime) are left out.
+        """
+        query = "SELECT f.relpath, f.exif_ts FROM files f"
+        params = []
+        if unprocessed:
+            query += (" LEFT JOIN processed p ON p.site = f.site AND p.relpath = f.relpath"
+                      " AND p.mode = ? AND p.size = f.size AND p.mtime = f.mtime")
+            params.append(self.mode)
+        query += " WHERE f.site = ?" + (" AND p.relpath IS NULL" if unprocessed else "")
+        params.append(site)
+        
+        items = []
+        for relpath, exif_ts in self.conn.execute(query + " ORDER BY f.relpath", params):
+            path = os.path.join(self.roots[site], relpath)
+            self.paths[path] = (site, relpath)
+            items.append({
+                'site': site,
+                'name': relpath,
+                'path': path,
+                'timestamp': datetime.fromisoformat(exif_ts) if exif_ts else None
+            })
+        return items
+    
+    def mark_processed(self, path):
+        """Record a finished file; written on the next flush()."""
+        if path in self.paths:
+            self.pending.append((self.mode, *self.paths[path]))
+    
+    def flush(self):
+        if not self.pending:
+            return
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO processed "
+                "SELECT site, relpath, ?, size, mtime FROM files WHERE site = ? AND relpath = ?",
+                self.pending
+            )
+        self.pending = []
+    
+    def close(self):
+        self.flush()
+        self.conn.close()
 
 # ===========================================================================
 # CLAUDE MODEL CLASS
 # ===========================================================================
 
+class RateController:
+    """AIMD concurrency window and token/cost budget for Claude calls.
+    
+    The window grows by ~1 request per window of successful calls while
+    latency stays near its best observed value. It halves on a 429 and
+    shrinks by a quarter when latency climbs well above its best, at most
+    once per round-trip: responses to requests sent before the last
+    decrease do not decrease it again.
+    
+    Every request in flight holds a worst-case reservation (RESERVE_INPUT_TOKENS
+    in, CLAUDE_MAX_TOKENS out) against the budget until its usage is known,
+    so concurrent requests cannot overshoot it.
+    Only used from the ClaudeModel event loop thread, so no locking is needed.
+    """
+    
+    # One image (the API scales large ones to ~1600 tokens) plus the prompt
+    RESERVE_INPUT_TOKENS = 2000
+    # Back off once smoothed latency exceeds this multiple of the best seen
+    SLOW_LATENCY = 3.0
+    
+    def __init__(self, max_concurrency):
+        self.max_window = max(1, max_concurrency)
+        self.window = float(min(4, self.max_window))
+        self.in_flight = 0
+        self.condition = None
+        self.decreased_at = float('-inf')
+        
+        self.requests = 0
+        self.rate_limited = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.latency_ewma = None
+        self.min_latency = None
+    
+    @property
+    def cost(self):
+        """Spend so far in USD."""
+        return self._price(self.input_tokens, self.output_tokens)
+    
+    @staticmethod
+    def _price(input_tokens, output_tokens):
+        price_in, price_out = CLAUDE_PRICE_PER_MTOK
+        return (input_tokens * price_in + output_tokens * price_out) / 1e6
+    
+    def _fits(self, requests):
+        """True if spend so far plus `requests` worst-case reservations stays within budget."""
+        input_tokens = self.input_tokens + requests * self.RESERVE_INPUT_TOKENS
+        output_tokens = self.output_tokens + requests * CLAUDE_MAX_TOKENS
+        if CLAUDE_MAX_COST_USD is not None and \
+                self._price(input_tokens, output_tokens) > CLAUDE_MAX_COST_USD:
+            return False
+        if CLAUDE_MAX_RUN_TOKENS is not None and \
+                input_tokens + output_tokens > CLAUDE_MAX_RUN_TOKENS:
+            return False
+        return True
+    
+    @property
+    def exhausted(self):
+        """True once the budget cannot cover one more worst-case request."""
+        return not self._fits(1)
+    
+    async def acquire(self):
+        """Wait for a free slot in the current window and reserve its budget.
+        
+        Requests that do not fit next to the reservations in flight wait for
+        those to settle. Returns False, without taking a slot, once the budget
+        cannot cover the request even with nothing in flight.
+        """
+        if self.condition is None:
+            self.condition = asyncio.Condition()
+        async with self.condition:
+            await self.condition.wait_for(
+                lambda: self.in_flight < int(self.window) and
+                        (self.in_flight == 0 or self._fits(self.in_flight + 1))
+            )
+            if not self._fits(self.in_flight + 1):
+                return False
+            self.in_flight += 1
+            return True
+    
+    async def release(self):
+        """Free the slot and its reservation (actual usage is in on_success)."""
+        async with self.condition:
+            self.in_flight -= 1
+            self.condition.notify_all()
+    
+    def on_success(self, started, usage):
+        """Record a completed call; adjust the window from its latency.
+        
+        started is the request's time.perf_counter() send time.
+        """
+        self.requests += 1
+        if usage is not None:
+            self.input_tokens += getattr(usage, 'input_tokens', 0) or 0
+            self.output_tokens += getattr(usage, 'output_tokens', 0) or 0
+        
+        latency = time.perf_counter() - started
+        self.min_latency = latency if self.min_latency is None else min(self.min_latency, latency)
+        self.latency_ewma = latency if self.latency_ewma is None else \
+            0.8 * self.latency_ewma + 0.2 * latency
+        
+        if self.latency_ewma > self.SLOW_LATENCY * self.min_latency:
+            self._decrease(started, 0.75)
+        elif self.latency_ewma <= 2 * self.min_latency:
+            self.window = min(self.max_window, self.window + 1 / self.window)
+    
+    def on_rate_limited(self, started):
+        """Record a 429; multiplicative decrease."""
+        self.rate_limited += 1
+        self._decrease(started, 0.5)
+    
+    def _decrease(self, started, factor):
+        """Shrink the window, unless it already shrank after this request was sent."""
+        if started < self.decreased_at:
+            return
+        self.window = max(1.0, self.window * factor)
+        self.decreased_at = time.perf_counter()
+    
+    def summary(self):
+        """Per-run totals for the usage report."""
+        return {
+            'model': CLAUDE_MODEL,
+            'requests': self.requests,
+            'rate_limited': self.rate_limited,
+            'input_tokens': self.input_tokens,
+            'output_tokens': self.output_tokens,
+            'cost_usd': round(self.cost, 4),
+            'avg_latency_sec': round(self.latency_ewma or 0, 2),
+            'final_window': round(self.window, 1),
+            'budget_exhausted': self.exhausted,
+        }
+
 class ClaudeModel:
     """Claude MLLM for activity detection."""
     
-    def __init__(self, api_key=None):
+    PROMPT = """Analyze this trail camera image for wildlife monitoring.
+Return a valid JSON object with integer counts for:
+- total_people: total number of people visible
+- adults: number of adult people
+- children: number of children
+- bicycles: number of bicycles
+- dogs: number of dogs
+- strollers: number of strollers/pushchairs
+- wheelchairs: number of wheelchairs
+- big_backpacks: number of large backpacks (hiking gear)
+- cars: number of cars/vehicles
+- motorcycles: number of motorcycles
+- atvs: number of ATVs/off-road vehicles
+
+Return ONLY valid JSON, no other text:
+{"total_people":0, "adults":0, "children":0, "bicycles":0, "dogs":0, "strollers":0, "wheelchairs":0, "big_backpacks":0, "cars":0, "motorcycles":0, "atvs":0}
+"""
+    
+    # Prepended to PROMPT when only the detected regions are sent
+    ROI_NOTE = """This image shows regions cut from one trail camera frame, separated by gray gaps.
+The regions do not overlap: count everything visible across all of them.
+
+"""
+    
+    def __init__(self, api_key=None, cache=None):
         """Initialize Claude client."""
         self.ready = False
         self.client = None
+        self.cache = cache
+        self.cache_namespace = cache_namespace(
+            'claude', CLAUDE_MODEL, CLAUDE_MAX_TOKENS, self.PROMPT, self.ROI_NOTE
+        )
+        self.controller = RateController(CLAUDE_CONCURRENCY)
+        self._budget_warned = False
         
         if not CLAUDE_AVAILABLE:
             print("⚠ Anthropic library not available")
@@ -182,77 +1215,257 @@ class ClaudeModel:
                     print("⚠ Claude API key not provided")
                     return
             
-            self.client = Anthropic(api_key=api_key)
+            # Retries are handled in _request so backoff stays under our control
+            self.client = AsyncAnthropic(api_key=api_key, max_retries=0)
             self.model = CLAUDE_MODEL
+            
+            # Private event loop thread: works the same in scripts and in
+            # Colab, where the notebook already runs its own loop
+            self._loop = asyncio.new_event_loop()
+            threading.Thread(target=self._loop.run_forever, daemon=True).start()
+            
             self.ready = True
             print("✓ Claude API initialized")
         except Exception as e:
             print(f"⚠ Claude initialization failed: {e}")
     
-    def predict(self, image_path):
+    def predict(self, image):
         """Analyze image with Claude."""
+        return self.predict_batch([image])[0]
+    
+    def predict_batch(self, images, regions=None):
+        """Analyze several images concurrently; results are in input order."""
+        return self.submit_batch(images, regions).result()
+    
+    def submit_batch(self, images, regions=None):
+        """Start analyzing images (paths or ImageContexts) in the background.
+        
+        regions optionally gives MegaDetector boxes per image; Claude then
+        sees only those regions (see ImageContext.roi_jpeg). Returns a
+        concurrent.futures.Future resolving to one result dict per image, in
+        input order, so other work can run while requests are in flight.
+        """
         if not self.ready:
-            return self._empty_result()
+            future = concurrent.futures.Future()
+            future.set_result([self._empty_result('unavailable') for _ in images])
+            return future
+        contexts = [img if isinstance(img, ImageContext) else ImageContext(img) for img in images]
+        regions = regions or [None] * len(contexts)
+        return asyncio.run_coroutine_threadsafe(self._predict_all(contexts, regions), self._loop)
+    
+    async def _predict_all(self, contexts, regions):
+        return await asyncio.gather(*[
+            self._predict_one(ctx, boxes) for ctx, boxes in zip(contexts, regions)
+        ])
+    
+    async def _predict_one(self, ctx, boxes=None):
+        roi_data = None
+        if boxes:
+            try:
+                roi_data = await asyncio.to_thread(
+                    ctx.roi_jpeg, boxes, ROI_PADDING, ROI_MAX_DIM, ROI_MAX_AREA
+                )
+            except Exception as e:
+                print(f"   ⚠ ROI failed, sending full frame ({ctx.name}): {e}")
+        
+        key = None
+        if self.cache is not None:
+            try:
+                # Hashing and SQLite block, so they stay off the event loop
+                key, cached = await asyncio.to_thread(self._cache_lookup, ctx, roi_data)
+                if cached is not None:
+                    return {**cached, 'status': 'cached', 'input_tokens': 0, 'output_tokens': 0,
+                            'roi': roi_data is not None}
+            except Exception as e:
+                print(f"   ⚠ Cache lookup failed ({ctx.name}): {e}")
+        
+        if self.controller.exhausted:
+            if not self._budget_warned:
+                print("\n   💸 Claude budget reached - remaining images get no Claude call")
+                self._budget_warned = True
+            return self._empty_result('budget')
         
-        prompt = """Analyze this trail camera image for wildlife monitoring.
-Return a valid JSON object with integer counts for:
-- total_people: total number of people visible
-- adults: number of adult people
-- children: number of children
-- bicycles: number of bicycles
-- dogs: number of dogs
-- strollers: number of strollers/pushchairs
-- wheelchairs: number of wheelchairs
-- big_backpacks: number of large backpacks (hiking gear)
-- cars: number of cars/vehicles
-- motorcycles: number of motorcycles
-- atvs: number of ATVs/off-road vehicles
-
-Return ONLY valid JSON, no other text:
-{"total_people":0, "adults":0, "children":0, "bicycles":0, "dogs":0, "strollers":0, "wheelchairs":0, "big_backpacks":0, "cars":0, "motorcycles":0, "atvs":0}
-"""
         try:
-            processed_path = resize_for_api(image_path)
-            if not processed_path:
-                return self._empty_result()
-            
-            msg = self.client.messages.create(
-                model=self.model,
-                max_tokens=CLAUDE_MAX_TOKENS,
-                messages=[{
-                    "role": "user",
-                    "content": [
-                        {
-                            "type": "image",
-                            "source": {
-                                "type": "base64",
-                                "media_type": "image/jpeg",
-                                "data": encode_image(processed_path)
-                            }
-                        },
-                        {"type": "text", "text": prompt}
-                    ]
-                }]
-            )
+            image_data = roi_data or await asyncio.to_thread(ctx.api_jpeg)
+            msg = await self._request(image_data, roi=roi_data is not None)
+            if msg is None:
+                return self._empty_result('budget')
             
             txt = msg.content[0].text
             json_str = txt[txt.find('{'):txt.rfind('}')+1]
-            return json.loads(json_str)
+            result = json.loads(json_str)
+            if key is not None:
+                try:
+                    await asyncio.to_thread(self.cache.put, key, result)
+                except sqlite3.Error as e:
+                    print(f"   ⚠ Result cache write failed: {e}")
+            result['status'] = 'ok'
+            result['input_tokens'] = getattr(msg.usage, 'input_tokens', 0)
+            result['output_tokens'] = getattr(msg.usage, 'output_tokens', 0)
+            result['roi'] = roi_data is not None
+            return result
         
         except Exception as e:
-            print(f"   ❌ Claude error: {e}")
+            print(f"   ❌ Claude error ({ctx.name}): {e}")
             return self._empty_result()
     
+    def _cache_lookup(self, ctx, roi_data):
+        """Return (key, cached result or None) for one request.
+        
+        ROI requests are keyed by the exact image Claude would see.
+        """
+        digest = hashlib.sha256(roi_data.encode()).hexdigest() if roi_data else ctx.sha256
+        key = f"{digest}:{self.cache_namespace}"
+        return key, self.cache.get(key, 'claude')
+    
+    async def _request(self, image_data, roi=False):
+        """Send one request under the rate controller.
+        
+        Retries 429/5xx with jittered exponential backoff. Returns None if the
+        budget ran out while waiting for a slot.
+        """
+        for attempt in range(CLAUDE_MAX_RETRIES + 1):
+            if not await self.controller.acquire():
+                return None
+            try:
+                started = time.perf_counter()
+                msg = await self.client.messages.create(
+                    model=self.model,
+                    max_tokens=CLAUDE_MAX_TOKENS,
+                    messages=[{
+                        "role": "user",
+                        "content": [
+                            {
+                                "type": "image",
+                                "source": {
+                                    "type": "base64",
+                                    "media_type": "image/jpeg",
+                                    "data": image_data
+                                }
+                            },
+                            {"type": "text", "text": (self.ROI_NOTE if roi else "") + self.PROMPT}
+                        ]
+                    }]
+                )
+                self.controller.on_success(started, msg.usage)
+                return msg
+            except (APIStatusError, APIConnectionError) as e:
+                status = getattr(e, 'status_code', None)
+                if status == 429:
+                    self.controller.on_rate_limited(started)
+                retryable = status is None or status == 429 or status >= 500
+                if not retryable or attempt == CLAUDE_MAX_RETRIES:
+                    raise
+                
+                # Full jitter; honour the server's retry-after hint when given
+                delay = random.uniform(0, min(60, 2 ** attempt))
+                response = getattr(e, 'response', None)
+                retry_after = response.headers.get('retry-after') if response is not None else None
+                if retry_after:
+                    try:
+                        delay = max(delay, float(retry_after))
+                    except ValueError:
+                        pass
+            finally:
+                await self.controller.release()
+            
+            # Back off outside the window so other requests can use the slot
+            await asyncio.sleep(delay)
+    
+    def usage_summary(self):
+        """Per-run token, cost and rate-limit totals."""
+        return self.controller.summary()
+    
     @staticmethod
-    def _empty_result():
+    def _empty_result(status='error'):
         """Return empty result dict."""
         return {
             'total_people': 0, 'adults': 0, 'children': 0,
             'bicycles': 0, 'dogs': 0, 'strollers': 0,
             'wheelchairs': 0, 'big_backpacks': 0,
-            'cars': 0, 'motorcycles': 0, 'atvs': 0
+            'cars': 0, 'motorcycles': 0, 'atvs': 0,
+            'status': status, 'input_tokens': 0, 'output_tokens': 0, 'roi': False
         }
 
+# ===========================================================================
+# ONNX RUNTIME BACKEND
+# ===========================================================================
+
+def onnx_session(path):
+    """CPU ONNX Runtime session with full graph optimization and our thread budget."""
+    ort = require('onnxruntime')
+    options = ort.SessionOptions()
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    options.intra_op_num_threads = ONNX_INTRA_THREADS or torch.get_num_threads()
+    options.inter_op_num_threads = ONNX_INTER_THREADS
+    if ONNX_INTER_THREADS > 1:
+        options.execution_mode = ort.ExecutionMode.ORT_PARALLEL
+    return ort.InferenceSession(path, options, providers=['CPUExecutionProvider'])
+
+class OnnxModule(torch.nn.Module):
+    """Runs an exported ONNX graph in place of a torch module.
+    
+    Holds one dummy parameter, because YOLOv5's AutoShape reads the input
+    dtype and device from the wrapped model's parameters.
+    """
+    
+    def __init__(self, path):
+        super().__init__()
+        self.session = onnx_session(path)
+        self.input_name = self.session.get_inputs()[0].name
+        self.dummy = torch.nn.Parameter(torch.zeros(1), requires_grad=False)
+    
+    def forward(self, x):
+        output = self.session.run(None, {self.input_name: x.detach().cpu().float().numpy()})[0]
+        return torch.from_numpy(output)
+
+class ClipImageTower(torch.nn.Module):
+    """CLIP image encoder + projection only (what classify_crops runs)."""
+    
+    def __init__(self, clip_model):
+        super().__init__()
+        self.clip_model = clip_model
+    
+    def forward(self, pixel_values):
+        return self.clip_model.get_image_features(pixel_values=pixel_values)
+
+def export_onnx(module, example, path, input_name, dynamic_axes):
+    """Trace a CPU module to ONNX (written atomically)."""
+    require('onnx')
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Newer torch defaults to the dynamo exporter; dynamic_axes needs the tracer
+    options = {'dynamo': False} if 'dynamo' in inspect.signature(torch.onnx.export).parameters else {}
+    with torch.no_grad():
+        torch.onnx.export(
+            module, example, path + '.part',
+            input_names=[input_name], output_names=['output'],
+            dynamic_axes=dynamic_axes, opset_version=ONNX_OPSET, **options
+        )
+    os.replace(path + '.part', path)
+
+def export_detector_onnx(md, path):
+    """Export the network inside YOLOv5's AutoShape, with dynamic batch and image size.
+    
+    Letterboxing and NMS stay in AutoShape, so both backends share them.
+    """
+    model = copy.deepcopy(md.model.model).cpu().float().eval()
+    for m in model.modules():
+        if type(m).__name__ == 'Detect':
+            m.dynamic = True  # Anchor grids follow the input shape instead of the traced one
+            m.export = True
+    export_onnx(
+        model, torch.zeros(1, 3, 640, 640), path, 'images',
+        {'images': {0: 'batch', 2: 'height', 3: 'width'}, 'output': {0: 'batch', 1: 'anchors'}}
+    )
+
+def export_clip_onnx(clip_model, clip_proc, path):
+    """Export the CLIP image tower with a dynamic batch size."""
+    size = clip_proc.crop_size['height']
+    export_onnx(
+        ClipImageTower(clip_model).eval(), torch.zeros(1, 3, size, size), path, 'pixel_values',
+        {'pixel_values': {0: 'batch'}, 'output': {0: 'batch'}}
+    )
+
 # ===========================================================================
 # MEGADETECTOR + CLIP PIPELINE CLASS
 # ===========================================================================
@@ -260,97 +1473,635 @@ Return ONLY valid JSON, no other text:
 class PipelineModel:
     """MegaDetector v5a + CLIP for activity detection."""
     
-    def __init__(self):
+    WEIGHTS = "md_v5a.0.0.pt"
+    
+    def __init__(self, cache=None, backend=None):
         """Initialize MegaDetector and CLIP models."""
+        self.cache = cache
+        self.backend = backend or BACKEND
+        self.clip_image = None  # ONNX image tower (torch backend: clip_model)
+        started = time.perf_counter()
+        
         print("Loading MegaDetector...")
-        self.weights = "md_v5a.0.0.pt"
+        self.weights = self.WEIGHTS
+        self.md = self._load_detector()
+        # The cascade, escalation and ROI need low-confidence boxes; people
+        # are still counted at MD_THRESHOLD
+        self.md.conf = min(
+            [MD_THRESHOLD] +
+            ([CASCADE_THRESHOLD] if CASCADE else []) +
+            ([ESCALATE_MIN_BOX_CONF] if ESCALATION else []) +
+            ([ROI_MIN_CONF] if ROI_MODE else [])
+        )
+        
+        # Load CLIP for classification
+        print("Loading CLIP model...")
+        self.clip_model, self.clip_proc = self._load_clip()
+        
+        self.labels = list(CLIP_PROMPTS)
+        self.label_map = {i: CLIP_LABEL_MAP[name] for i, name in enumerate(self.labels)}
+        self.text_features = self._load_label_bank()
+        
+        # Everything that can change a pipeline result
+        self.cache_namespace = cache_namespace(
+            'pipeline', self.weights, MD_THRESHOLD, self.md.conf, CASCADE_CLASSES,
+            CLIP_MODEL_NAME, CLIP_PROMPTS, CLIP_LABEL_MAP,
+            DECODE_DRAFT, DECODE_SIZE, FULL_RES_CROP_PX
+        )
+        
+        if self.backend == "onnx":
+            self.use_onnx()
         
-        # Download weights if needed
-        if not os.path.exists(self.weights):
+        print(f"✓ Pipeline models loaded in {time.perf_counter() - started:.1f}s")
+    
+    def use_onnx(self, export=False):
+        """Run the detector network and CLIP image tower in ONNX Runtime (CPU).
+        
+        Exports both to MODEL_FOLDER on first use (or when export=True). The
+        torch detector keeps its letterboxing and NMS; only the network inside
+        it is replaced.
+        """
+        md_path, clip_path = self.onnx_paths()
+        if export or not os.path.exists(md_path):
+            print("  Exporting MegaDetector to ONNX...")
+            export_detector_onnx(self.md, md_path)
+        if export or not os.path.exists(clip_path):
+            print("  Exporting CLIP image tower to ONNX...")
+            export_clip_onnx(self.clip_model, self.clip_proc, clip_path)
+        
+        self.md.model.model = OnnxModule(md_path)
+        self.clip_image = OnnxModule(clip_path)
+        self.backend = "onnx"
+        # Results match torch within tolerance, not bit for bit
+        self.cache_namespace = cache_namespace(self.cache_namespace, 'onnx')
+        print(f"  ✓ ONNX Runtime backend ({ONNX_INTRA_THREADS or torch.get_num_threads()} "
+              f"intra-op / {ONNX_INTER_THREADS} inter-op threads)")
+    
+    @classmethod
+    def onnx_paths(cls):
+        """Exported detector and CLIP image tower files in MODEL_FOLDER."""
+        return (
+            os.path.join(MODEL_FOLDER, cls.WEIGHTS.replace('.pt', '.onnx')),
+            os.path.join(MODEL_FOLDER, CLIP_MODEL_NAME.replace('/', '--') + '-image.onnx')
+        )
+    
+    @staticmethod
+    def label_bank_path():
+        """Label bank cache file for the current CLIP model and prompt list."""
+        key = hashlib.sha1(
+            json.dumps([CLIP_MODEL_NAME, list(CLIP_PROMPTS.items())]).encode('utf-8')
+        ).hexdigest()[:16]
+        return os.path.join(CACHE_FOLDER, f"clip_labels_{key}.pt")
+    
+    def _load_detector(self):
+        """MegaDetector through YOLOv5's hub code, offline after the first run.
+        
+        With OFFLINE_MODELS the weights and a snapshot of the YOLOv5 code are
+        kept in MODEL_FOLDER, and later runs load the snapshot with
+        source='local' instead of fetching the repository from GitHub.
+        """
+        folder = MODEL_FOLDER if OFFLINE_MODELS else '.'
+        weights = os.path.join(folder, self.weights)
+        if not os.path.exists(weights):
             print("  Downloading MegaDetector weights...")
+            os.makedirs(folder, exist_ok=True)
             r = requests.get(
                 "https://github.com/ecologize/CameraTraps/releases/download/v5.0/md_v5a.0.0.pt"
             )
-            with open(self.weights, 'wb') as f:
+            r.raise_for_status()
+            with open(weights + '.part', 'wb') as f:
                 f.write(r.content)
+            os.replace(weights + '.part', weights)  # Never leave truncated weights behind
         
-        # Load YOLOv5 with MegaDetector weights
-        self.md = torch.hub.load(
-            'ultralytics/yolov5', 'custom',
-            path=self.weights, trust_repo=True
-        )
-        self.md.conf = MD_THRESHOLD
+        require('ultralytics')  # Imported by YOLOv5's hub code
+        snapshot = os.path.join(MODEL_FOLDER, 'yolov5')
+        if OFFLINE_MODELS and os.path.exists(os.path.join(snapshot, 'hubconf.py')):
+            return torch.hub.load(snapshot, 'custom', path=weights, source='local')
         
-        # Load CLIP for classification
-        print("Loading CLIP model...")
-        self.clip_model = CLIPModel.from_pretrained(
-            "openai/clip-vit-base-patch32"
-        ).to(DEVICE)
-        self.clip_proc = CLIPProcessor.from_pretrained(
-            "openai/clip-vit-base-patch32"
-        )
+        md = torch.hub.load('ultralytics/yolov5', 'custom', path=weights, trust_repo=True)
+        if OFFLINE_MODELS:
+            # Pin the code that was just fetched, so later runs need no network
+            try:
+                partial = snapshot + '.partial'
+                shutil.rmtree(partial, ignore_errors=True)
+                shutil.copytree(
+                    os.path.join(torch.hub.get_dir(), 'ultralytics_yolov5_master'), partial,
+                    ignore=shutil.ignore_patterns('.git', '__pycache__')
+                )
+                os.replace(partial, snapshot)
+                print(f"  ✓ YOLOv5 code saved for offline starts: {snapshot}")
+            except Exception as e:
+                print(f"  ⚠ Could not save YOLOv5 code snapshot: {e}")
+        return md
+    
+    def _load_clip(self):
+        """CLIP model (on DEVICE) and image processor, saved locally on first use.
+        
+        Sets clip_source to the local copy when it exists, so the tokenizer
+        for the label bank is read from disk as well.
+        """
+        require('transformers')
+        from transformers import CLIPImageProcessor, CLIPModel, CLIPTokenizer
+        
+        local = os.path.join(MODEL_FOLDER, CLIP_MODEL_NAME.replace('/', '--'))
+        if OFFLINE_MODELS and os.path.exists(os.path.join(local, 'config.json')):
+            self.clip_source = local
+            model = CLIPModel.from_pretrained(local, local_files_only=True)
+            proc = CLIPImageProcessor.from_pretrained(local, local_files_only=True)
+            return model.to(DEVICE), proc
+        
+        self.clip_source = CLIP_MODEL_NAME
+        model = CLIPModel.from_pretrained(CLIP_MODEL_NAME)
+        proc = CLIPImageProcessor.from_pretrained(CLIP_MODEL_NAME)
+        if OFFLINE_MODELS:
+            try:
+                partial = local + '.partial'
+                shutil.rmtree(partial, ignore_errors=True)
+                model.save_pretrained(partial)
+                proc.save_pretrained(partial)
+                CLIPTokenizer.from_pretrained(CLIP_MODEL_NAME).save_pretrained(partial)
+                os.replace(partial, local)
+                print(f"  ✓ CLIP saved for offline starts: {local}")
+            except Exception as e:
+                print(f"  ⚠ Could not save CLIP locally: {e}")
+        return model.to(DEVICE), proc
+    
+    def _load_label_bank(self):
+        """Load normalized class embeddings from cache, or encode them once.
         
-        self.labels = ["a photo of a child", "a photo of a man", "a photo of a woman"]
-        self.label_map = {0: "Child", 1: "Adult", 2: "Adult"}
+        The cache file is keyed by CLIP model name and the full prompt list, so
+        warm starts never run the CLIP tokenizer or text encoder.
+        """
+        cache_path = self.label_bank_path()
+        
+        if os.path.exists(cache_path):
+            try:
+                bank = torch.load(cache_path, map_location=DEVICE)
+                print("  ✓ CLIP label bank loaded from cache")
+                return bank['embeddings']
+            except Exception as e:
+                print(f"  ⚠ Ignoring unreadable label bank cache: {e}")
+        
+        # Encode every prompt, then average each class's prompts into one embedding
+        from transformers import CLIPTokenizer
+        tokenizer = CLIPTokenizer.from_pretrained(self.clip_source)
+        embeddings = []
+        for name in self.labels:
+            text_inputs = tokenizer(
+                CLIP_PROMPTS[name], return_tensors="pt", padding=True
+            ).to(DEVICE)
+            with torch.no_grad():
+                features = self.clip_model.get_text_features(**text_inputs)
+            features = features / features.norm(dim=-1, keepdim=True)
+            mean = features.mean(dim=0)
+            embeddings.append(mean / mean.norm())
+        embeddings = torch.stack(embeddings)
+        
+        try:
+            os.makedirs(CACHE_FOLDER, exist_ok=True)
+            partial = f"{cache_path}.{os.getpid()}.part"
+            torch.save({
+                'model': CLIP_MODEL_NAME,
+                'prompts': CLIP_PROMPTS,
+                'embeddings': embeddings.cpu()
+            }, partial)
+            os.replace(partial, cache_path)  # Readers never see a half-written file
+        except Exception as e:
+            print(f"  ⚠ Could not save label bank cache: {e}")
         
-        print("✓ Pipeline models loaded")
+        return embeddings
     
-    def analyze(self, image_path):
+    @staticmethod
+    def _empty_result():
+        """Return empty result dict."""
+        return {
+            'Pipeline_Total': 0,
+            'Pipeline_Adult': 0,
+            'Pipeline_Child': 0,
+            'Detector_Max_Conf': 0.0,
+            'crops': [],
+            'boxes': []
+        }
+    
+    def analyze(self, image):
         """Analyze image with MegaDetector + CLIP."""
+        return self.analyze_batch([image])[0]
+    
+    def analyze_batch(self, images):
+        """Analyze several images with one batched MegaDetector pass + CLIP.
+        
+        Accepts image paths or ImageContext objects; returns one result dict
+        per image, in input order.
+        """
+        contexts = [img if isinstance(img, ImageContext) else ImageContext(img) for img in images]
+        results = [self._empty_result() for _ in contexts]
+        keys = [None] * len(contexts)
+        
+        # Decode each uncached image once (unreadable files keep the empty result)
+        index = []
+        for i, ctx in enumerate(contexts):
+            try:
+                if self.cache is not None:
+                    keys[i] = f"{ctx.sha256}:{self.cache_namespace}"
+                    cached = self._cache_get(keys[i])
+                    if cached is not None:
+                        results[i] = cached
+                        continue
+                
+                ctx.image  # Decode now so unreadable files are skipped
+                index.append(i)
+            except Exception as e:
+                print(f"   ❌ Pipeline error ({ctx.name}): {e}")
+        
+        if not index:
+            return results
+        
         try:
-            # Run MegaDetector
-            results = self.md(image_path)
-            df = results.pandas().xyxy[0]
-            
-            # Filter for people (class 1)
-            person_boxes = df[df['class'] == 1][
-                ['xmin', 'ymin', 'xmax', 'ymax']
-            ].values.tolist()
+            # Run MegaDetector once on the whole batch; YOLOv5 letterboxes
+            # and stacks the images, then scales boxes back to each image
+            detections = []
+            for start in range(0, len(index), BATCH_SIZE):
+                chunk = index[start:start + BATCH_SIZE]
+                detections.extend(self.md([contexts[i].array for i in chunk]).xyxy)
+            crop_queue = CropQueue(self)
             
-            if len(person_boxes) == 0:
-                return {
-                    'Pipeline_Total': 0,
-                    'Pipeline_Adult': 0,
-                    'Pipeline_Child': 0
-                }
-            
-            # Classify with CLIP
-            counts = {'Adult': 0, 'Child': 0}
-            img = Image.open(image_path).convert("RGB")
-            
-            for box in person_boxes:
-                x1, y1, x2, y2 = map(int, box)
-                crop = img.crop((
-                    max(0, x1), max(0, y1),
-                    min(img.width, x2), min(img.height, y2)
-                ))
+            for i, det in zip(index, detections):
+                # Boxes back to full-resolution pixels (draft decoding shrinks the input)
+                det = det.clone()
+                det[:, :4] *= contexts[i].scale
+                
+                # Every detection as [x1, y1, x2, y2, conf, class], used by ROI mode
+                results[i]['boxes'] = [[round(v, 1) for v in box[:4]] + [round(box[4], 4), int(box[5])]
+                                       for box in det.tolist()]
+                
+                # Highest person/vehicle confidence, used by the cascade
+                trigger = torch.zeros(len(det), dtype=torch.bool, device=det.device)
+                for cls in CASCADE_CLASSES:
+                    trigger |= det[:, 5] == cls
+                if trigger.any():
+                    results[i]['Detector_Max_Conf'] = round(det[trigger, 4].max().item(), 4)
                 
-                inputs = self.clip_proc(
-                    text=self.labels,
-                    images=crop,
-                    return_tensors="pt",
-                    padding=True
-                ).to(DEVICE)
+                # Filter for people (class 1) straight from the output tensor
+                person_boxes = det[(det[:, 5] == 1) & (det[:, 4] >= MD_THRESHOLD), :5].tolist()
                 
-                with torch.no_grad():
-                    probs = self.clip_model(**inputs).logits_per_image.softmax(dim=1)
+                if len(person_boxes) == 0:
+                    continue
                 
-                label = self.label_map[probs.cpu().numpy()[0].argmax()]
-                counts[label] += 1
+                results[i]['Pipeline_Total'] = len(person_boxes)
+                for box in person_boxes:
+                    crop_queue.put((i, box[4]), contexts[i].crop(box[:4]))
             
-            return {
-                'Pipeline_Total': len(person_boxes),
-                'Pipeline_Adult': counts['Adult'],
-                'Pipeline_Child': counts['Child']
-            }
+            # Classify with CLIP and scatter labels back to each image,
+            # keeping each crop's box confidence and CLIP scores
+            for (i, box_conf), (label, clip_conf, clip_margin) in crop_queue.drain():
+                results[i][f'Pipeline_{label}'] += 1
+                results[i]['crops'].append({
+                    'label': label,
+                    'box_conf': round(box_conf, 4),
+                    'clip_conf': round(clip_conf, 4),
+                    'clip_margin': round(clip_margin, 4)
+                })
         
         except Exception as e:
             print(f"   ❌ Pipeline error: {e}")
-            return {
-                'Pipeline_Total': 0,
-                'Pipeline_Adult': 0,
-                'Pipeline_Child': 0
-            }
+            return [
+                results[i] if i not in index else self._empty_result()
+                for i in range(len(contexts))
+            ]
+        
+        if self.cache is not None:
+            try:
+                for i in index:
+                    self.cache.put(keys[i], results[i])
+            except sqlite3.Error as e:
+                print(f"   ⚠ Result cache write failed: {e}")
+        
+        return results
+    
+    def is_cached(self, ctx):
+        """True when this image's result is in the result cache (nothing to decode)."""
+        if self.cache is None:
+            return False
+        try:
+            return self.cache.contains(f"{ctx.sha256}:{self.cache_namespace}")
+        except (OSError, sqlite3.Error):
+            return False
+    
+    def _cache_get(self, key):
+        """Cached pipeline result, or None (also when the cache can't be read)."""
+        try:
+            return self.cache.get(key, 'pipeline')
+        except sqlite3.Error as e:
+            print(f"   ⚠ Result cache read failed: {e}")
+            return None
+    
+    def classify_crops(self, crops):
+        """Classify person crops with one CLIP image-tower pass.
+        
+        Returns (label, confidence, margin) per crop. Confidence is the top
+        prompt-class probability. Margin is the chosen label's probability
+        mass minus the best other label's (Man + Woman both count toward Adult).
+        """
+        inputs = self.clip_proc(images=crops, return_tensors="pt").to(DEVICE)
+        
+        with torch.no_grad():
+            if self.clip_image is not None:
+                image_features = self.clip_image(inputs['pixel_values'])
+            else:
+                image_features = self.clip_model.get_image_features(**inputs)
+            image_features = image_features / image_features.norm(dim=-1, keepdim=True)
+            logits = self.clip_model.logit_scale.exp() * image_features @ self.text_features.T
+            probs = logits.softmax(dim=1)
+        
+        results = []
+        for row in probs.tolist():
+            best = max(range(len(row)), key=row.__getitem__)
+            label = self.label_map[best]
+            mass = collections.defaultdict(float)
+            for idx, p in enumerate(row):
+                mass[self.label_map[idx]] += p
+            margin = mass[label] - max((p for name, p in mass.items() if name != label), default=0.0)
+            results.append((label, row[best], margin))
+        return results
+
+class CropQueue:
+    """Collects person crops across images and classifies them in fixed-size batches."""
+    
+    def __init__(self, pipeline_model, batch_size=None):
+        self.pipeline_model = pipeline_model
+        self.batch_size = batch_size or CLIP_BATCH_SIZE
+        self.crops = []
+        self.owners = []
+        self.labels = []
+    
+    def put(self, owner, crop):
+        """Queue a crop; runs CLIP as soon as a full batch is collected."""
+        self.crops.append(crop)
+        self.owners.append(owner)
+        if len(self.crops) >= self.batch_size:
+            self._flush()
+    
+    def drain(self):
+        """Classify any remaining crops and return (owner, classification) pairs."""
+        self._flush()
+        labels, self.labels = self.labels, []
+        return labels
+    
+    def _flush(self):
+        if not self.crops:
+            return
+        self.labels.extend(zip(self.owners, self.pipeline_model.classify_crops(self.crops)))
+        self.crops, self.owners = [], []
+
+# ===========================================================================
+# RESULT JOURNAL
+# ===========================================================================
+
+class ResultJournal:
+    """Append-only JSONL journal with one line per finished image.
+    
+    Every row is flushed as soon as it is written (and fsynced every
+    SAVE_INTERVAL rows), so a crash loses at most the row in progress.
+    Rows are also marked processed in the file manifest and added to the
+    results store, when given.
+    
+    Only finished rows count as done: a Claude call that failed or hit the
+    budget is retried on --resume, and its new row replaces the old one.
+    """
+    
+    def __init__(self, path, resume=False, manifest=None, store=None):
+        self.path = path
+        self.manifest = manifest
+        self.store = store
+        self.done = set()
+        self.pending = 0
+        self.appended = 0
+        
+        if resume and os.path.exists(path):
+            for record in self._read():
+                if self.finished(record['row']):
+                    self.done.add(record['path'])
+                else:
+                    self.done.discard(record['path'])
+            if store is not None:
+                store.load(self._read())
+            print(f"✓ Resuming: {len(self.done)} images already in journal")
+        elif os.path.exists(path):
+            previous = path.replace('.jsonl', f'_before_{TIMESTAMP}.jsonl')
+            os.replace(path, previous)
+            print(f"✓ Previous journal moved to: {previous}")
+        
+        self.f = open(path, 'a', encoding='utf-8')
+    
+    def append(self, row, image_path):
+        """Durably record one finished row."""
+        if not self.appended:
+            print(f"⏱ Time to first image: {time.perf_counter() - STARTED:.1f}s after start")
+        self.appended += 1
+        self.f.write(json.dumps({'path': image_path, 'row': row}) + '\n')
+        self.f.flush()
+        if self.finished(row):
+            self.done.add(image_path)
+            if self.manifest is not None:
+                self.manifest.mark_processed(image_path)
+        if self.store is not None:
+            self.store.add(row, image_path)
+        self.pending += 1
+        if self.pending >= SAVE_INTERVAL:
+            self.sync()
+    
+    def sync(self):
+        os.fsync(self.f.fileno())
+        if self.manifest is not None:
+            self.manifest.flush()
+        if self.store is not None:
+            self.store.flush()
+        self.pending = 0
+    
+    def close(self):
+        self.sync()
+        self.f.close()
+    
+    @staticmethod
+    def finished(row):
+        """False for rows to redo: Claude failed, was unavailable or ran out of budget.
+        
+        Answers (ok/cached) and deliberate skips (skipped_*) are final.
+        """
+        status = row.get('Claude_Status')
+        return status is None or status in ('ok', 'cached') or status.startswith('skipped_')
+    
+    def _read(self):
+        with open(self.path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue  # Partial last line from an interrupted write
+
+# ===========================================================================
+# RESULTS STORE
+# ===========================================================================
+
+class ResultsStore:
+    """SQLite (WAL) store of result rows with indexed per-model counts.
+    
+    Rows are written in batched transactions and queried with SQL, so memory
+    stays flat however many images a run covers. The full row is kept as
+    JSON; Site/Date/Hour/Filename and the Total/Adult/Child counts of each
+    model (Claude answers only when Claude actually answered) are indexed.
+    The store is rebuilt from the journal on --resume, so it can live on
+    local disk.
+    """
+    
+    MODELS = ('Claude', 'Pipeline', 'Final')
+    
+    def __init__(self, path, batch_size=None):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+        self.path = path
+        self.batch_size = batch_size or SAVE_INTERVAL
+        self.columns = {}
+        self.pending = []
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript("""
+            CREATE TABLE images (
+                path TEXT PRIMARY KEY, site TEXT, date TEXT, hour INTEGER,
+                filename TEXT, status TEXT, row TEXT);
+            CREATE TABLE counts (
+                path TEXT, model TEXT, total INTEGER, adult INTEGER, child INTEGER,
+                PRIMARY KEY (path, model));
+            CREATE INDEX images_site ON images (site);
+            CREATE INDEX images_date ON images (date);
+            CREATE INDEX images_filename ON images (filename);
+            CREATE INDEX counts_model ON counts (model, total);
+        """)
+    
+    def add(self, row, image_path):
+        """Queue one row; written with the next batch."""
+        self.columns.update(dict.fromkeys(row))
+        self.pending.append((row, image_path))
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+    
+    def flush(self):
+        """Write queued rows in one transaction."""
+        if not self.pending:
+            return
+        images, counts = [], []
+        # A retried image replaces its earlier row (the last one queued wins)
+        latest = {image_path: row for row, image_path in self.pending}
+        for image_path, row in latest.items():
+            try:
+                date = datetime.strptime(f"{row['Date']} {row['Time']}", "%Y/%m/%d %H:%M:%S")
+            except (TypeError, ValueError):
+                date = None
+            images.append((
+                image_path, row.get('Site'),
+                date.strftime('%Y-%m-%d') if date else None, date.hour if date else None,
+                row.get('Filename'), row.get('Claude_Status'), json.dumps(row)
+            ))
+            for model in self.MODELS:
+                if f'{model}_Total' not in row:
+                    continue
+                if model == 'Claude' and row.get('Claude_Status') not in ('ok', 'cached'):
+                    continue
+                counts.append((image_path, model, row[f'{model}_Total'],
+                               row.get(f'{model}_Adult', 0), row.get(f'{model}_Child', 0)))
+        
+        with self.conn:
+            self.conn.executemany("DELETE FROM counts WHERE path = ?", [(i[0],) for i in images])
+            self.conn.executemany("INSERT OR REPLACE INTO images VALUES (?, ?, ?, ?, ?, ?, ?)", images)
+            self.conn.executemany("INSERT INTO counts VALUES (?, ?, ?, ?, ?)", counts)
+        self.pending = []
+    
+    def load(self, records):
+        """Add journal records ({'path', 'row'}), e.g. when resuming."""
+        for record in records:
+            self.add(record['row'], record['path'])
+        self.flush()
+    
+    def __len__(self):
+        return self.conn.execute("SELECT COUNT(*) FROM images").fetchone()[0]
+    
+    def status_count(self, status):
+        """Number of rows with this Claude_Status."""
+        return self.conn.execute(
+            "SELECT COUNT(*) FROM images WHERE status = ?", (status,)
+        ).fetchone()[0]
+    
+    def site_totals(self, model='Pipeline'):
+        """Per-site images, images with people and Total/Adult/Child for one model."""
+        import pandas as pd
+        return pd.read_sql_query("""
+            SELECT i.site AS Site, COUNT(*) AS Images, SUM(c.total > 0) AS Images_With_People,
+                   SUM(c.total) AS Total, SUM(c.adult) AS Adult, SUM(c.child) AS Child
+            FROM counts c JOIN images i ON i.path = c.path
+            WHERE c.model = ? GROUP BY i.site ORDER BY i.site
+        """, self.conn, params=(model,))
+    
+    def hour_histogram(self, model='Pipeline', site=None):
+        """Images and people per hour of day (EXIF time), optionally for one site."""
+        import pandas as pd
+        return pd.read_sql_query(f"""
+            SELECT i.hour AS Hour, COUNT(*) AS Images, SUM(c.total) AS Total
+            FROM counts c JOIN images i ON i.path = c.path
+            WHERE c.model = ? AND i.hour IS NOT NULL {'AND i.site = ?' if site else ''}
+            GROUP BY i.hour ORDER BY i.hour
+        """, self.conn, params=(model, site) if site else (model,))
+    
+    def disagreements(self, min_difference=1):
+        """Images where Claude and the pipeline counted different numbers of people."""
+        import pandas as pd
+        return pd.read_sql_query("""
+            SELECT i.site AS Site, i.filename AS Filename, i.date AS Date,
+                   cl.total AS Claude_Total, pl.total AS Pipeline_Total,
+                   cl.child AS Claude_Child, pl.child AS Pipeline_Child
+            FROM images i
+            JOIN counts cl ON cl.path = i.path AND cl.model = 'Claude'
+            JOIN counts pl ON pl.path = i.path AND pl.model = 'Pipeline'
+            WHERE ABS(cl.total - pl.total) >= ?
+            ORDER BY ABS(cl.total - pl.total) DESC, i.site, i.filename
+        """, self.conn, params=(min_difference,))
+    
+    def frames(self, chunk_size=10000):
+        """Yield the full rows as DataFrames of chunk_size, in write order."""
+        import pandas as pd
+        self.flush()
+        columns = list(self.columns)
+        cursor = self.conn.execute("SELECT row FROM images ORDER BY rowid")
+        while True:
+            chunk = cursor.fetchmany(chunk_size)
+            if not chunk:
+                break
+            yield pd.DataFrame([json.loads(row) for (row,) in chunk], columns=columns)
+    
+    def dataframe(self):
+        """All rows as one DataFrame (loads everything into memory)."""
+        import pandas as pd
+        return pd.concat(list(self.frames()), ignore_index=True) if len(self) else pd.DataFrame()
+    
+    def export_csv(self, path):
+        """CSV view of every row, written chunk by chunk."""
+        for n, df in enumerate(self.frames()):
+            df.to_csv(path, mode='w' if n == 0 else 'a', header=n == 0,
+                      index=False, encoding='utf-8-sig' if n == 0 else 'utf-8')
+    
+    def backup(self, path):
+        """Copy the database (e.g. to Drive) with SQLite's online backup."""
+        self.flush()
+        target = sqlite3.connect(path)
+        with target:
+            self.conn.backup(target)
+        target.close()
+    
+    def close(self):
+        self.flush()
+        self.conn.close()
 
 # ===========================================================================
 # MAIN PROCESSING
@@ -358,45 +2109,384 @@ class PipelineModel:
 
 def process_image(item, claude_model, pipeline_model):
     """Process single image with both models."""
-    # Extract metadata
-    date, time = get_exif_data(item['path'])
-    
-    # Run models
-    claude_result = claude_model.predict(item['path']) if claude_model.ready else ClaudeModel._empty_result()
-    pipeline_result = pipeline_model.analyze(item['path'])
-    
-    # Compile results
-    row = {
-        'Site': item['site'],
-        'Date': date,
-        'Time': time,
-        'Filename': item['name'],
-        
-        # Claude outputs
-        'Claude_Total': claude_result.get('total_people', 0),
-        'Claude_Adult': claude_result.get('adults', 0),
-        'Claude_Child': claude_result.get('children', 0),
-        'Claude_Bike': claude_result.get('bicycles', 0),
-        'Claude_Dog': claude_result.get('dogs', 0),
-        'Claude_Stroller': claude_result.get('strollers', 0),
-        'Claude_Wheelchair': claude_result.get('wheelchairs', 0),
-        'Claude_Backpack': claude_result.get('big_backpacks', 0),
-        'Claude_Car': claude_result.get('cars', 0),
-        'Claude_Motorcycle': claude_result.get('motorcycles', 0),
-        'Claude_ATV': claude_result.get('atvs', 0),
-        
-        # Pipeline outputs
-        'Pipeline_Total': pipeline_result['Pipeline_Total'],
-        'Pipeline_Adult': pipeline_result['Pipeline_Adult'],
-        'Pipeline_Child': pipeline_result['Pipeline_Child'],
+    return process_batch([item], claude_model, pipeline_model)[0]
+
+def representative_frames(items, pipeline_results, candidates):
+    """Indices of the top SEQUENCE_CLAUDE_TOP_K frames of each sequence.
+    
+    Frames are ranked by pipeline person count; ties go to the earliest frame.
+    """
+    by_sequence = collections.defaultdict(list)
+    for i in candidates:
+        sequence = items[i].get('sequence', i)
+        by_sequence[sequence].append((-pipeline_results[i]['Pipeline_Total'], i))
+    return sorted(
+        i for frames in by_sequence.values()
+        for _, i in sorted(frames)[:SEQUENCE_CLAUDE_TOP_K]
+    )
+
+def cascade_decision(item, pipeline_result):
+    """Whether the cascade sends this frame to Claude.
+    
+    'triggered' when MegaDetector saw a person/vehicle at CASCADE_THRESHOLD;
+    'audit' for a random CASCADE_AUDIT_RATE sample of the rest. The draw is
+    seeded by file path, so a resumed run audits the same frames.
+    """
+    triggered = pipeline_result.get('Detector_Max_Conf', 0.0) >= CASCADE_THRESHOLD
+    draw = random.Random(f"{RANDOM_SEED}:{item['path']}").random()
+    return {
+        'triggered': triggered,
+        'audit': not triggered and draw < CASCADE_AUDIT_RATE
     }
+
+def escalation_reason(pipeline_result):
+    """Why ESCALATION sends this frame to Claude, or None if the pipeline is sure.
+    
+    Any counted person crop with a weak box, a CLIP confidence below
+    CLIP_MIN_CONFIDENCE or a small Adult/Child margin escalates the frame,
+    as does a person box between ESCALATE_MIN_BOX_CONF and MD_THRESHOLD
+    that the pipeline did not count (a possible missed person).
+    """
+    for crop in pipeline_result.get('crops', []):
+        if crop['box_conf'] < ESCALATE_BOX_CONF:
+            return 'box_conf'
+        if crop['clip_conf'] < CLIP_MIN_CONFIDENCE:
+            return 'clip_conf'
+        if crop['clip_margin'] < ESCALATE_CLIP_MARGIN:
+            return 'clip_margin'
+    for box in pipeline_result.get('boxes', []):
+        if box[5] == 1 and ESCALATE_MIN_BOX_CONF <= box[4] < MD_THRESHOLD:
+            return 'uncounted_box'
+    return None
+
+def roi_boxes(pipeline_result):
+    """MegaDetector boxes (any class) above ROI_MIN_CONF for an ROI request."""
+    return [box[:4] for box in pipeline_result.get('boxes', []) if box[4] >= ROI_MIN_CONF]
+
+def process_batch(items, claude_model, pipeline_model, contexts=None, audit=False):
+    """Process a batch of images with both models.
+    
+    With audit=True the prefilter, cascade and escalation decisions are
+    recorded but nothing is skipped, and ROI answers are compared with a
+    full-frame request.
+    Returns (row, ImageContext) pairs; release each context once its row is saved.
+    """
+    return start_batch(items, claude_model, pipeline_model, contexts, audit)()
+
+def start_batch(items, claude_model, pipeline_model, contexts=None, audit=False):
+    """Run the local stages of process_batch and submit the Claude requests.
+    
+    Returns a function that waits for Claude and returns the (row,
+    ImageContext) pairs, so the next batch can run while these requests
+    are in flight.
+    """
+    contexts = contexts or [ImageContext(item['path']) for item in items]
+    
+    # Cheap empty-frame check before any model runs
+    decisions = [
+        background_model.check(item['site'], ctx) if PREFILTER else None
+        for item, ctx in zip(items, contexts)
+    ]
+    skipped = [bool(d and d['empty'] and not audit) for d in decisions]
+    run = [i for i in range(len(contexts)) if not skipped[i]]
     
-    return row, item['path']
+    claude_results = [ClaudeModel._empty_result('skipped_prefilter') for _ in contexts]
+    pipeline_results = [PipelineModel._empty_result() for _ in contexts]
+    
+    cascade = [None] * len(contexts)
+    reasons = [None] * len(contexts)
+    
+    if SEQUENCE_GROUPING or CASCADE or ESCALATION or ROI_MODE:
+        # Pipeline first, then Claude only on the frames that need it
+        for i, result in zip(run, pipeline_model.analyze_batch([contexts[i] for i in run])):
+            pipeline_results[i] = result
+        chosen = run
+        if CASCADE:
+            for i in run:
+                cascade[i] = cascade_decision(items[i], pipeline_results[i])
+            if not audit:
+                for i in run:
+                    claude_results[i] = ClaudeModel._empty_result('skipped_cascade')
+                chosen = [i for i in run if cascade[i]['triggered'] or cascade[i]['audit']]
+        if ESCALATION:
+            for i in run:
+                reasons[i] = escalation_reason(pipeline_results[i])
+            if not audit:
+                for i in chosen:
+                    claude_results[i] = ClaudeModel._empty_result('skipped_confident')
+                # Cascade audit samples still go to Claude so misses stay measurable
+                chosen = [i for i in chosen if reasons[i] or (cascade[i] and cascade[i]['audit'])]
+        if SEQUENCE_GROUPING:
+            for i in chosen:
+                claude_results[i] = ClaudeModel._empty_result('skipped_sequence')
+            chosen = representative_frames(items, pipeline_results, chosen)
+        regions = [roi_boxes(pipeline_results[i]) for i in chosen] if ROI_MODE else None
+        claude_future = claude_model.submit_batch([contexts[i] for i in chosen], regions)
+    else:
+        # Claude requests stay in flight while the pipeline runs
+        chosen = run
+        claude_future = claude_model.submit_batch([contexts[i] for i in run])
+        for i, result in zip(run, pipeline_model.analyze_batch([contexts[i] for i in run])):
+            pipeline_results[i] = result
+    
+    return lambda: _finish_batch(items, contexts, claude_model, claude_future, chosen,
+                                 claude_results, pipeline_results, decisions, skipped,
+                                 cascade, reasons, audit)
+
+def _finish_batch(items, contexts, claude_model, claude_future, chosen, claude_results,
+                  pipeline_results, decisions, skipped, cascade, reasons, audit):
+    """Wait for a batch's Claude results and build its rows."""
+    for i, result in zip(chosen, claude_future.result()):
+        claude_results[i] = result
+    
+    roi_reference = [None] * len(contexts)
+    if ROI_MODE and audit:
+        # Validation harness: full-frame answer for every frame sent as an ROI
+        compared = [i for i in chosen if claude_results[i].get('roi')]
+        for i, result in zip(compared, claude_model.predict_batch([contexts[i] for i in compared])):
+            roi_reference[i] = result
+    
+    processed = []
+    for item, ctx, claude_result, pipeline_result, decision, skip, gate, reason, reference in zip(
+            items, contexts, claude_results, pipeline_results, decisions, skipped, cascade,
+            reasons, roi_reference):
+        # Extract metadata
+        try:
+            date, time = ctx.exif
+        except Exception:
+            date, time = None, None
+        
+        # Compile results
+        row = {
+            'Site': item['site'],
+            'Date': date,
+            'Time': time,
+            'Filename': item['name'],
+            
+            # Claude outputs
+            'Claude_Total': claude_result.get('total_people', 0),
+            'Claude_Adult': claude_result.get('adults', 0),
+            'Claude_Child': claude_result.get('children', 0),
+            'Claude_Bike': claude_result.get('bicycles', 0),
+            'Claude_Dog': claude_result.get('dogs', 0),
+            'Claude_Stroller': claude_result.get('strollers', 0),
+            'Claude_Wheelchair': claude_result.get('wheelchairs', 0),
+            'Claude_Backpack': claude_result.get('big_backpacks', 0),
+            'Claude_Car': claude_result.get('cars', 0),
+            'Claude_Motorcycle': claude_result.get('motorcycles', 0),
+            'Claude_ATV': claude_result.get('atvs', 0),
+            'Claude_Status': claude_result.get('status', 'ok'),
+            'Claude_Tokens_In': claude_result.get('input_tokens', 0),
+            'Claude_Tokens_Out': claude_result.get('output_tokens', 0),
+            
+            # Pipeline outputs
+            'Pipeline_Total': pipeline_result['Pipeline_Total'],
+            'Pipeline_Adult': pipeline_result['Pipeline_Adult'],
+            'Pipeline_Child': pipeline_result['Pipeline_Child'],
+        }
+        if 'sequence' in item:
+            row['Sequence_ID'] = item['sequence']
+        if decision is not None:
+            row['Prefilter_Foreground'] = decision['foreground']
+            row['Prefilter_Empty'] = decision['empty']
+            row['Prefilter_Skipped'] = skip
+        if CASCADE:
+            row['Detector_Max_Conf'] = pipeline_result.get('Detector_Max_Conf', 0.0)
+            row['Cascade_Triggered'] = gate['triggered'] if gate else None
+            row['Cascade_Audit'] = gate['audit'] if gate else None
+        if ESCALATION:
+            # Final answer: Claude for escalated frames, the free pipeline otherwise
+            source = 'pipeline'
+            if reason and claude_result.get('status') in ('ok', 'cached'):
+                source = 'claude'
+            prefix = 'Claude_' if source == 'claude' else 'Pipeline_'
+            row['Escalated'] = None if skip else reason is not None
+            row['Escalation_Reason'] = reason
+            row['Final_Total'] = row[f'{prefix}Total']
+            row['Final_Adult'] = row[f'{prefix}Adult']
+            row['Final_Child'] = row[f'{prefix}Child']
+            row['Final_Source'] = source
+        if ROI_MODE:
+            row['Claude_ROI'] = claude_result.get('roi', False)
+        if reference is not None:
+            row['Claude_Full_Total'] = reference.get('total_people', 0)
+            row['Claude_Full_Adult'] = reference.get('adults', 0)
+            row['Claude_Full_Child'] = reference.get('children', 0)
+            row['Claude_Full_Tokens_In'] = reference.get('input_tokens', 0)
+        processed.append((row, ctx))
+    
+    return processed
+
+def iter_rows(items, claude_model, pipeline_model, prefetcher, step, audit=False):
+    """Yield (row, ImageContext) for every item that was processed.
+    
+    Batch k's Claude requests stay in flight while batch k+1 is prefiltered
+    and run through the pipeline; its rows are yielded once they resolve.
+    """
+    def finish(pending):
+        start, batch, wait = pending
+        try:
+            return wait()
+        except Exception as e:
+            print(f"[{start + 1:4d}-{start + len(batch)}/{len(items)}] ✗ {e}")
+            return []
+    
+    pending = None
+    for start, batch, contexts in prefetcher.batches(items, step):
+        try:
+            started = start, batch, start_batch(batch, claude_model, pipeline_model, contexts, audit)
+        except Exception as e:
+            print(f"[{start + 1:4d}-{start + len(batch)}/{len(items)}] ✗ {e}")
+            started = None
+        if pending is not None:
+            yield from finish(pending)
+        pending = started
+    if pending is not None:
+        yield from finish(pending)
+
+def save_parquet(results_df, dataset_path):
+    """Write results as typed Parquet, partitioned by Site and Date.
+    
+    Date/Time strings become one real Timestamp column (null when the EXIF
+    date is unknown), count columns become nullable integers, and Site is
+    dictionary-encoded. One site-month can then be read without scanning
+    the whole season, e.g.:
+    
+        pd.read_parquet(dataset_path, filters=[
+            ('Site', '=', 'SITE_1'),
+            ('Date', '>=', '2026-06-01'), ('Date', '<', '2026-07-01')])
+    """
+    import pandas as pd
+    pa = require('pyarrow')
+    import pyarrow.parquet as pq
+    
+    df = results_df.copy()
+    df['Timestamp'] = pd.to_datetime(
+        df['Date'].astype(str) + ' ' + df['Time'].astype(str),
+        format='%Y/%m/%d %H:%M:%S', errors='coerce'
+    )
+    df['Date'] = df['Timestamp'].dt.strftime('%Y-%m-%d')
+    df = df.drop(columns=['Time'])
+    
+    count_columns = [
+        c for c in df.columns
+        if c.startswith(('Claude_', 'Pipeline_')) and pd.api.types.is_numeric_dtype(df[c])
+        and not pd.api.types.is_bool_dtype(df[c])
+    ]
+    # Nullable, so columns only some rows have (e.g. Claude_Full_*) stay null, not 0
+    df[count_columns] = df[count_columns].astype('Int32')
+    df['Site'] = df['Site'].astype('category')
+    
+    pq.write_to_dataset(
+        pa.Table.from_pandas(df, preserve_index=False),
+        root_path=dataset_path,
+        partition_cols=['Site', 'Date'],
+        compression='zstd',
+        use_dictionary=True
+    )
+
+def print_prefilter_audit(results_df, count_columns):
+    """Compare prefilter decisions with model counts on the validation phase."""
+    empty = results_df['Prefilter_Empty'].fillna(False).astype(bool)
+    skipped_mask = results_df['Prefilter_Skipped'].fillna(False).astype(bool)
+    audited = results_df[empty & ~skipped_mask]
+    skipped = skipped_mask.sum()
+    
+    print("\nEmpty-Frame Prefilter:")
+    print(f"  Frames skipped: {skipped} of {len(results_df)} ({skipped / len(results_df):.0%})")
+    if len(audited):
+        missed = (audited[count_columns].max(axis=1) > 0).sum()
+        print(f"  Validation audit: {len(audited)} frames would be skipped, "
+              f"{missed} of them had detections ({missed / len(audited):.0%} miss rate)")
+
+def print_cascade_audit(results_df):
+    """Report Claude calls saved by the cascade and people it would have missed."""
+    triggered = results_df['Cascade_Triggered'].fillna(False).astype(bool)
+    sampled = results_df['Cascade_Audit'].fillna(False).astype(bool)
+    skipped = (results_df['Claude_Status'] == 'skipped_cascade').sum()
+    # Untriggered frames Claude still saw: validation phase + random audit sample
+    audited = results_df[
+        results_df['Cascade_Triggered'].notna() & ~triggered &
+        ~results_df['Claude_Status'].isin(['skipped_cascade', 'skipped_prefilter'])
+    ]
+    
+    print("\nDetector-First Cascade:")
+    print(f"  Claude skipped: {skipped} of {len(results_df)} frames ({skipped / len(results_df):.0%})")
+    print(f"  Triggered: {triggered.sum()}, random audit sample: {sampled.sum()}")
+    if len(audited):
+        missed = (audited['Claude_Total'] > 0).sum()
+        print(f"  Audit: {missed} of {len(audited)} untriggered frames had people "
+              f"per Claude ({missed / len(audited):.0%} miss rate)")
+
+def summarize_escalation(results_df):
+    """Per-site escalation rate, Claude calls and Claude cost."""
+    import pandas as pd
+    price_in, price_out = CLAUDE_PRICE_PER_MTOK
+    df = results_df.assign(
+        Escalated=results_df['Escalated'].fillna(False).astype(bool),
+        Claude_Call=results_df['Claude_Status'] == 'ok',
+        Claude_Cost_USD=(results_df['Claude_Tokens_In'] * price_in +
+                         results_df['Claude_Tokens_Out'] * price_out) / 1e6
+    )
+    grouped = df.groupby('Site')
+    summary = pd.DataFrame({
+        'Frames': grouped.size(),
+        'Escalated': grouped['Escalated'].sum(),
+        'Claude_Calls': grouped['Claude_Call'].sum(),
+        'Claude_Cost_USD': grouped['Claude_Cost_USD'].sum().round(4)
+    })
+    summary.insert(2, 'Escalation_Rate', (summary['Escalated'] / summary['Frames']).round(3))
+    return summary.reset_index()
+
+def print_escalation_report(results_df, summary):
+    """Per-site escalation table, plus how often confident frames agreed with Claude."""
+    print("\nUncertainty-Gated Escalation:")
+    for _, site in summary.iterrows():
+        print(f"  {site['Site']}: {site['Escalated']}/{site['Frames']} escalated "
+              f"({site['Escalation_Rate']:.0%}), ${site['Claude_Cost_USD']:.2f}")
+    
+    # Validation phase: Claude also ran on frames the policy kept on the pipeline
+    confident = results_df[
+        (results_df['Escalated'] == False) & results_df['Claude_Status'].isin(['ok', 'cached'])
+    ]
+    if len(confident):
+        agree = (
+            (confident['Pipeline_Total'] == confident['Claude_Total']) &
+            (confident['Pipeline_Child'] == confident['Claude_Child'])
+        ).mean()
+        print(f"  Validation: confident frames match Claude on {agree:.0%} of {len(confident)}")
+
+def compare_roi(results_df):
+    """ROI vs full-frame Claude counts on the validation frames that had both."""
+    df = results_df.dropna(subset=['Claude_Full_Total'])
+    df = df[df['Claude_Status'] == 'ok']
+    if df.empty:
+        return None
+    
+    print("\nROI Validation (ROI vs full frame):")
+    for column in ['Total', 'Adult', 'Child']:
+        agree = (df[f'Claude_{column}'] == df[f'Claude_Full_{column}']).mean()
+        mae = (df[f'Claude_{column}'] - df[f'Claude_Full_{column}']).abs().mean()
+        print(f"  {column}: {agree:.0%} exact match, MAE {mae:.2f}")
+    # Cached answers report no tokens, so only compare fresh requests
+    billed = df[(df['Claude_Tokens_In'] > 0) & (df['Claude_Full_Tokens_In'] > 0)]
+    if len(billed):
+        roi_tokens = billed['Claude_Tokens_In'].mean()
+        full_tokens = billed['Claude_Full_Tokens_In'].mean()
+        print(f"  Input tokens/request: {roi_tokens:.0f} ROI vs {full_tokens:.0f} full "
+              f"({1 - roi_tokens / full_tokens:.0%} fewer)")
+    
+    return df[[
+        'Site', 'Filename', 'Claude_Total', 'Claude_Full_Total', 'Claude_Adult',
+        'Claude_Full_Adult', 'Claude_Child', 'Claude_Full_Child',
+        'Claude_Tokens_In', 'Claude_Full_Tokens_In'
+    ]]
 
 def generate_validation_sheets(results, timestamp):
     """Generate visual validation sheets with results."""
     if not VALIDATION_SHEETS or not results:
         return
+    import matplotlib.pyplot as plt
     
     print(f"\n📊 Generating validation sheets...")
     
@@ -408,10 +2498,10 @@ def generate_validation_sheets(results, timestamp):
         axes = axes.flatten()
         fig.suptitle(f"Validation Batch {page_num+1} of {len(chunks)}", fontsize=16, fontweight='bold')
         
-        for idx, (res, img_path) in enumerate(chunk):
+        for idx, (res, image) in enumerate(chunk):
             ax = axes[idx]
             try:
-                ax.imshow(Image.open(img_path))
+                ax.imshow(image if isinstance(image, Image.Image) else Image.open(image))
                 
                 # Create comprehensive label
                 label = (
@@ -447,6 +2537,101 @@ def generate_validation_sheets(results, timestamp):
         
         print(f"  ✓ Validation sheet {page_num+1}/{len(chunks)} saved")
 
+# ===========================================================================
+# WATCH MODE
+# ===========================================================================
+
+def start_observer(wake):
+    """Set `wake` on any file event under INPUT_FOLDERS (inotify via watchdog).
+    
+    Returns the observer, or None when watchdog/inotify is unavailable and
+    the watch loop has to rely on polling alone.
+    """
+    try:
+        require('watchdog')
+        from watchdog.observers import Observer
+        from watchdog.events import FileSystemEventHandler
+        
+        class Wake(FileSystemEventHandler):
+            def on_any_event(self, event):
+                wake.set()
+        
+        observer = Observer()
+        for folder in INPUT_FOLDERS.values():
+            if os.path.exists(folder):
+                observer.schedule(Wake(), folder, recursive=True)
+        observer.start()
+        print("✓ Watching for file events (inotify)")
+        return observer
+    except Exception as e:
+        print(f"⚠ File events unavailable ({e}) - polling every {WATCH_POLL_SECONDS}s")
+        return None
+
+def watch_folders(manifest, handle):
+    """Process images as they arrive in INPUT_FOLDERS, until Ctrl+C.
+    
+    Every cycle rescans the manifest (only changed folders are listed) and
+    passes unprocessed files that stopped changing WATCH_SETTLE_SECONDS ago
+    to handle(items) in micro-batches of up to WATCH_MAX_BATCH. handle
+    returns the paths it finished. File events wake the loop at once; drives
+    without them (e.g. the Colab Drive mount) are polled. Returns the delays
+    from upload to finished row, in seconds.
+    """
+    wake = threading.Event()
+    observer = start_observer(wake)
+    arrived = {}
+    attempted = set()
+    delays = []
+    
+    try:
+        while True:
+            items = []
+            for site_name, folder_path in INPUT_FOLDERS.items():
+                if os.path.exists(folder_path):
+                    manifest.scan(site_name, folder_path)
+                    items += manifest.files(site_name, unprocessed=True)
+            
+            # Leave files alone until the upload has finished writing them
+            now = time.time()
+            ready, waiting = [], 0
+            for item in items:
+                if item['path'] in attempted:
+                    continue
+                try:
+                    stat = os.stat(item['path'])
+                except OSError:
+                    continue
+                # ctime is when the file landed here, even if the copy kept an old mtime
+                arrived.setdefault(item['path'], min(now, max(stat.st_mtime, stat.st_ctime)))
+                if now - stat.st_mtime < WATCH_SETTLE_SECONDS:
+                    waiting += 1
+                else:
+                    ready.append(item)
+            
+            for start in range(0, len(ready), WATCH_MAX_BATCH):
+                batch = ready[start:start + WATCH_MAX_BATCH]
+                attempted.update(item['path'] for item in batch)
+                finished = handle(batch)
+                batch_delays = [time.time() - arrived.pop(path) for path in finished]
+                if batch_delays:
+                    delays += batch_delays
+                    print(f"⏱ {len(batch_delays)} new images - delay after upload: "
+                          f"median {np.median(batch_delays):.1f}s, max {max(batch_delays):.1f}s")
+            
+            wake.wait(WATCH_SETTLE_SECONDS if waiting else WATCH_POLL_SECONDS)
+            wake.clear()
+    except KeyboardInterrupt:
+        print("\n⏹ Watch mode stopped")
+    finally:
+        if observer is not None:
+            observer.stop()
+            observer.join()
+    
+    if delays:
+        print(f"  {len(delays)} images, delay after upload: median {np.median(delays):.1f}s, "
+              f"p95 {np.percentile(delays, 95):.1f}s")
+    return delays
+
 # ===========================================================================
 # EXECUTION
 # ===========================================================================
@@ -456,20 +2641,35 @@ if __name__ == "__main__":
     print("INITIALIZING MODELS")
     print("="*70)
     
+    if BACKEND == "onnx" and DEVICE != "cpu":
+        print("⚠ The ONNX backend runs on CPU - using torch on the GPU")
+        BACKEND = "torch"
+    
     # Initialize models
-    claude = ClaudeModel()
-    pipeline = PipelineModel()
+    result_cache = ResultCache(os.path.join(CACHE_FOLDER, 'results_cache.sqlite')) if RESULT_CACHE else None
+    claude = ClaudeModel(cache=result_cache)
+    pipeline = PipelineModel(cache=result_cache)
     
     # Gather image files
     print("\n" + "="*70)
     print("GATHERING IMAGE FILES")
     print("="*70)
     
+    manifest = FileManifest(MANIFEST_PATH, 'full_pipeline') if MANIFEST or WATCH else None
     all_files = []
     for site_name, folder_path in INPUT_FOLDERS.items():
-        if os.path.exists(folder_path):
+        if not os.path.exists(folder_path):
+            print(f"⚠ Folder not found: {folder_path}")
+        elif manifest is not None:
+            # Recursive, and only changed folders are listed again
+            changed, removed = manifest.scan(site_name, folder_path, full=RESCAN)
+            images = manifest.files(site_name, unprocessed=ONLY_UNPROCESSED)
+            print(f"✓ Found {len(images)} {'unprocessed ' if ONLY_UNPROCESSED else ''}images "
+                  f"in '{site_name}' ({changed} new/changed, {removed} removed since last scan)")
+            all_files.extend(images)
+        else:
             images = [
-                f for f in os.listdir(folder_path)
+                f for f in sorted(os.listdir(folder_path))
                 if f.lower().endswith(('.jpg', '.jpeg', '.png'))
             ]
             print(f"✓ Found {len(images)} images in '{site_name}'")
@@ -480,42 +2680,63 @@ if __name__ == "__main__":
                     'name': img,
                     'path': os.path.join(folder_path, img)
                 })
-        else:
-            print(f"⚠ Folder not found: {folder_path}")
     
-    if not all_files:
+    if not all_files and not WATCH:
         print("❌ No images found. Exiting.")
         sys.exit(1)
     
-    # Shuffle and limit
-    random.shuffle(all_files)
+    # Shuffle and limit (whole sequences stay together when grouping)
+    rng = random.Random(RANDOM_SEED)
+    if SEQUENCE_GROUPING:
+        sequences = build_sequences(all_files)
+        rng.shuffle(sequences)
+        all_files = [item for sequence in sequences for item in sequence]
+        print(f"✓ Grouped into {len(sequences)} sequences "
+              f"(avg {len(all_files) / len(sequences):.1f} frames)")
+    else:
+        rng.shuffle(all_files)
     if MAX_PRODUCTION:
         all_files = all_files[:MAX_PRODUCTION]
     
     print(f"\n✓ Total images to process: {len(all_files)}")
     
-    # Split into validation and production
-    validation_set = all_files[:VALIDATION_SIZE]
-    production_set = all_files[VALIDATION_SIZE:]
+    # Split into validation and production, at a sequence boundary
+    cut = min(VALIDATION_SIZE, len(all_files))
+    while SEQUENCE_GROUPING and 0 < cut < len(all_files) and \
+            all_files[cut]['sequence'] == all_files[cut - 1]['sequence']:
+        cut += 1
+    validation_set = all_files[:cut]
+    production_set = all_files[cut:]
+    
+    # Skip images already finished by an earlier run
+    store = ResultsStore(RESULTS_DB_PATH)
+    journal = ResultJournal(JOURNAL_PATH, resume=RESUME or WATCH, manifest=manifest, store=store)
+    validation_set = [item for item in validation_set if item['path'] not in journal.done]
+    production_set = [item for item in production_set if item['path'] not in journal.done]
+    if WATCH:
+        # The watcher picks up the backlog and every later upload
+        validation_set, production_set = [], []
     
-    all_results = []
     validation_results = []
     
-    # Process validation set
-    print("\n" + "="*70)
-    print(f"PHASE 1: VALIDATION ({len(validation_set)} images)")
-    print("="*70)
+    # Large enough batches to keep CLAUDE_CONCURRENCY requests in flight
+    step = max(BATCH_SIZE, CLAUDE_CONCURRENCY)
+    
+    # Next batches are read (and decoded, unless their result is cached) in the
+    # background during inference
+    prefetcher = Prefetcher(decode=lambda ctx: PREFILTER or not pipeline.is_cached(ctx))
     
-    for i, item in enumerate(validation_set, 1):
-        print(f"[{i:4d}/{len(validation_set)}] {item['name']:<40}", end=" ", flush=True)
+    # Process validation set
+    if validation_set:
+        print("\n" + "="*70)
+        print(f"PHASE 1: VALIDATION ({len(validation_set)} images)")
+        print("="*70)
         
-        try:
-            row, img_path = process_image(item, claude, pipeline)
-            all_results.append(row)
-            validation_results.append((row, img_path))
-            print("✓")
-        except Exception as e:
-            print(f"✗ {e}")
+        for i, (row, ctx) in enumerate(iter_rows(validation_set, claude, pipeline, prefetcher, step, audit=True), 1):
+            print(f"[{i:4d}/{len(validation_set)}] {row['Filename']:<40} ✓")
+            journal.append(row, ctx.path)
+            validation_results.append((row, ctx.thumbnail() if VALIDATION_SHEETS else ctx.path))
+            ctx.release()
     
     # Generate validation sheets
     if VALIDATION_SHEETS:
@@ -527,37 +2748,72 @@ if __name__ == "__main__":
         print(f"PHASE 2: PRODUCTION ({len(production_set)} images)")
         print("="*70)
         
-        for i, item in enumerate(production_set, 1):
-            print(f"[{i:4d}/{len(production_set)}] {item['name']:<40}", end=" ", flush=True)
-            
-            try:
-                row, _ = process_image(item, claude, pipeline)
-                all_results.append(row)
-                print("✓")
-                
-                # Save checkpoint
-                if i % SAVE_INTERVAL == 0:
-                    checkpoint_path = os.path.join(
-                        OUTPUT_FOLDER,
-                        f"checkpoint_{i}_{TIMESTAMP}.csv"
-                    )
-                    pd.DataFrame(all_results).to_csv(checkpoint_path, index=False)
-                    print(f"  💾 Checkpoint saved: {checkpoint_path}")
-            
-            except Exception as e:
-                print(f"✗ {e}")
+        for i, (row, ctx) in enumerate(iter_rows(production_set, claude, pipeline, prefetcher, step), 1):
+            print(f"[{i:4d}/{len(production_set)}] {row['Filename']:<40} ✓")
+            journal.append(row, ctx.path)
+            ctx.release()
+    
+    if WATCH:
+        print("\n" + "="*70)
+        print("WATCH MODE (Ctrl+C to stop)")
+        print("="*70)
+        
+        def handle(items):
+            finished = []
+            for row, ctx in iter_rows(items, claude, pipeline, prefetcher, step):
+                print(f"[{row['Site']}] {row['Filename']:<40} ✓")
+                journal.append(row, ctx.path)
+                ctx.release()
+                finished.append(ctx.path)
+            journal.sync()
+            return finished
+        
+        watch_folders(manifest, handle)
+    
+    journal.close()
+    prefetcher.close()
+    if result_cache is not None:
+        result_cache.flush()
+    if manifest is not None:
+        manifest.close()
     
     # Save final results
     print("\n" + "="*70)
     print("SAVING RESULTS")
     print("="*70)
     
-    output_path = os.path.join(OUTPUT_FOLDER, f"Results_Full_Pipeline_{TIMESTAMP}.csv")
-    results_df = pd.DataFrame(all_results)
-    results_df.to_csv(output_path, index=False, encoding='utf-8-sig')
+    # Every journaled row (including resumed runs) is in the results store;
+    # the full table is only loaded for the optional analyses below
+    store.flush()
+    needs_frame = OUTPUT_FORMAT in ("parquet", "both") or any([SEQUENCE_GROUPING, PREFILTER, CASCADE, ESCALATION, ROI_MODE])
+    results_df = store.dataframe() if needs_frame else None
+    
+    if OUTPUT_FORMAT in ("csv", "both"):
+        output_path = os.path.join(OUTPUT_FOLDER, f"Results_Full_Pipeline_{TIMESTAMP}.csv")
+        store.export_csv(output_path)
+        print(f"✓ Results saved: {output_path}")
+    
+    db_path = os.path.join(OUTPUT_FOLDER, f"Results_Full_Pipeline_{TIMESTAMP}.sqlite")
+    store.backup(db_path)
+    print(f"✓ Results database saved: {db_path}")
+    
+    if SEQUENCE_GROUPING and 'Sequence_ID' in results_df:
+        sequences_path = os.path.join(OUTPUT_FOLDER, f"Sequences_Full_Pipeline_{TIMESTAMP}.csv")
+        summarize_sequences(results_df).to_csv(sequences_path, index=False, encoding='utf-8-sig')
+        print(f"✓ Sequence counts saved: {sequences_path}")
     
-    print(f"✓ Results saved: {output_path}")
-    print(f"✓ Total images processed: {len(all_results)}")
+    if OUTPUT_FORMAT in ("parquet", "both") and not results_df.empty:
+        dataset_path = os.path.join(OUTPUT_FOLDER, f"Results_Full_Pipeline_{TIMESTAMP}.parquet")
+        save_parquet(results_df, dataset_path)
+        print(f"✓ Parquet dataset saved: {dataset_path}")
+    
+    # Claude token and cost totals, next to the results CSV
+    usage = claude.usage_summary()
+    usage_path = os.path.join(OUTPUT_FOLDER, f"Claude_Usage_{TIMESTAMP}.json")
+    with open(usage_path, 'w') as f:
+        json.dump(usage, f, indent=2)
+    print(f"✓ Claude usage saved: {usage_path}")
+    print(f"✓ Total images processed: {len(store)}")
     print(f"✓ Output folder: {OUTPUT_FOLDER}")
     
     # Summary statistics
@@ -565,15 +2821,57 @@ if __name__ == "__main__":
     print("SUMMARY STATISTICS")
     print("="*70)
     
+    def print_method(model):
+        totals = store.site_totals(model)
+        images = totals['Images'].sum()
+        print(f"  Total humans detected: {totals['Total'].sum()}")
+        print(f"  Average per image: {totals['Total'].sum() / max(images, 1):.2f}")
+        print(f"  Images with people: {totals['Images_With_People'].sum()}")
+        return totals
+    
     print("\nClaude Method:")
-    print(f"  Total humans detected: {results_df['Claude_Total'].sum()}")
-    print(f"  Average per image: {results_df['Claude_Total'].mean():.2f}")
-    print(f"  Images with people: {(results_df['Claude_Total'] > 0).sum()}")
+    print_method('Claude')
+    print(f"  Requests: {usage['requests']} ({usage['rate_limited']} rate-limited)")
+    print(f"  Tokens: {usage['input_tokens']:,} in / {usage['output_tokens']:,} out")
+    print(f"  Estimated cost: ${usage['cost_usd']:.2f}")
+    if usage['budget_exhausted']:
+        print(f"  ⚠ Budget reached - {store.status_count('budget')} images skipped")
     
     print("\nPipeline Method:")
-    print(f"  Total humans detected: {results_df['Pipeline_Total'].sum()}")
-    print(f"  Average per image: {results_df['Pipeline_Total'].mean():.2f}")
-    print(f"  Images with people: {(results_df['Pipeline_Total'] > 0).sum()}")
+    print_method('Pipeline')
+    
+    disagreements = store.disagreements()
+    if len(disagreements):
+        disagreements_path = os.path.join(OUTPUT_FOLDER, f"Disagreements_{TIMESTAMP}.csv")
+        disagreements.to_csv(disagreements_path, index=False, encoding='utf-8-sig')
+        print(f"\nClaude vs Pipeline: {len(disagreements)} images disagree on total people")
+        print(f"  ✓ Saved: {disagreements_path}")
+    
+    if PREFILTER and 'Prefilter_Empty' in results_df:
+        print_prefilter_audit(results_df, ['Claude_Total', 'Pipeline_Total'])
+    if CASCADE and 'Cascade_Triggered' in results_df:
+        print_cascade_audit(results_df)
+    if ROI_MODE and 'Claude_Full_Total' in results_df:
+        comparison = compare_roi(results_df)
+        if comparison is not None:
+            roi_path = os.path.join(OUTPUT_FOLDER, f"ROI_Validation_{TIMESTAMP}.csv")
+            comparison.to_csv(roi_path, index=False, encoding='utf-8-sig')
+            print(f"  ✓ Saved: {roi_path}")
+    if ESCALATION and 'Escalated' in results_df:
+        escalation = summarize_escalation(results_df)
+        escalation_path = os.path.join(OUTPUT_FOLDER, f"Escalation_By_Site_{TIMESTAMP}.csv")
+        escalation.to_csv(escalation_path, index=False, encoding='utf-8-sig')
+        print_escalation_report(results_df, escalation)
+        print(f"  ✓ Saved: {escalation_path}")
+    
+    print("\nPrefetch:")
+    prefetcher.report()
+    
+    if result_cache is not None:
+        print("\nResult Cache:")
+        result_cache.report()
+    
+    store.close()
     
     print("\n" + "="*70)
     print("✅ COMPLETE!")
@@ -18,12 +18,28 @@ import os
 import sys
 import subprocess
 import warnings
+import io
+import copy
+import inspect
+import importlib
+import shutil
 import json
+import hashlib
+import sqlite3
 import random
+import time
+import queue
+import threading
+import socketserver
+import urllib.parse
+import collections
+import concurrent.futures
+import multiprocessing
 from datetime import datetime
-from PIL import Image, ExifTags
-import pandas as pd
-import matplotlib.pyplot as plt
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+STARTED = time.perf_counter()       # Cold-start clock (before the heavy imports)
+from PIL import Image, ImageOps
+import numpy as np
 import requests
 import torch
 
@@ -43,16 +59,97 @@ OUTPUT_FOLDER = '/content/drive/MyDrive/trail_camera_results'
 # Processing settings
 VALIDATION_SIZE = 100              # Number of images for validation phase
 MAX_PRODUCTION = 1000              # Max images to process (None = all)
+BATCH_SIZE = 8                     # Images per batched MegaDetector pass
+PREFETCH_WORKERS = 4               # Threads reading/decoding upcoming images
+PREFETCH_DEPTH = 32                # Max images read ahead of inference (bounds memory)
+DECODE_DRAFT = True                # Decode JPEGs at reduced DCT scale (1/2, 1/4, 1/8) for detection
+DECODE_SIZE = 1280                 # Smallest long side kept by draft decoding (MegaDetector input)
+FULL_RES_CROP_PX = 0               # Re-crop people shorter than this (decoded px) at full resolution (0 = off)
+EXIF_READ_BYTES = 65536            # Bytes read per file for the EXIF timestamp (APP1 is at most 64 KB)
+EXIF_WORKERS = 16                  # Parallel readers when scanning timestamps for many files
 DEVICE = "cuda" if torch.cuda.is_available() else "cpu"
+NUM_WORKERS = 1                    # CPU worker processes, each with its own models (1 = off)
+THREADS_PER_WORKER = None          # torch threads per worker (None = cores / NUM_WORKERS)
+BENCHMARK = '--benchmark' in sys.argv  # Measure throughput vs. worker count, then exit
+BENCHMARK_BATCHES = 4              # Batches timed per worker, so every worker count is fully busy
 
 # Model parameters
 MD_THRESHOLD = 0.35                # MegaDetector confidence threshold
 CLIP_MIN_CONFIDENCE = 0.40         # CLIP classification confidence
+CLIP_BATCH_SIZE = 32               # Person crops per CLIP forward pass
+CLIP_MODEL_NAME = "openai/clip-vit-base-patch32"
+
+# CLIP prompt ensembles: each class embedding is the mean of its prompts
+CLIP_PROMPTS = {
+    'Child': ["a photo of a child", "a trail camera photo of a child", "a photo of a kid"],
+    'Man': ["a photo of a man", "a trail camera photo of a man", "a photo of an adult man"],
+    'Woman': ["a photo of a woman", "a trail camera photo of a woman", "a photo of an adult woman"],
+}
+CLIP_LABEL_MAP = {'Child': 'Child', 'Man': 'Adult', 'Woman': 'Adult'}
+
+# Empty-frame prefilter (per-site background model)
+PREFILTER = False                  # Skip the models on frames with no foreground change
+PREFILTER_SIZE = (64, 48)          # Downsampled grayscale size used for comparison
+PREFILTER_PIXEL_DELTA = 25         # Gray-level change that counts as foreground
+PREFILTER_MIN_FOREGROUND = 0.01    # Changed-pixel fraction needed to run the models
+PREFILTER_WARMUP = 10              # Frames per site/time bucket before skipping starts
+PREFILTER_HOUR_BUCKET = 3          # Hours per time-of-day background
+
+# Burst / sequence grouping
+SEQUENCE_GROUPING = False          # Group burst frames per site by EXIF time
+SEQUENCE_GAP_SECONDS = 30          # Max gap between frames of one sequence
 
 # Output settings
 VALIDATION_SHEETS = True           # Generate visual validation sheets
-SAVE_INTERVAL = 50                 # Save checkpoint every N images
+SAVE_INTERVAL = 50                 # Sync the result journal to disk every N images
+OUTPUT_FORMAT = "csv"              # "csv", "parquet" (partitioned by Site/Date) or "both"
 TIMESTAMP = datetime.now().strftime("%Y%m%d_%H%M%S")
+RANDOM_SEED = 42                   # Fixed image order, so --resume picks the same files
+RESUME = '--resume' in sys.argv    # Continue the previous run from its journal
+JOURNAL_PATH = os.path.join(OUTPUT_FOLDER, 'results_journal_pipeline_only.jsonl')
+# WAL needs a local disk (not the Drive mount); it is rebuilt from the journal on --resume
+RESULTS_DB_PATH = os.path.join('/content' if os.path.isdir('/content') else OUTPUT_FOLDER,
+                               'results_pipeline_only.sqlite')
+
+# Cache settings
+CACHE_FOLDER = os.path.join(OUTPUT_FOLDER, 'cache')  # Label bank + result cache (reused across runs)
+RESULT_CACHE = True                # Reuse results for unchanged images and settings
+CACHE_MAX_ENTRIES = 500000         # Oldest-used results are evicted beyond this
+
+# Model files
+OFFLINE_MODELS = True              # Keep weights, YOLOv5 code and CLIP locally; no network after the first run
+MODEL_FOLDER = os.path.join(CACHE_FOLDER, 'models')
+
+# Inference backend
+BACKEND = "torch"                  # "torch" or "onnx" (ONNX Runtime on CPU, exported on first use)
+ONNX_INTRA_THREADS = None          # Threads within one operator (None = torch's thread count)
+ONNX_INTER_THREADS = 1             # Operators run side by side (>1 enables parallel execution)
+ONNX_OPSET = 17
+EXPORT_ONNX = '--export-onnx' in sys.argv  # Re-export, compare with torch and time both, then exit
+ONNX_PARITY_IMAGES = 64            # Images compared in the export check
+ONNX_PARITY_TOLERANCE = 0.01       # Max box/CLIP confidence difference that still counts as a match
+
+# File manifest
+MANIFEST = True                    # Index input folders (recursively) in a SQLite manifest
+MANIFEST_PATH = os.path.join(CACHE_FOLDER, 'manifest.sqlite')
+MANIFEST_HASH = False              # Also store SHA-256 of new/changed files (reads each file once)
+ONLY_UNPROCESSED = False           # Skip files this script processed in an earlier run
+RESCAN = '--rescan' in sys.argv    # List every folder again, even if its mtime is unchanged
+
+# Watch mode (long-running, for continuous uploads)
+WATCH = '--watch' in sys.argv      # Keep models loaded and process new uploads as they arrive
+WATCH_POLL_SECONDS = 10            # Rescan interval when file events are unavailable
+WATCH_SETTLE_SECONDS = 3           # A file must be unchanged this long before processing
+WATCH_MAX_BATCH = 32               # Max new images per micro-batch
+
+# Inference server (one warm model shared by local clients)
+SERVE = '--serve' in sys.argv      # Serve the pipeline over HTTP instead of processing folders
+SERVE_HOST = '127.0.0.1'           # Bind address (keep local: clients may send file paths)
+SERVE_PORT = 8765
+SERVE_SOCKET = None                # Unix socket path instead of host/port (e.g. '/tmp/trailcam.sock')
+SERVE_MAX_BATCH = 16               # Max requests grouped into one pipeline pass
+SERVE_MAX_WAIT_MS = 20             # Max time the first request waits for others to join its batch
+SERVE_LATENCY_WINDOW = 10000       # Recent requests kept for latency percentiles
 
 # ===========================================================================
 # SETUP & INITIALIZATION
@@ -67,47 +164,809 @@ print("✓ No API key required - completely free!")
 os.makedirs(OUTPUT_FOLDER, exist_ok=True)
 print(f"✓ Output directory: {OUTPUT_FOLDER}")
 
-# Install required packages
-print("\n🛠️ Installing dependencies...")
+# Packages are imported by the stage that needs them; pip only runs for missing ones
 def install(package):
     subprocess.check_call([sys.executable, "-m", "pip", "install", "-q", package])
 
-packages = ["urllib3<2.0.0", "ultralytics", "transformers", "requests"]
-for pkg in packages:
+def require(module, package=None):
+    """Import a module, pip-installing its package first if it is missing."""
     try:
-        __import__(pkg.split('[')[0].replace('-', '_'))
+        return importlib.import_module(module)
     except ImportError:
-        print(f"  Installing {pkg}...")
-        install(pkg)
-
-from transformers import CLIPProcessor, CLIPModel
+        print(f"  Installing {package or module}...")
+        install(package or module)
+        importlib.invalidate_caches()
+        return importlib.import_module(module)
 
 warnings.filterwarnings("ignore")
-print(f"✓ Dependencies installed")
 print(f"✓ Device: {DEVICE.upper()}")
 
 # ===========================================================================
 # UTILITY FUNCTIONS
 # ===========================================================================
 
-def get_exif_data(image_path):
-    """Extract date and time from image EXIF data."""
+def read_exif_datetime(source, max_bytes=None):
+    """EXIF DateTimeOriginal (tag 0x9003) as a datetime, or None if missing.
+    
+    Reads only the first EXIF_READ_BYTES of the file (source is a path or the
+    file bytes), finds the APP1 Exif segment and walks the TIFF IFDs straight
+    to the tag - no PIL, no full EXIF dict.
+    """
     try:
-        img = Image.open(image_path)
-        exif = img._getexif()
-        if not exif:
-            return "Unknown", "Unknown"
-        
-        for tag, value in ExifTags.TAGS.items():
-            if value == 'DateTimeOriginal':
-                if tag in exif:
-                    dt = str(exif[tag]).split(' ')
-                    if len(dt) == 2:
-                        return dt[0].replace(':', '/'), dt[1]
-    except:
+        if isinstance(source, (bytes, bytearray)):
+            head = source[:max_bytes or EXIF_READ_BYTES]
+        else:
+            with open(source, 'rb') as f:
+                head = f.read(max_bytes or EXIF_READ_BYTES)
+        
+        if head[:2] != b'\xff\xd8':
+            return None
+        
+        # APP1 sits among the markers before the image data
+        pos = 2
+        while pos + 4 <= len(head):
+            if head[pos] != 0xFF:
+                return None
+            marker = head[pos + 1]
+            if marker == 0xFF:
+                pos += 1
+                continue
+            if marker in (0xD9, 0xDA):
+                return None
+            length = int.from_bytes(head[pos + 2:pos + 4], 'big')
+            if marker == 0xE1 and head[pos + 4:pos + 10] == b'Exif\x00\x00':
+                return _tiff_datetime_original(head[pos + 10:pos + 2 + length])
+            pos += 2 + length
+    except Exception:
         pass
     
-    return "Unknown", "Unknown"
+    return None
+
+def _tiff_datetime_original(tiff):
+    """DateTimeOriginal from a TIFF-structured EXIF block (raises if malformed)."""
+    order = {b'II': 'little', b'MM': 'big'}[tiff[:2]]
+    
+    def u16(offset):
+        return int.from_bytes(tiff[offset:offset + 2], order)
+    
+    def u32(offset):
+        return int.from_bytes(tiff[offset:offset + 4], order)
+    
+    def find(ifd, tag):
+        for entry in range(ifd + 2, ifd + 2 + 12 * u16(ifd), 12):
+            if u16(entry) == tag:
+                return entry
+        return None
+    
+    # IFD0 -> Exif sub-IFD (0x8769) -> DateTimeOriginal (0x9003, ASCII)
+    exif_ifd = find(u32(4), 0x8769)
+    if exif_ifd is None:
+        return None
+    entry = find(u32(exif_ifd + 8), 0x9003)
+    if entry is None:
+        return None
+    count = u32(entry + 4)
+    offset = entry + 8 if count <= 4 else u32(entry + 8)
+    text = tiff[offset:offset + count].split(b'\x00')[0].decode('ascii').strip()
+    return datetime.strptime(text, "%Y:%m:%d %H:%M:%S")
+
+def read_exif_datetimes(paths, workers=None):
+    """read_exif_datetime for many files in parallel; results in input order."""
+    with concurrent.futures.ThreadPoolExecutor(workers or EXIF_WORKERS) as pool:
+        return list(pool.map(read_exif_datetime, paths))
+
+def get_exif_data(image):
+    """(date, time) strings from EXIF DateTimeOriginal, or (None, None).
+    
+    image is a path or the file bytes; only the header is read.
+    """
+    stamp = read_exif_datetime(image)
+    if stamp is None:
+        return None, None
+    return stamp.strftime("%Y/%m/%d"), stamp.strftime("%H:%M:%S")
+
+# ===========================================================================
+# IMAGE CONTEXT
+# ===========================================================================
+
+class ImageContext:
+    """One image, read once and decoded once, shared by every stage.
+    
+    Bytes, EXIF and the decoded RGB image are loaded lazily on first use, so
+    a cache hit only pays for reading and hashing the file. Call release()
+    once the row is written to drop the buffers.
+    
+    With DECODE_DRAFT the decoded image may be smaller than the file; boxes
+    passed to crop() are always in full-resolution pixels.
+    """
+    
+    def __init__(self, image_path, data=None):
+        self.path = image_path
+        self.name = os.path.basename(image_path)
+        self._lock = threading.Lock()
+        self._data = data  # Bytes already in memory (e.g. an upload); read from path otherwise
+        self._hash = None
+        self._exif = None
+        self._image = None
+        self._full_image = None
+        self.scale = 1.0
+    
+    @property
+    def data(self):
+        """Raw file bytes (read once)."""
+        with self._lock:
+            if self._data is None:
+                with open(self.path, 'rb') as f:
+                    self._data = f.read()
+            return self._data
+    
+    @property
+    def sha256(self):
+        """Content hash used as the result cache key."""
+        if self._hash is None:
+            self._hash = hashlib.sha256(self.data).hexdigest()
+        return self._hash
+    
+    @property
+    def exif(self):
+        """(date, time) from EXIF DateTimeOriginal (header only, no decode)."""
+        if self._exif is None:
+            self._exif = get_exif_data(self.data)
+        return self._exif
+    
+    @property
+    def image(self):
+        """Decoded, orientation-corrected RGB image (decoded once).
+        
+        With DECODE_DRAFT, JPEGs are decoded at the smallest DCT scale whose
+        long side is still at least DECODE_SIZE; `scale` maps its pixels back
+        to the full-resolution image.
+        """
+        data = self.data
+        with self._lock:
+            if self._image is None:
+                img = Image.open(io.BytesIO(data))
+                full_long = max(img.size)
+                if DECODE_DRAFT and full_long > DECODE_SIZE:
+                    ratio = DECODE_SIZE / full_long
+                    img.draft('RGB', (int(img.width * ratio + 0.999), int(img.height * ratio + 0.999)))
+                self._image = ImageOps.exif_transpose(img).convert("RGB")
+                self.scale = full_long / max(self._image.size)
+            return self._image
+    
+    @property
+    def full_image(self):
+        """Full-resolution image for small crops (decoded once, only when asked)."""
+        img = self.image
+        if self.scale == 1.0:
+            return img
+        data = self.data
+        with self._lock:
+            if self._full_image is None:
+                self._full_image = ImageOps.exif_transpose(Image.open(io.BytesIO(data))).convert("RGB")
+            return self._full_image
+    
+    @property
+    def array(self):
+        """RGB image as an HxWx3 uint8 array."""
+        return np.asarray(self.image)
+    
+    def crop(self, box):
+        """Crop a full-resolution (x1, y1, x2, y2) box, clipped to the image.
+        
+        Boxes shorter than FULL_RES_CROP_PX in the decoded image are cut from
+        the full-resolution image instead, so distant people keep their detail.
+        """
+        img = self.image
+        scale = self.scale
+        if scale > 1 and FULL_RES_CROP_PX and (box[3] - box[1]) / scale < FULL_RES_CROP_PX:
+            img, scale = self.full_image, 1.0
+        x1, y1, x2, y2 = (int(v / scale) for v in box)
+        return img.crop((
+            max(0, x1), max(0, y1),
+            min(img.width, x2), min(img.height, y2)
+        ))
+    
+    def thumbnail(self, max_dim=800):
+        """Small copy for validation sheets, kept after release().
+        
+        Falls back to the path if the image can't be decoded.
+        """
+        try:
+            thumb = self.image.copy()
+        except Exception:
+            return self.path
+        thumb.thumbnail((max_dim, max_dim))
+        return thumb
+    
+    def load(self, decode=True):
+        """Read and parse EXIF now, and decode unless decode=False (e.g. from a prefetch thread).
+        
+        Errors are left for the consuming stage to report.
+        """
+        try:
+            self.exif
+            if decode:
+                self.image
+        except Exception:
+            pass
+    
+    def release(self):
+        """Drop the file bytes and decoded image."""
+        with self._lock:
+            self._data = None
+            self._image = None
+            self._full_image = None
+
+# ===========================================================================
+# PREFETCH
+# ===========================================================================
+
+def batch_slices(items, batch_size):
+    """(start, end) ranges of about batch_size items that never split a sequence."""
+    slices, start = [], 0
+    while start < len(items):
+        end = min(start + batch_size, len(items))
+        sequence = items[end - 1].get('sequence')
+        while sequence is not None and end < len(items) and items[end].get('sequence') == sequence:
+            end += 1
+        slices.append((start, end))
+        start = end
+    return slices
+
+class Prefetcher:
+    """Reads, parses EXIF and decodes upcoming batches in a thread pool.
+    
+    With a `decode(ctx)` predicate, only images it returns True for are
+    decoded ahead (e.g. result cache misses); the rest are decoded later,
+    and only if a stage needs the pixels. At most `depth` images (but always
+    at least one batch) are held ahead of inference, which bounds memory.
+    Time spent waiting for a batch that was not ready yet is recorded as
+    I/O wait.
+    """
+    
+    def __init__(self, workers=None, depth=None, decode=None):
+        self.pool = concurrent.futures.ThreadPoolExecutor(max_workers=workers or PREFETCH_WORKERS)
+        self.depth = depth or PREFETCH_DEPTH
+        self.decode = decode
+        self.io_wait = 0.0
+        self.stalls = 0
+        self.batch_count = 0
+    
+    def batches(self, items, batch_size):
+        """Yield (start, batch, contexts) with every context already loaded."""
+        slices = iter(batch_slices(items, batch_size))
+        pending = collections.deque()
+        queued = 0
+        
+        while True:
+            # Keep the read-ahead window full
+            while not pending or queued < self.depth:
+                start, end = next(slices, (None, None))
+                if start is None:
+                    break
+                batch = items[start:end]
+                futures = [self.pool.submit(self._load, item['path']) for item in batch]
+                pending.append((start, batch, futures))
+                queued += len(batch)
+            
+            if not pending:
+                return
+            
+            start, batch, futures = pending.popleft()
+            queued -= len(batch)
+            
+            waited = time.perf_counter()
+            contexts = [future.result() for future in futures]
+            waited = time.perf_counter() - waited
+            
+            self.batch_count += 1
+            self.io_wait += waited
+            if waited > 0.01:
+                self.stalls += 1
+            
+            yield start, batch, contexts
+    
+    def _load(self, image_path):
+        ctx = ImageContext(image_path)
+        try:
+            decode = self.decode is None or self.decode(ctx)
+        except Exception:
+            decode = True  # Let the consuming stage report unreadable files
+        ctx.load(decode=decode)
+        return ctx
+    
+    def report(self):
+        """Print how often inference waited on storage."""
+        if not self.batch_count:
+            return
+        print(f"  Inference waited on I/O in {self.stalls}/{self.batch_count} batches "
+              f"({self.stalls / self.batch_count:.0%}), {self.io_wait:.1f} sec total")
+    
+    def close(self):
+        self.pool.shutdown(wait=False)
+
+# ===========================================================================
+# EMPTY-FRAME PREFILTER
+# ===========================================================================
+
+class BackgroundModel:
+    """Running background per site and time of day, from tiny grayscale frames.
+    
+    A frame whose downsampled image barely differs from its site/hour
+    background is marked empty, so neither model has to run on it.
+    """
+    
+    def __init__(self):
+        self.backgrounds = {}
+    
+    def check(self, site, ctx):
+        """Return {'foreground': fraction, 'empty': bool}, or None if unreadable."""
+        try:
+            small = ctx.image.convert('L').resize(PREFILTER_SIZE, Image.BILINEAR)
+            _, time_str = ctx.exif
+        except Exception:
+            return None
+        
+        # Remove overall brightness so exposure changes don't count as motion
+        frame = np.asarray(small, dtype=np.float32)
+        frame -= frame.mean()
+        
+        try:
+            bucket = int(time_str.split(':')[0]) // PREFILTER_HOUR_BUCKET
+        except (ValueError, AttributeError):
+            bucket = 'unknown'
+        key = (site, bucket)
+        
+        background, count = self.backgrounds.get(key, (None, 0))
+        if background is None:
+            foreground = 1.0
+        else:
+            foreground = float((np.abs(frame - background) > PREFILTER_PIXEL_DELTA).mean())
+        
+        empty = count >= PREFILTER_WARMUP and foreground < PREFILTER_MIN_FOREGROUND
+        
+        # Learn from background-like frames (and everything while warming up)
+        if background is None:
+            self.backgrounds[key] = (frame, 1)
+        elif count < PREFILTER_WARMUP or foreground < PREFILTER_MIN_FOREGROUND:
+            alpha = max(1.0 / (count + 1), 0.05)
+            self.backgrounds[key] = ((1 - alpha) * background + alpha * frame, count + 1)
+        
+        return {'foreground': round(foreground, 4), 'empty': empty}
+
+background_model = BackgroundModel()
+
+# ===========================================================================
+# SEQUENCE GROUPING
+# ===========================================================================
+
+def build_sequences(files):
+    """Group frames into bursts: same site, EXIF times within SEQUENCE_GAP_SECONDS.
+    
+    Sets item['sequence'] on every file and returns the sequences (lists of
+    items in time order). Frames without a timestamp are their own sequence.
+    Timestamps already known from the file manifest are not read again.
+    """
+    missing = [item for item in files if 'timestamp' not in item]
+    for item, stamp in zip(missing, read_exif_datetimes([item['path'] for item in missing])):
+        item['timestamp'] = stamp
+    stamps = [item['timestamp'] for item in files]
+    
+    by_site = collections.defaultdict(list)
+    sequences = []
+    for item, stamp in zip(files, stamps):
+        if stamp is None:
+            sequences.append([item])
+        else:
+            by_site[item['site']].append((stamp, item))
+    
+    for frames in by_site.values():
+        frames.sort(key=lambda frame: frame[0])
+        current, last = [], None
+        for stamp, item in frames:
+            if current and (stamp - last).total_seconds() > SEQUENCE_GAP_SECONDS:
+                sequences.append(current)
+                current = []
+            current.append(item)
+            last = stamp
+        sequences.append(current)
+    
+    counters = collections.Counter()
+    for sequence in sequences:
+        site = sequence[0]['site']
+        counters[site] += 1
+        for item in sequence:
+            item['sequence'] = f"{site}_{counters[site]:05d}"
+    
+    return sequences
+
+def summarize_sequences(results_df):
+    """One row per sequence: frame count, time span and max count per column.
+    
+    The max over frames is the number of visitors seen together, so a burst
+    of one hiker counts once instead of once per frame.
+    """
+    import pandas as pd
+    count_columns = [
+        c for c in results_df.columns
+        if c.startswith('Pipeline_') and pd.api.types.is_numeric_dtype(results_df[c])
+    ]
+    df = results_df.dropna(subset=['Sequence_ID'])
+    stamps = pd.to_datetime(
+        df['Date'].astype(str) + ' ' + df['Time'].astype(str),
+        format='%Y/%m/%d %H:%M:%S', errors='coerce'
+    )
+    grouped = df.assign(Timestamp=stamps).groupby('Sequence_ID')
+    summary = grouped[count_columns].max()
+    summary.insert(0, 'Site', grouped['Site'].first())
+    summary.insert(1, 'Frames', grouped.size())
+    summary.insert(2, 'Start', grouped['Timestamp'].min())
+    summary.insert(3, 'End', grouped['Timestamp'].max())
+    return summary.reset_index()
+
+# ===========================================================================
+# RESULT CACHE
+# ===========================================================================
+
+def cache_namespace(*params):
+    """Short fingerprint of the model identity and parameters."""
+    return hashlib.sha1(json.dumps(params, default=str).encode('utf-8')).hexdigest()[:16]
+
+class ResultCache:
+    """On-disk result cache keyed by image content hash + model parameters.
+    
+    Entries are evicted least-recently-used once more than max_entries are
+    stored. Safe to share between the Claude thread and the main thread.
+    Hits only note the last-use time in memory; those times and new entries
+    are committed every COMMIT_INTERVAL changes and on flush(), so a rerun
+    over cached images does not write once per image.
+    """
+    
+    COMMIT_INTERVAL = 200
+    
+    def __init__(self, path, max_entries=None):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.max_entries = max_entries or CACHE_MAX_ENTRIES
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS results "
+            "(key TEXT PRIMARY KEY, value TEXT NOT NULL, used REAL NOT NULL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS results_used ON results (used)")
+        self.conn.commit()
+        self.size = self.conn.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+        self.touched = {}
+        self.pending = 0
+        self.hits = {}
+        self.misses = {}
+    
+    def get(self, key, kind):
+        """Return the cached result dict, or None."""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT value FROM results WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses[kind] = self.misses.get(kind, 0) + 1
+                return None
+            self.touched[key] = time.time()
+            self.hits[kind] = self.hits.get(kind, 0) + 1
+            if len(self.touched) >= self.COMMIT_INTERVAL:
+                self._write_back()
+            return json.loads(row[0])
+    
+    def put(self, key, value):
+        """Store a result dict, evicting the least recently used entries."""
+        with self.lock:
+            row = (json.dumps(value), time.time(), key)
+            cursor = self.conn.execute("UPDATE results SET value = ?, used = ? WHERE key = ?", row)
+            if not cursor.rowcount:
+                self.conn.execute("INSERT INTO results (value, used, key) VALUES (?, ?, ?)", row)
+                self.size += 1
+            self.touched.pop(key, None)
+            self.pending += 1
+            
+            if self.size > self.max_entries:
+                self._write_back()  # Eviction order needs the buffered use times
+                self.conn.execute(
+                    "DELETE FROM results WHERE key IN "
+                    "(SELECT key FROM results ORDER BY used LIMIT ?)",
+                    (self.size - self.max_entries,)
+                )
+                self.size = self.max_entries
+            if self.pending >= self.COMMIT_INTERVAL:
+                self._write_back()
+    
+    def flush(self):
+        """Commit buffered use times and new entries."""
+        with self.lock:
+            self._write_back()
+    
+    def _write_back(self):
+        if self.touched:
+            self.conn.executemany(
+                "UPDATE results SET used = ? WHERE key = ?",
+                [(used, key) for key, used in self.touched.items()]
+            )
+            self.touched = {}
+        self.conn.commit()
+        self.pending = 0
+    
+    def merge(self, puts, touched, hits, misses):
+        """Apply the cache changes a worker process collected (see WorkerCache)."""
+        for key, value in puts:
+            self.put(key, value)
+        with self.lock:
+            now = time.time()
+            for key in touched:
+                self.touched[key] = now
+            for kind, n in hits.items():
+                self.hits[kind] = self.hits.get(kind, 0) + n
+            for kind, n in misses.items():
+                self.misses[kind] = self.misses.get(kind, 0) + n
+            if len(self.touched) >= self.COMMIT_INTERVAL:
+                self._write_back()
+    
+    def contains(self, key):
+        """True if the key is cached (not counted as a hit or miss)."""
+        with self.lock:
+            return self.conn.execute(
+                "SELECT 1 FROM results WHERE key = ?", (key,)
+            ).fetchone() is not None
+    
+    def report(self):
+        """Print hit/miss counters per model."""
+        for kind in sorted(set(self.hits) | set(self.misses)):
+            hits, misses = self.hits.get(kind, 0), self.misses.get(kind, 0)
+            rate = hits / (hits + misses) if hits + misses else 0
+            print(f"  {kind}: {hits} hits / {misses} misses ({rate:.0%} hit rate)")
+
+# ===========================================================================
+# FILE MANIFEST
+# ===========================================================================
+
+def file_sha256(path):
+    """SHA-256 of a file's contents, read in 1 MB chunks."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class FileManifest:
+    """Persistent SQLite index of the image files under every site folder.
+    
+    Holds (site, relative path, size, mtime, content hash, EXIF time) per
+    file, found recursively with os.scandir. Rescans only stat directories:
+    a folder whose mtime is unchanged is not listed again, so new card dumps
+    are picked up without re-walking Drive. Files are also marked processed
+    per run mode, so unprocessed files of a site are one query away.
+    """
+    
+    def __init__(self, path, mode):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.mode = mode
+        self.roots = {}
+        self.paths = {}
+        self.pending = []
+        self.conn = sqlite3.connect(path, timeout=30)
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS files (
+                site TEXT, relpath TEXT, dir TEXT, size INTEGER, mtime REAL,
+                sha256 TEXT, exif_ts TEXT, PRIMARY KEY (site, relpath));
+            CREATE INDEX IF NOT EXISTS files_dir ON files (site, dir);
+            CREATE TABLE IF NOT EXISTS dirs (
+                site TEXT, relpath TEXT, mtime REAL, PRIMARY KEY (site, relpath));
+            CREATE TABLE IF NOT EXISTS processed (
+                site TEXT, relpath TEXT, mode TEXT, size INTEGER, mtime REAL,
+                PRIMARY KEY (site, relpath, mode));
+        """)
+    
+    def scan(self, site, root, full=False):
+        """Bring one site up to date; returns (new or changed, removed) file counts.
+        
+        full=True lists every folder even if its mtime is unchanged (catches
+        files rewritten in place, which do not touch the folder mtime).
+        """
+        self.roots[site] = root
+        known = dict(self.conn.execute("SELECT relpath, mtime FROM dirs WHERE site = ?", (site,)))
+        children = collections.defaultdict(list)
+        for rel in known:
+            if rel:
+                children[os.path.dirname(rel)].append(rel)
+        
+        seen, listed = set(), []
+        stack = ['']
+        while stack:
+            rel = stack.pop()
+            folder = os.path.join(root, rel)
+            try:
+                mtime = os.stat(folder).st_mtime
+            except OSError:
+                continue
+            seen.add(rel)
+            if not full and known.get(rel) == mtime:
+                # Unchanged folder: visit its known subfolders without listing it
+                stack.extend(children[rel])
+                continue
+            
+            entries = {}
+            with os.scandir(folder) as it:
+                for entry in it:
+                    child = os.path.join(rel, entry.name)
+                    if entry.is_dir():
+                        stack.append(child)
+                    elif entry.name.lower().endswith(('.jpg', '.jpeg', '.png')):
+                        stat = entry.stat()
+                        entries[child] = (stat.st_size, stat.st_mtime)
+            listed.append((rel, mtime, entries))
+        
+        changed, removed = [], []
+        for rel, _, entries in listed:
+            stored = {
+                relpath: (size, mtime) for relpath, size, mtime in self.conn.execute(
+                    "SELECT relpath, size, mtime FROM files WHERE site = ? AND dir = ?", (site, rel)
+                )
+            }
+            changed += [(rel, relpath, *stat) for relpath, stat in entries.items()
+                        if stored.get(relpath) != stat]
+            removed += [relpath for relpath in stored if relpath not in entries]
+        gone = [rel for rel in known if rel not in seen]
+        for rel in gone:
+            removed += [relpath for (relpath,) in self.conn.execute(
+                "SELECT relpath FROM files WHERE site = ? AND dir = ?", (site, rel)
+            )]
+        
+        # Header-only EXIF (and optionally a content hash) for new or changed files
+        paths = [os.path.join(root, relpath) for _, relpath, _, _ in changed]
+        stamps = read_exif_datetimes(paths)
+        if MANIFEST_HASH:
+            with concurrent.futures.ThreadPoolExecutor(EXIF_WORKERS) as pool:
+                hashes = list(pool.map(file_sha256, paths))
+        else:
+            hashes = [None] * len(paths)
+        
+        with self.conn:
+            self.conn.executemany("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?)", [
+                (site, relpath, rel, size, mtime, digest, stamp.isoformat() if stamp else None)
+                for (rel, relpath, size, mtime), stamp, digest in zip(changed, stamps, hashes)
+            ])
+            self.conn.executemany("DELETE FROM files WHERE site = ? AND relpath = ?",
+                                  [(site, relpath) for relpath in removed])
+            self.conn.executemany("DELETE FROM dirs WHERE site = ? AND relpath = ?",
+                                  [(site, rel) for rel in gone])
+            self.conn.executemany("INSERT OR REPLACE INTO dirs VALUES (?, ?, ?)",
+                                  [(site, rel, mtime) for rel, mtime, _ in listed])
+        
+        return len(changed), len(removed)
+    
+    def files(self, site, unprocessed=False):
+        """Image items for a scanned site, ordered by relative path.
+        
+        With unprocessed=True, files this run mode already processed (at
+        their current size and mtime) are left out.
+        """
+        query = "SELECT f.relpath, f.exif_ts FROM files f"
+        params = []
+        if unprocessed:
+            query += (" LEFT JOIN processed p ON p.site = f.site AND p.relpath = f.relpath"
+                      " AND p.mode = ? AND p.size = f.size AND p.mtime = f.mtime")
+            params.append(self.mode)
+        query += " WHERE f.site = ?" + (" AND p.relpath IS NULL" if unprocessed else "")
+        params.append(site)
+        
+        items = []
+        for relpath, exif_ts in self.conn.execute(query + " ORDER BY f.relpath", params):
+            path = os.path.join(self.roots[site], relpath)
+            self.paths[path] = (site, relpath)
+            items.append({
+                'site': site,
+                'name': relpath,
+                'path': path,
+                'timestamp': datetime.fromisoformat(exif_ts) if exif_ts else None
+            })
+        return items
+    
+    def mark_processed(self, path):
+        """Record a finished file; written on the next flush()."""
+        if path in self.paths:
+            self.pending.append((self.mode, *self.paths[path]))
+    
+    def flush(self):
+        if not self.pending:
+            return
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO processed "
+                "SELECT site, relpath, ?, size, mtime FROM files WHERE site = ? AND relpath = ?",
+                self.pending
+            )
+        self.pending = []
+    
+    def close(self):
+        self.flush()
+        self.conn.close()
+
+# ===========================================================================
+# ONNX RUNTIME BACKEND
+# ===========================================================================
+
+def onnx_session(path):
+    """CPU ONNX Runtime session with full graph optimization and our thread budget."""
+    ort = require('onnxruntime')
+    options = ort.SessionOptions()
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    options.intra_op_num_threads = ONNX_INTRA_THREADS or torch.get_num_threads()
+    options.inter_op_num_threads = ONNX_INTER_THREADS
+    if ONNX_INTER_THREADS > 1:
+        options.execution_mode = ort.ExecutionMode.ORT_PARALLEL
+    return ort.InferenceSession(path, options, providers=['CPUExecutionProvider'])
+
+class OnnxModule(torch.nn.Module):
+    """Runs an exported ONNX graph in place of a torch module.
+    
+    Holds one dummy parameter, because YOLOv5's AutoShape reads the input
+    dtype and device from the wrapped model's parameters.
+    """
+    
+    def __init__(self, path):
+        super().__init__()
+        self.session = onnx_session(path)
+        self.input_name = self.session.get_inputs()[0].name
+        self.dummy = torch.nn.Parameter(torch.zeros(1), requires_grad=False)
+    
+    def forward(self, x):
+        output = self.session.run(None, {self.input_name: x.detach().cpu().float().numpy()})[0]
+        return torch.from_numpy(output)
+
+class ClipImageTower(torch.nn.Module):
+    """CLIP image encoder + projection only (what classify_crops runs)."""
+    
+    def __init__(self, clip_model):
+        super().__init__()
+        self.clip_model = clip_model
+    
+    def forward(self, pixel_values):
+        return self.clip_model.get_image_features(pixel_values=pixel_values)
+
+def export_onnx(module, example, path, input_name, dynamic_axes):
+    """Trace a CPU module to ONNX (written atomically)."""
+    require('onnx')
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Newer torch defaults to the dynamo exporter; dynamic_axes needs the tracer
+    options = {'dynamo': False} if 'dynamo' in inspect.signature(torch.onnx.export).parameters else {}
+    with torch.no_grad():
+        torch.onnx.export(
+            module, example, path + '.part',
+            input_names=[input_name], output_names=['output'],
+            dynamic_axes=dynamic_axes, opset_version=ONNX_OPSET, **options
+        )
+    os.replace(path + '.part', path)
+
+def export_detector_onnx(md, path):
+    """Export the network inside YOLOv5's AutoShape, with dynamic batch and image size.
+    
+    Letterboxing and NMS stay in AutoShape, so both backends share them.
+    """
+    model = copy.deepcopy(md.model.model).cpu().float().eval()
+    for m in model.modules():
+        if type(m).__name__ == 'Detect':
+            m.dynamic = True  # Anchor grids follow the input shape instead of the traced one
+            m.export = True
+    export_onnx(
+        model, torch.zeros(1, 3, 640, 640), path, 'images',
+        {'images': {0: 'batch', 2: 'height', 3: 'width'}, 'output': {0: 'batch', 1: 'anchors'}}
+    )
+
+def export_clip_onnx(clip_model, clip_proc, path):
+    """Export the CLIP image tower with a dynamic batch size."""
+    size = clip_proc.crop_size['height']
+    export_onnx(
+        ClipImageTower(clip_model).eval(), torch.zeros(1, 3, size, size), path, 'pixel_values',
+        {'pixel_values': {0: 'batch'}, 'output': {0: 'batch'}}
+    )
 
 # ===========================================================================
 # MEGADETECTOR + CLIP PIPELINE CLASS
@@ -116,97 +975,634 @@ def get_exif_data(image_path):
 class PipelineModel:
     """MegaDetector v5a + CLIP for activity detection."""
     
-    def __init__(self):
+    WEIGHTS = "md_v5a.0.0.pt"
+    
+    def __init__(self, cache=None, backend=None):
         """Initialize MegaDetector and CLIP models."""
+        self.cache = cache
+        self.backend = backend or BACKEND
+        self.clip_image = None  # ONNX image tower (torch backend: clip_model)
+        started = time.perf_counter()
+        
         print("Loading MegaDetector...")
-        self.weights = "md_v5a.0.0.pt"
+        self.weights = self.WEIGHTS
+        self.md = self._load_detector()
+        self.md.conf = MD_THRESHOLD
+        
+        # Load CLIP for classification
+        print("Loading CLIP model...")
+        self.clip_model, self.clip_proc = self._load_clip()
+        
+        self.labels = list(CLIP_PROMPTS)
+        self.label_map = {i: CLIP_LABEL_MAP[name] for i, name in enumerate(self.labels)}
+        self.text_features = self._load_label_bank()
+        
+        # Everything that can change a pipeline result
+        self.cache_namespace = cache_namespace(
+            'pipeline', self.weights, MD_THRESHOLD,
+            CLIP_MODEL_NAME, CLIP_PROMPTS, CLIP_LABEL_MAP,
+            DECODE_DRAFT, DECODE_SIZE, FULL_RES_CROP_PX
+        )
+        
+        if self.backend == "onnx":
+            self.use_onnx()
+        
+        print(f"✓ Pipeline models loaded in {time.perf_counter() - started:.1f}s")
+    
+    def use_onnx(self, export=False):
+        """Run the detector network and CLIP image tower in ONNX Runtime (CPU).
+        
+        Exports both to MODEL_FOLDER on first use (or when export=True). The
+        torch detector keeps its letterboxing and NMS; only the network inside
+        it is replaced.
+        """
+        md_path, clip_path = self.onnx_paths()
+        if export or not os.path.exists(md_path):
+            print("  Exporting MegaDetector to ONNX...")
+            export_detector_onnx(self.md, md_path)
+        if export or not os.path.exists(clip_path):
+            print("  Exporting CLIP image tower to ONNX...")
+            export_clip_onnx(self.clip_model, self.clip_proc, clip_path)
+        
+        self.md.model.model = OnnxModule(md_path)
+        self.clip_image = OnnxModule(clip_path)
+        self.backend = "onnx"
+        # Results match torch within tolerance, not bit for bit
+        self.cache_namespace = cache_namespace(self.cache_namespace, 'onnx')
+        print(f"  ✓ ONNX Runtime backend ({ONNX_INTRA_THREADS or torch.get_num_threads()} "
+              f"intra-op / {ONNX_INTER_THREADS} inter-op threads)")
+    
+    @classmethod
+    def onnx_paths(cls):
+        """Exported detector and CLIP image tower files in MODEL_FOLDER."""
+        return (
+            os.path.join(MODEL_FOLDER, cls.WEIGHTS.replace('.pt', '.onnx')),
+            os.path.join(MODEL_FOLDER, CLIP_MODEL_NAME.replace('/', '--') + '-image.onnx')
+        )
+    
+    @staticmethod
+    def label_bank_path():
+        """Label bank cache file for the current CLIP model and prompt list."""
+        key = hashlib.sha1(
+            json.dumps([CLIP_MODEL_NAME, list(CLIP_PROMPTS.items())]).encode('utf-8')
+        ).hexdigest()[:16]
+        return os.path.join(CACHE_FOLDER, f"clip_labels_{key}.pt")
+    
+    @classmethod
+    def files_ready(cls):
+        """True when every file the models load is already on disk (no downloads)."""
+        paths = [cls.label_bank_path()]
+        if OFFLINE_MODELS:
+            paths += [
+                os.path.join(MODEL_FOLDER, cls.WEIGHTS),
+                os.path.join(MODEL_FOLDER, 'yolov5', 'hubconf.py'),
+                os.path.join(MODEL_FOLDER, CLIP_MODEL_NAME.replace('/', '--'), 'config.json'),
+            ]
+        else:
+            paths += [
+                cls.WEIGHTS,
+                os.path.join(torch.hub.get_dir(), 'ultralytics_yolov5_master', 'hubconf.py'),
+            ]
+        if BACKEND == "onnx":
+            paths += list(cls.onnx_paths())
+        return all(os.path.exists(path) for path in paths)
+    
+    def _load_detector(self):
+        """MegaDetector through YOLOv5's hub code, offline after the first run.
         
-        # Download weights if needed
-        if not os.path.exists(self.weights):
+        With OFFLINE_MODELS the weights and a snapshot of the YOLOv5 code are
+        kept in MODEL_FOLDER, and later runs load the snapshot with
+        source='local' instead of fetching the repository from GitHub.
+        """
+        folder = MODEL_FOLDER if OFFLINE_MODELS else '.'
+        weights = os.path.join(folder, self.weights)
+        if not os.path.exists(weights):
             print("  Downloading MegaDetector weights (~330MB)...")
+            os.makedirs(folder, exist_ok=True)
             r = requests.get(
                 "https://github.com/ecologize/CameraTraps/releases/download/v5.0/md_v5a.0.0.pt"
             )
-            with open(self.weights, 'wb') as f:
+            r.raise_for_status()
+            with open(weights + '.part', 'wb') as f:
                 f.write(r.content)
+            os.replace(weights + '.part', weights)  # Never leave truncated weights behind
         
-        # Load YOLOv5 with MegaDetector weights
-        self.md = torch.hub.load(
-            'ultralytics/yolov5', 'custom',
-            path=self.weights, trust_repo=True
-        )
-        self.md.conf = MD_THRESHOLD
+        require('ultralytics')  # Imported by YOLOv5's hub code
+        snapshot = os.path.join(MODEL_FOLDER, 'yolov5')
+        if OFFLINE_MODELS and os.path.exists(os.path.join(snapshot, 'hubconf.py')):
+            return torch.hub.load(snapshot, 'custom', path=weights, source='local')
         
-        # Load CLIP for classification
-        print("Loading CLIP model...")
-        self.clip_model = CLIPModel.from_pretrained(
-            "openai/clip-vit-base-patch32"
-        ).to(DEVICE)
-        self.clip_proc = CLIPProcessor.from_pretrained(
-            "openai/clip-vit-base-patch32"
-        )
+        md = torch.hub.load('ultralytics/yolov5', 'custom', path=weights, trust_repo=True)
+        if OFFLINE_MODELS:
+            # Pin the code that was just fetched, so later runs need no network
+            try:
+                partial = snapshot + '.partial'
+                shutil.rmtree(partial, ignore_errors=True)
+                shutil.copytree(
+                    os.path.join(torch.hub.get_dir(), 'ultralytics_yolov5_master'), partial,
+                    ignore=shutil.ignore_patterns('.git', '__pycache__')
+                )
+                os.replace(partial, snapshot)
+                print(f"  ✓ YOLOv5 code saved for offline starts: {snapshot}")
+            except Exception as e:
+                print(f"  ⚠ Could not save YOLOv5 code snapshot: {e}")
+        return md
+    
+    def _load_clip(self):
+        """CLIP model (on DEVICE) and image processor, saved locally on first use.
+        
+        Sets clip_source to the local copy when it exists, so the tokenizer
+        for the label bank is read from disk as well.
+        """
+        require('transformers')
+        from transformers import CLIPImageProcessor, CLIPModel, CLIPTokenizer
+        
+        local = os.path.join(MODEL_FOLDER, CLIP_MODEL_NAME.replace('/', '--'))
+        if OFFLINE_MODELS and os.path.exists(os.path.join(local, 'config.json')):
+            self.clip_source = local
+            model = CLIPModel.from_pretrained(local, local_files_only=True)
+            proc = CLIPImageProcessor.from_pretrained(local, local_files_only=True)
+            return model.to(DEVICE), proc
+        
+        self.clip_source = CLIP_MODEL_NAME
+        model = CLIPModel.from_pretrained(CLIP_MODEL_NAME)
+        proc = CLIPImageProcessor.from_pretrained(CLIP_MODEL_NAME)
+        if OFFLINE_MODELS:
+            try:
+                partial = local + '.partial'
+                shutil.rmtree(partial, ignore_errors=True)
+                model.save_pretrained(partial)
+                proc.save_pretrained(partial)
+                CLIPTokenizer.from_pretrained(CLIP_MODEL_NAME).save_pretrained(partial)
+                os.replace(partial, local)
+                print(f"  ✓ CLIP saved for offline starts: {local}")
+            except Exception as e:
+                print(f"  ⚠ Could not save CLIP locally: {e}")
+        return model.to(DEVICE), proc
+    
+    def _load_label_bank(self):
+        """Load normalized class embeddings from cache, or encode them once.
+        
+        The cache file is keyed by CLIP model name and the full prompt list, so
+        warm starts never run the CLIP tokenizer or text encoder.
+        """
+        cache_path = self.label_bank_path()
+        
+        if os.path.exists(cache_path):
+            try:
+                bank = torch.load(cache_path, map_location=DEVICE)
+                print("  ✓ CLIP label bank loaded from cache")
+                return bank['embeddings']
+            except Exception as e:
+                print(f"  ⚠ Ignoring unreadable label bank cache: {e}")
         
-        self.labels = ["a photo of a child", "a photo of a man", "a photo of a woman"]
-        self.label_map = {0: "Child", 1: "Adult", 2: "Adult"}
+        # Encode every prompt, then average each class's prompts into one embedding
+        from transformers import CLIPTokenizer
+        tokenizer = CLIPTokenizer.from_pretrained(self.clip_source)
+        embeddings = []
+        for name in self.labels:
+            text_inputs = tokenizer(
+                CLIP_PROMPTS[name], return_tensors="pt", padding=True
+            ).to(DEVICE)
+            with torch.no_grad():
+                features = self.clip_model.get_text_features(**text_inputs)
+            features = features / features.norm(dim=-1, keepdim=True)
+            mean = features.mean(dim=0)
+            embeddings.append(mean / mean.norm())
+        embeddings = torch.stack(embeddings)
         
-        print("✓ Pipeline models loaded")
+        try:
+            os.makedirs(CACHE_FOLDER, exist_ok=True)
+            partial = f"{cache_path}.{os.getpid()}.part"
+            torch.save({
+                'model': CLIP_MODEL_NAME,
+                'prompts': CLIP_PROMPTS,
+                'embeddings': embeddings.cpu()
+            }, partial)
+            os.replace(partial, cache_path)  # Readers never see a half-written file
+        except Exception as e:
+            print(f"  ⚠ Could not save label bank cache: {e}")
+        
+        return embeddings
+    
+    @staticmethod
+    def _empty_result():
+        """Return empty result dict."""
+        return {
+            'Total': 0,
+            'Adult': 0,
+            'Child': 0,
+            'crops': []
+        }
     
-    def analyze(self, image_path):
+    def analyze(self, image):
         """Analyze image with MegaDetector + CLIP."""
+        return self.analyze_batch([image])[0]
+    
+    def analyze_batch(self, images):
+        """Analyze several images with one batched MegaDetector pass + CLIP.
+        
+        Accepts image paths or ImageContext objects; returns one result dict
+        per image, in input order.
+        """
+        contexts = [img if isinstance(img, ImageContext) else ImageContext(img) for img in images]
+        results = [self._empty_result() for _ in contexts]
+        keys = [None] * len(contexts)
+        
+        # Decode each uncached image once (unreadable files keep the empty result)
+        index = []
+        for i, ctx in enumerate(contexts):
+            try:
+                if self.cache is not None:
+                    keys[i] = f"{ctx.sha256}:{self.cache_namespace}"
+                    cached = self._cache_get(keys[i])
+                    if cached is not None:
+                        results[i] = cached
+                        continue
+                
+                ctx.image  # Decode now so unreadable files are skipped
+                index.append(i)
+            except Exception as e:
+                print(f"   ❌ Pipeline error ({ctx.name}): {e}")
+        
+        if not index:
+            return results
+        
         try:
-            # Run MegaDetector
-            results = self.md(image_path)
-            df = results.pandas().xyxy[0]
-            
-            # Filter for people (class 1)
-            person_boxes = df[df['class'] == 1][
-                ['xmin', 'ymin', 'xmax', 'ymax']
-            ].values.tolist()
+            # Run MegaDetector once on the whole batch; YOLOv5 letterboxes
+            # and stacks the images, then scales boxes back to each image
+            detections = []
+            for start in range(0, len(index), BATCH_SIZE):
+                chunk = index[start:start + BATCH_SIZE]
+                detections.extend(self.md([contexts[i].array for i in chunk]).xyxy)
+            crop_queue = CropQueue(self)
             
-            if len(person_boxes) == 0:
-                return {
-                    'Total': 0,
-                    'Adult': 0,
-                    'Child': 0
-                }
-            
-            # Classify with CLIP
-            counts = {'Adult': 0, 'Child': 0}
-            img = Image.open(image_path).convert("RGB")
-            
-            for box in person_boxes:
-                x1, y1, x2, y2 = map(int, box)
-                crop = img.crop((
-                    max(0, x1), max(0, y1),
-                    min(img.width, x2), min(img.height, y2)
-                ))
+            for i, det in zip(index, detections):
+                # Boxes back to full-resolution pixels (draft decoding shrinks the input)
+                det = det.clone()
+                det[:, :4] *= contexts[i].scale
                 
-                inputs = self.clip_proc(
-                    text=self.labels,
-                    images=crop,
-                    return_tensors="pt",
-                    padding=True
-                ).to(DEVICE)
+                # Filter for people (class 1) straight from the output tensor
+                person_boxes = det[det[:, 5] == 1, :5].tolist()
                 
-                with torch.no_grad():
-                    probs = self.clip_model(**inputs).logits_per_image.softmax(dim=1)
+                if len(person_boxes) == 0:
+                    continue
                 
-                label = self.label_map[probs.cpu().numpy()[0].argmax()]
-                counts[label] += 1
+                results[i]['Total'] = len(person_boxes)
+                for box in person_boxes:
+                    crop_queue.put((i, box[4]), contexts[i].crop(box[:4]))
             
-            return {
-                'Total': len(person_boxes),
-                'Adult': counts['Adult'],
-                'Child': counts['Child']
-            }
+            # Classify with CLIP and scatter labels back to each image,
+            # keeping each crop's box confidence and CLIP scores
+            for (i, box_conf), (label, clip_conf, clip_margin) in crop_queue.drain():
+                results[i][label] += 1
+                results[i]['crops'].append({
+                    'label': label,
+                    'box_conf': round(box_conf, 4),
+                    'clip_conf': round(clip_conf, 4),
+                    'clip_margin': round(clip_margin, 4)
+                })
         
         except Exception as e:
             print(f"   ❌ Pipeline error: {e}")
-            return {
-                'Total': 0,
-                'Adult': 0,
-                'Child': 0
-            }
+            return [
+                results[i] if i not in index else self._empty_result()
+                for i in range(len(contexts))
+            ]
+        
+        if self.cache is not None:
+            try:
+                for i in index:
+                    self.cache.put(keys[i], results[i])
+            except sqlite3.Error as e:
+                print(f"   ⚠ Result cache write failed: {e}")
+        
+        return results
+    
+    def is_cached(self, ctx):
+        """True when this image's result is in the result cache (nothing to decode)."""
+        if self.cache is None:
+            return False
+        try:
+            return self.cache.contains(f"{ctx.sha256}:{self.cache_namespace}")
+        except (OSError, sqlite3.Error):
+            return False
+    
+    def _cache_get(self, key):
+        """Cached pipeline result, or None (also when the cache can't be read)."""
+        try:
+            return self.cache.get(key, 'pipeline')
+        except sqlite3.Error as e:
+            print(f"   ⚠ Result cache read failed: {e}")
+            return None
+    
+    def classify_crops(self, crops):
+        """Classify person crops with one CLIP image-tower pass.
+        
+        Returns (label, confidence, margin) per crop. Confidence is the top
+        prompt-class probability. Margin is the chosen label's probability
+        mass minus the best other label's (Man + Woman both count toward Adult).
+        """
+        inputs = self.clip_proc(images=crops, return_tensors="pt").to(DEVICE)
+        
+        with torch.no_grad():
+            if self.clip_image is not None:
+                image_features = self.clip_image(inputs['pixel_values'])
+            else:
+                image_features = self.clip_model.get_image_features(**inputs)
+            image_features = image_features / image_features.norm(dim=-1, keepdim=True)
+            logits = self.clip_model.logit_scale.exp() * image_features @ self.text_features.T
+            probs = logits.softmax(dim=1)
+        
+        results = []
+        for row in probs.tolist():
+            best = max(range(len(row)), key=row.__getitem__)
+            label = self.label_map[best]
+            mass = collections.defaultdict(float)
+            for idx, p in enumerate(row):
+                mass[self.label_map[idx]] += p
+            margin = mass[label] - max((p for name, p in mass.items() if name != label), default=0.0)
+            results.append((label, row[best], margin))
+        return results
+
+class CropQueue:
+    """Collects person crops across images and classifies them in fixed-size batches."""
+    
+    def __init__(self, pipeline_model, batch_size=None):
+        self.pipeline_model = pipeline_model
+        self.batch_size = batch_size or CLIP_BATCH_SIZE
+        self.crops = []
+        self.owners = []
+        self.labels = []
+    
+    def put(self, owner, crop):
+        """Queue a crop; runs CLIP as soon as a full batch is collected."""
+        self.crops.append(crop)
+        self.owners.append(owner)
+        if len(self.crops) >= self.batch_size:
+            self._flush()
+    
+    def drain(self):
+        """Classify any remaining crops and return (owner, classification) pairs."""
+        self._flush()
+        labels, self.labels = self.labels, []
+        return labels
+    
+    def _flush(self):
+        if not self.crops:
+            return
+        self.labels.extend(zip(self.owners, self.pipeline_model.classify_crops(self.crops)))
+        self.crops, self.owners = [], []
+
+# ===========================================================================
+# RESULT JOURNAL
+# ===========================================================================
+
+class ResultJournal:
+    """Append-only JSONL journal with one line per finished image.
+    
+    Every row is flushed as soon as it is written (and fsynced every
+    SAVE_INTERVAL rows), so a crash loses at most the row in progress.
+    Rows are also marked processed in the file manifest and added to the
+    results store, when given.
+    
+    Only finished rows count as done: a Claude call that failed or hit the
+    budget is retried on --resume, and its new row replaces the old one.
+    """
+    
+    def __init__(self, path, resume=False, manifest=None, store=None):
+        self.path = path
+        self.manifest = manifest
+        self.store = store
+        self.done = set()
+        self.pending = 0
+        self.appended = 0
+        
+        if resume and os.path.exists(path):
+            for record in self._read():
+                if self.finished(record['row']):
+                    self.done.add(record['path'])
+                else:
+                    self.done.discard(record['path'])
+            if store is not None:
+                store.load(self._read())
+            print(f"✓ Resuming: {len(self.done)} images already in journal")
+        elif os.path.exists(path):
+            previous = path.replace('.jsonl', f'_before_{TIMESTAMP}.jsonl')
+            os.replace(path, previous)
+            print(f"✓ Previous journal moved to: {previous}")
+        
+        self.f = open(path, 'a', encoding='utf-8')
+    
+    def append(self, row, image_path):
+        """Durably record one finished row."""
+        if not self.appended:
+            print(f"⏱ Time to first image: {time.perf_counter() - STARTED:.1f}s after start")
+        self.appended += 1
+        self.f.write(json.dumps({'path': image_path, 'row': row}) + '\n')
+        self.f.flush()
+        if self.finished(row):
+            self.done.add(image_path)
+            if self.manifest is not None:
+                self.manifest.mark_processed(image_path)
+        if self.store is not None:
+            self.store.add(row, image_path)
+        self.pending += 1
+        if self.pending >= SAVE_INTERVAL:
+            self.sync()
+    
+    def sync(self):
+        os.fsync(self.f.fileno())
+        if self.manifest is not None:
+            self.manifest.flush()
+        if self.store is not None:
+            self.store.flush()
+        self.pending = 0
+    
+    def close(self):
+        self.sync()
+        self.f.close()
+    
+    @staticmethod
+    def finished(row):
+        """False for rows to redo: Claude failed, was unavailable or ran out of budget.
+        
+        Answers (ok/cached) and deliberate skips (skipped_*) are final.
+        """
+        status = row.get('Claude_Status')
+        return status is None or status in ('ok', 'cached') or status.startswith('skipped_')
+    
+    def _read(self):
+        with open(self.path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue  # Partial last line from an interrupted write
+
+# ===========================================================================
+# RESULTS STORE
+# ===========================================================================
+
+class ResultsStore:
+    """SQLite (WAL) store of result rows with indexed per-model counts.
+    
+    Rows are written in batched transactions and queried with SQL, so memory
+    stays flat however many images a run covers. The full row is kept as
+    JSON; Site/Date/Hour/Filename and the Total/Adult/Child counts of each
+    model (Claude answers only when Claude actually answered) are indexed.
+    The store is rebuilt from the journal on --resume, so it can live on
+    local disk.
+    """
+    
+    MODELS = ('Claude', 'Pipeline', 'Final')
+    
+    def __init__(self, path, batch_size=None):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+        self.path = path
+        self.batch_size = batch_size or SAVE_INTERVAL
+        self.columns = {}
+        self.pending = []
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript("""
+            CREATE TABLE images (
+                path TEXT PRIMARY KEY, site TEXT, date TEXT, hour INTEGER,
+                filename TEXT, status TEXT, row TEXT);
+            CREATE TABLE counts (
+                path TEXT, model TEXT, total INTEGER, adult INTEGER, child INTEGER,
+                PRIMARY KEY (path, model));
+            CREATE INDEX images_site ON images (site);
+            CREATE INDEX images_date ON images (date);
+            CREATE INDEX images_filename ON images (filename);
+            CREATE INDEX counts_model ON counts (model, total);
+        """)
+    
+    def add(self, row, image_path):
+        """Queue one row; written with the next batch."""
+        self.columns.update(dict.fromkeys(row))
+        self.pending.append((row, image_path))
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+    
+    def flush(self):
+        """Write queued rows in one transaction."""
+        if not self.pending:
+            return
+        images, counts = [], []
+        # A retried image replaces its earlier row (the last one queued wins)
+        latest = {image_path: row for row, image_path in self.pending}
+        for image_path, row in latest.items():
+            try:
+                date = datetime.strptime(f"{row['Date']} {row['Time']}", "%Y/%m/%d %H:%M:%S")
+            except (TypeError, ValueError):
+                date = None
+            images.append((
+                image_path, row.get('Site'),
+                date.strftime('%Y-%m-%d') if date else None, date.hour if date else None,
+                row.get('Filename'), row.get('Claude_Status'), json.dumps(row)
+            ))
+            for model in self.MODELS:
+                if f'{model}_Total' not in row:
+                    continue
+                if model == 'Claude' and row.get('Claude_Status') not in ('ok', 'cached'):
+                    continue
+                counts.append((image_path, model, row[f'{model}_Total'],
+                               row.get(f'{model}_Adult', 0), row.get(f'{model}_Child', 0)))
+        
+        with self.conn:
+            self.conn.executemany("DELETE FROM counts WHERE path = ?", [(i[0],) for i in images])
+            self.conn.executemany("INSERT OR REPLACE INTO images VALUES (?, ?, ?, ?, ?, ?, ?)", images)
+            self.conn.executemany("INSERT INTO counts VALUES (?, ?, ?, ?, ?)", counts)
+        self.pending = []
+    
+    def load(self, records):
+        """Add journal records ({'path', 'row'}), e.g. when resuming."""
+        for record in records:
+            self.add(record['row'], record['path'])
+        self.flush()
+    
+    def __len__(self):
+        return self.conn.execute("SELECT COUNT(*) FROM images").fetchone()[0]
+    
+    def status_count(self, status):
+        """Number of rows with this Claude_Status."""
+        return self.conn.execute(
+            "SELECT COUNT(*) FROM images WHERE status = ?", (status,)
+        ).fetchone()[0]
+    
+    def site_totals(self, model='Pipeline'):
+        """Per-site images, images with people and Total/Adult/Child for one model."""
+        import pandas as pd
+        return pd.read_sql_query("""
+            SELECT i.site AS Site, COUNT(*) AS Images, SUM(c.total > 0) AS Images_With_People,
+                   SUM(c.total) AS Total, SUM(c.adult) AS Adult, SUM(c.child) AS Child
+            FROM counts c JOIN images i ON i.path = c.path
+            WHERE c.model = ? GROUP BY i.site ORDER BY i.site
+        """, self.conn, params=(model,))
+    
+    def hour_histogram(self, model='Pipeline', site=None):
+        """Images and people per hour of day (EXIF time), optionally for one site."""
+        import pandas as pd
+        return pd.read_sql_query(f"""
+            SELECT i.hour AS Hour, COUNT(*) AS Images, SUM(c.total) AS Total
+            FROM counts c JOIN images i ON i.path = c.path
+            WHERE c.model = ? AND i.hour IS NOT NULL {'AND i.site = ?' if site else ''}
+            GROUP BY i.hour ORDER BY i.hour
+        """, self.conn, params=(model, site) if site else (model,))
+    
+    def disagreements(self, min_difference=1):
+        """Images where Claude and the pipeline counted different numbers of people."""
+        import pandas as pd
+        return pd.read_sql_query("""
+            SELECT i.site AS Site, i.filename AS Filename, i.date AS Date,
+                   cl.total AS Claude_Total, pl.total AS Pipeline_Total,
+                   cl.child AS Claude_Child, pl.child AS Pipeline_Child
+            FROM images i
+            JOIN counts cl ON cl.path = i.path AND cl.model = 'Claude'
+            JOIN counts pl ON pl.path = i.path AND pl.model = 'Pipeline'
+            WHERE ABS(cl.total - pl.total) >= ?
+            ORDER BY ABS(cl.total - pl.total) DESC, i.site, i.filename
+        """, self.conn, params=(min_difference,))
+    
+    def frames(self, chunk_size=10000):
+        """Yield the full rows as DataFrames of chunk_size, in write order."""
+        import pandas as pd
+        self.flush()
+        columns = list(self.columns)
+        cursor = self.conn.execute("SELECT row FROM images ORDER BY rowid")
+        while True:
+            chunk = cursor.fetchmany(chunk_size)
+            if not chunk:
+                break
+            yield pd.DataFrame([json.loads(row) for (row,) in chunk], columns=columns)
+    
+    def dataframe(self):
+        """All rows as one DataFrame (loads everything into memory)."""
+        import pandas as pd
+        return pd.concat(list(self.frames()), ignore_index=True) if len(self) else pd.DataFrame()
+    
+    def export_csv(self, path):
+        """CSV view of every row, written chunk by chunk."""
+        for n, df in enumerate(self.frames()):
+            df.to_csv(path, mode='w' if n == 0 else 'a', header=n == 0,
+                      index=False, encoding='utf-8-sig' if n == 0 else 'utf-8')
+    
+    def backup(self, path):
+        """Copy the database (e.g. to Drive) with SQLite's online backup."""
+        self.flush()
+        target = sqlite3.connect(path)
+        with target:
+            self.conn.backup(target)
+        target.close()
+    
+    def close(self):
+        self.flush()
+        self.conn.close()
 
 # ===========================================================================
 # MAIN PROCESSING
@@ -214,31 +1610,119 @@ class PipelineModel:
 
 def process_image(item, pipeline_model):
     """Process single image with pipeline."""
-    # Extract metadata
-    date, time = get_exif_data(item['path'])
+    return process_batch([item], pipeline_model)[0]
+
+def process_batch(items, pipeline_model, contexts=None, audit=False):
+    """Process a batch of images with one batched pipeline pass.
     
-    # Run pipeline
-    result = pipeline_model.analyze(item['path'])
+    With audit=True the prefilter decision is recorded but nothing is skipped.
+    Returns (row, ImageContext) pairs; release each context once its row is saved.
+    """
+    contexts = contexts or [ImageContext(item['path']) for item in items]
     
-    # Compile results
-    row = {
-        'Site': item['site'],
-        'Date': date,
-        'Time': time,
-        'Filename': item['name'],
+    # Cheap empty-frame check before any model runs
+    decisions = [
+        background_model.check(item['site'], ctx) if PREFILTER else None
+        for item, ctx in zip(items, contexts)
+    ]
+    skipped = [bool(d and d['empty'] and not audit) for d in decisions]
+    
+    run = [i for i in range(len(contexts)) if not skipped[i]]
+    results = [PipelineModel._empty_result() for _ in contexts]
+    if run:
+        for i, result in zip(run, pipeline_model.analyze_batch([contexts[i] for i in run])):
+            results[i] = result
+    
+    processed = []
+    for item, ctx, result, decision, skip in zip(items, contexts, results, decisions, skipped):
+        # Extract metadata
+        try:
+            date, time = ctx.exif
+        except Exception:
+            date, time = None, None
         
-        # Pipeline outputs
-        'Pipeline_Total': result['Total'],
-        'Pipeline_Adult': result['Adult'],
-        'Pipeline_Child': result['Child'],
-    }
+        # Compile results
+        row = {
+            'Site': item['site'],
+            'Date': date,
+            'Time': time,
+            'Filename': item['name'],
+            
+            # Pipeline outputs
+            'Pipeline_Total': result['Total'],
+            'Pipeline_Adult': result['Adult'],
+            'Pipeline_Child': result['Child'],
+        }
+        if 'sequence' in item:
+            row['Sequence_ID'] = item['sequence']
+        if decision is not None:
+            row['Prefilter_Foreground'] = decision['foreground']
+            row['Prefilter_Empty'] = decision['empty']
+            row['Prefilter_Skipped'] = skip
+        processed.append((row, ctx))
+    
+    return processed
+
+def save_parquet(results_df, dataset_path):
+    """Write results as typed Parquet, partitioned by Site and Date.
     
-    return row, item['path']
+    Date/Time strings become one real Timestamp column (null when the EXIF
+    date is unknown), count columns become nullable integers, and Site is
+    dictionary-encoded. One site-month can then be read without scanning
+    the whole season, e.g.:
+    
+        pd.read_parquet(dataset_path, filters=[
+            ('Site', '=', 'SITE_1'),
+            ('Date', '>=', '2026-06-01'), ('Date', '<', '2026-07-01')])
+    """
+    import pandas as pd
+    pa = require('pyarrow')
+    import pyarrow.parquet as pq
+    
+    df = results_df.copy()
+    df['Timestamp'] = pd.to_datetime(
+        df['Date'].astype(str) + ' ' + df['Time'].astype(str),
+        format='%Y/%m/%d %H:%M:%S', errors='coerce'
+    )
+    df['Date'] = df['Timestamp'].dt.strftime('%Y-%m-%d')
+    df = df.drop(columns=['Time'])
+    
+    count_columns = [
+        c for c in df.columns
+        if c.startswith(('Claude_', 'Pipeline_')) and pd.api.types.is_numeric_dtype(df[c])
+        and not pd.api.types.is_bool_dtype(df[c])
+    ]
+    # Nullable, so columns only some rows have (e.g. Claude_Full_*) stay null, not 0
+    df[count_columns] = df[count_columns].astype('Int32')
+    df['Site'] = df['Site'].astype('category')
+    
+    pq.write_to_dataset(
+        pa.Table.from_pandas(df, preserve_index=False),
+        root_path=dataset_path,
+        partition_cols=['Site', 'Date'],
+        compression='zstd',
+        use_dictionary=True
+    )
+
+def print_prefilter_audit(results_df, count_columns):
+    """Compare prefilter decisions with model counts on the validation phase."""
+    empty = results_df['Prefilter_Empty'].fillna(False).astype(bool)
+    skipped_mask = results_df['Prefilter_Skipped'].fillna(False).astype(bool)
+    audited = results_df[empty & ~skipped_mask]
+    skipped = skipped_mask.sum()
+    
+    print("\nEmpty-Frame Prefilter:")
+    print(f"  Frames skipped: {skipped} of {len(results_df)} ({skipped / len(results_df):.0%})")
+    if len(audited):
+        missed = (audited[count_columns].max(axis=1) > 0).sum()
+        print(f"  Validation audit: {len(audited)} frames would be skipped, "
+              f"{missed} of them had detections ({missed / len(audited):.0%} miss rate)")
 
 def generate_validation_sheets(results, timestamp):
     """Generate visual validation sheets with results."""
     if not VALIDATION_SHEETS or not results:
         return
+    import matplotlib.pyplot as plt
     
     print(f"\n📊 Generating validation sheets...")
     
@@ -250,10 +1734,10 @@ def generate_validation_sheets(results, timestamp):
         axes = axes.flatten()
         fig.suptitle(f"Validation Batch {page_num+1} of {len(chunks)}", fontsize=16, fontweight='bold')
         
-        for idx, (res, img_path) in enumerate(chunk):
+        for idx, (res, image) in enumerate(chunk):
             ax = axes[idx]
             try:
-                ax.imshow(Image.open(img_path))
+                ax.imshow(image if isinstance(image, Image.Image) else Image.open(image))
                 
                 # Create label
                 label = (
@@ -283,6 +1767,532 @@ def generate_validation_sheets(results, timestamp):
         
         print(f"  ✓ Validation sheet {page_num+1}/{len(chunks)} saved")
 
+# ===========================================================================
+# CPU WORKER POOL
+# ===========================================================================
+
+_worker_pipeline = None
+
+class WorkerCache:
+    """A worker's view of the result cache: reads the file, leaves writes to the parent.
+    
+    Only the parent process writes the SQLite file, so workers never contend
+    for its lock (file locking is unreliable on the Drive mount). New
+    results, hits and counters are sent back with each batch.
+    """
+    
+    def __init__(self, path):
+        self.conn = sqlite3.connect(f"file:{urllib.parse.quote(path)}?mode=ro", uri=True, timeout=30)
+        self.puts, self.touched, self.hits, self.misses = [], [], {}, {}
+    
+    def get(self, key, kind):
+        row = self.conn.execute("SELECT value FROM results WHERE key = ?", (key,)).fetchone()
+        counts = self.misses if row is None else self.hits
+        counts[kind] = counts.get(kind, 0) + 1
+        if row is None:
+            return None
+        self.touched.append(key)
+        return json.loads(row[0])
+    
+    def put(self, key, value):
+        self.puts.append((key, value))
+    
+    def take(self):
+        """Return (puts, touched, hits, misses) collected since the last call."""
+        changes = (self.puts, self.touched, self.hits, self.misses)
+        self.puts, self.touched, self.hits, self.misses = [], [], {}, {}
+        return changes
+
+def _init_worker(threads, use_cache, ready, failed):
+    """Load the models once per worker process, pinned to its own thread budget.
+    
+    A failure is reported through `failed` instead of raised: Pool would
+    otherwise respawn the worker and retry forever.
+    """
+    global _worker_pipeline
+    torch.set_num_threads(threads)
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        pass  # Already set in this process
+    
+    try:
+        cache = WorkerCache(os.path.join(CACHE_FOLDER, 'results_cache.sqlite')) if use_cache else None
+        _worker_pipeline = PipelineModel(cache=cache)
+    except Exception as e:
+        print(f"   ✗ Worker could not load the models: {e}")
+        failed.value = 1
+        return
+    with ready.get_lock():
+        ready.value += 1
+
+def _worker_process_batch(job):
+    """Run one batch in a worker.
+    
+    Returns (row, path) pairs plus the batch's cache changes (or None) for
+    the parent to apply.
+    """
+    batch, audit = job
+    cache = _worker_pipeline.cache
+    try:
+        processed = process_batch(batch, _worker_pipeline, audit=audit)
+    except Exception as e:
+        print(f"   ✗ Worker batch failed: {e}")
+        return [], cache.take() if cache is not None else None
+    
+    rows = []
+    for row, ctx in processed:
+        ctx.release()
+        rows.append((row, ctx.path))
+    return rows, cache.take() if cache is not None else None
+
+class WorkerPool:
+    """Shards batches across CPU processes; rows stream back as batches finish.
+    
+    Uses fork, so it also works when the script is exec()'d in a notebook.
+    """
+    
+    def __init__(self, num_workers, threads=None, cache=None):
+        self.num_workers = num_workers
+        self.cache = cache  # Parent's ResultCache; workers only read the file
+        self.threads = threads or THREADS_PER_WORKER or max(1, (os.cpu_count() or 1) // num_workers)
+        context = multiprocessing.get_context('fork')
+        
+        if not PipelineModel.files_ready():
+            # First run: one child downloads and pins every model file, so the
+            # workers only read them (and this process runs no torch before forking)
+            print("Preparing model files for the workers...")
+            child = context.Process(target=PipelineModel)
+            child.start()
+            child.join()
+            if child.exitcode != 0:
+                raise RuntimeError("Could not prepare the model files (see the error above)")
+        
+        self.ready = context.Value('i', 0)
+        self.failed = context.Value('b', 0)
+        self.pool = context.Pool(
+            num_workers, initializer=_init_worker,
+            initargs=(self.threads, cache is not None, self.ready, self.failed)
+        )
+    
+    def wait_ready(self):
+        """Block until every worker has loaded its models; raise if one could not."""
+        while self.ready.value < self.num_workers:
+            if self.failed.value:
+                self.pool.terminate()
+                raise RuntimeError("A worker process could not load the models (see the error above)")
+            time.sleep(0.5)
+    
+    def imap(self, batches):
+        """Yield each batch's rows as it finishes, applying its cache changes here."""
+        self.wait_ready()  # Otherwise a failed worker leaves imap waiting forever
+        for rows, changes in self.pool.imap_unordered(_worker_process_batch, batches):
+            if changes is not None and self.cache is not None:
+                try:
+                    self.cache.merge(*changes)
+                except sqlite3.Error as e:
+                    print(f"   ⚠ Result cache write failed: {e}")
+            yield rows
+    
+    def close(self):
+        self.pool.close()
+        self.pool.join()
+
+def iter_rows(items, pipeline_model, prefetcher, worker_pool=None, audit=False):
+    """Yield (row, image) for every item that was processed.
+    
+    image is an ImageContext when running in-process, or the file path when
+    the row came back from a worker process.
+    """
+    if worker_pool is not None:
+        batches = [(items[start:end], audit) for start, end in batch_slices(items, BATCH_SIZE)]
+        for rows in worker_pool.imap(batches):
+            yield from rows
+        return
+    
+    for start, batch, contexts in prefetcher.batches(items, BATCH_SIZE):
+        try:
+            processed = process_batch(batch, pipeline_model, contexts, audit=audit)
+        except Exception as e:
+            print(f"[{start + 1:4d}-{start + len(batch)}/{len(items)}] ✗ {e}")
+            continue
+        yield from processed
+
+def run_benchmark(files):
+    """Measure images/sec for 1, 2, 4, ... worker processes and save the curve."""
+    import pandas as pd
+    cores = os.cpu_count() or 1
+    counts = sorted({n for n in [1, 2, 4, 8, 16, 32, 64] if n <= cores} | {cores})
+    
+    print(f"Benchmarking {BENCHMARK_BATCHES} batches of {BATCH_SIZE} per worker "
+          f"on {cores} cores (result cache off)")
+    curve = []
+    for n in counts:
+        # The work grows with the worker count; files repeat if there are too few
+        sample = [files[i % len(files)] for i in range(n * BENCHMARK_BATCHES * BATCH_SIZE)]
+        batches = [(sample[s:s + BATCH_SIZE], False) for s in range(0, len(sample), BATCH_SIZE)]
+        pool = WorkerPool(n, threads=max(1, cores // n))
+        pool.wait_ready()  # Exclude model loading from the timing
+        
+        started = time.perf_counter()
+        done = sum(len(rows) for rows in pool.imap(batches))
+        elapsed = time.perf_counter() - started
+        pool.close()
+        
+        rate = done / elapsed if elapsed else 0
+        speedup = rate / curve[0]['Images_Per_Sec'] if curve else 1.0
+        curve.append({
+            'Workers': n,
+            'Threads_Per_Worker': max(1, cores // n),
+            'Images': done,
+            'Seconds': round(elapsed, 2),
+            'Images_Per_Sec': round(rate, 3),
+            'Speedup': round(speedup, 2),
+            'Efficiency': round(speedup / n, 2),
+        })
+        print(f"  {n:3d} workers: {rate:6.2f} img/s  speedup {speedup:5.2f}x  "
+              f"efficiency {speedup / n:.0%}")
+    
+    output_path = os.path.join(OUTPUT_FOLDER, f"Benchmark_Scaling_{TIMESTAMP}.csv")
+    pd.DataFrame(curve).to_csv(output_path, index=False)
+    print(f"✓ Scaling curve saved: {output_path}")
+
+def run_onnx_parity(files):
+    """Export to ONNX, then compare and time the two backends on the same images.
+    
+    Both runs use the same decoded images and no result cache; the first
+    batch of each run is a warm-up and is not timed.
+    """
+    import pandas as pd
+    sample = [ImageContext(item['path']) for item in files[:ONNX_PARITY_IMAGES]]
+    for ctx in sample:
+        ctx.load()
+    
+    def timed_run(model):
+        model.analyze_batch(sample[:BATCH_SIZE])
+        started = time.perf_counter()
+        results = []
+        for start in range(0, len(sample), BATCH_SIZE):
+            results += model.analyze_batch(sample[start:start + BATCH_SIZE])
+        return results, time.perf_counter() - started
+    
+    model = PipelineModel(backend="torch")
+    print(f"Timing torch on {len(sample)} images...")
+    reference, torch_seconds = timed_run(model)
+    model.use_onnx(export=True)
+    print(f"Timing ONNX Runtime on {len(sample)} images...")
+    results, onnx_seconds = timed_run(model)
+    
+    rows = []
+    for ctx, ref, res in zip(sample, reference, results):
+        counts_match = all(ref[k] == res[k] for k in ('Total', 'Adult', 'Child'))
+        pairs = list(zip(ref['crops'], res['crops'])) if counts_match else []
+        rows.append({
+            'Filename': ctx.name,
+            'Torch_Total': ref['Total'], 'ONNX_Total': res['Total'],
+            'Torch_Child': ref['Child'], 'ONNX_Child': res['Child'],
+            'Counts_Match': counts_match,
+            'Max_Box_Conf_Diff': max((abs(a['box_conf'] - b['box_conf']) for a, b in pairs), default=0.0),
+            'Max_CLIP_Conf_Diff': max((abs(a['clip_conf'] - b['clip_conf']) for a, b in pairs), default=0.0),
+        })
+        ctx.release()
+    df = pd.DataFrame(rows)
+    
+    output_path = os.path.join(OUTPUT_FOLDER, f"ONNX_Parity_{TIMESTAMP}.csv")
+    df.to_csv(output_path, index=False)
+    
+    within = df['Counts_Match'] & (df['Max_Box_Conf_Diff'] <= ONNX_PARITY_TOLERANCE) & \
+        (df['Max_CLIP_Conf_Diff'] <= ONNX_PARITY_TOLERANCE)
+    print(f"\n  Counts match: {df['Counts_Match'].mean():.1%} of {len(df)} images")
+    print(f"  Max confidence difference: box {df['Max_Box_Conf_Diff'].max():.4f}, "
+          f"CLIP {df['Max_CLIP_Conf_Diff'].max():.4f} (tolerance {ONNX_PARITY_TOLERANCE})")
+    print(f"  torch {len(sample) / torch_seconds:.2f} img/s, ONNX Runtime {len(sample) / onnx_seconds:.2f} img/s "
+          f"({torch_seconds / onnx_seconds:.2f}x)")
+    if within.all():
+        print("✓ ONNX backend matches torch - safe to set BACKEND = \"onnx\"")
+    else:
+        print(f"⚠ {(~within).sum()} images outside tolerance - review before switching backends")
+    print(f"✓ Parity report saved: {output_path}")
+
+# ===========================================================================
+# WATCH MODE
+# ===========================================================================
+
+def start_observer(wake):
+    """Set `wake` on any file event under INPUT_FOLDERS (inotify via watchdog).
+    
+    Returns the observer, or None when watchdog/inotify is unavailable and
+    the watch loop has to rely on polling alone.
+    """
+    try:
+        require('watchdog')
+        from watchdog.observers import Observer
+        from watchdog.events import FileSystemEventHandler
+        
+        class Wake(FileSystemEventHandler):
+            def on_any_event(self, event):
+                wake.set()
+        
+        observer = Observer()
+        for folder in INPUT_FOLDERS.values():
+            if os.path.exists(folder):
+                observer.schedule(Wake(), folder, recursive=True)
+        observer.start()
+        print("✓ Watching for file events (inotify)")
+        return observer
+    except Exception as e:
+        print(f"⚠ File events unavailable ({e}) - polling every {WATCH_POLL_SECONDS}s")
+        return None
+
+def watch_folders(manifest, handle):
+    """Process images as they arrive in INPUT_FOLDERS, until Ctrl+C.
+    
+    Every cycle rescans the manifest (only changed folders are listed) and
+    passes unprocessed files that stopped changing WATCH_SETTLE_SECONDS ago
+    to handle(items) in micro-batches of up to WATCH_MAX_BATCH. handle
+    returns the paths it finished. File events wake the loop at once; drives
+    without them (e.g. the Colab Drive mount) are polled. Returns the delays
+    from upload to finished row, in seconds.
+    """
+    wake = threading.Event()
+    observer = start_observer(wake)
+    arrived = {}
+    attempted = set()
+    delays = []
+    
+    try:
+        while True:
+            items = []
+            for site_name, folder_path in INPUT_FOLDERS.items():
+                if os.path.exists(folder_path):
+                    manifest.scan(site_name, folder_path)
+                    items += manifest.files(site_name, unprocessed=True)
+            
+            # Leave files alone until the upload has finished writing them
+            now = time.time()
+            ready, waiting = [], 0
+            for item in items:
+                if item['path'] in attempted:
+                    continue
+                try:
+                    stat = os.stat(item['path'])
+                except OSError:
+                    continue
+                # ctime is when the file landed here, even if the copy kept an old mtime
+                arrived.setdefault(item['path'], min(now, max(stat.st_mtime, stat.st_ctime)))
+                if now - stat.st_mtime < WATCH_SETTLE_SECONDS:
+                    waiting += 1
+                else:
+                    ready.append(item)
+            
+            for start in range(0, len(ready), WATCH_MAX_BATCH):
+                batch = ready[start:start + WATCH_MAX_BATCH]
+                attempted.update(item['path'] for item in batch)
+                finished = handle(batch)
+                batch_delays = [time.time() - arrived.pop(path) for path in finished]
+                if batch_delays:
+                    delays += batch_delays
+                    print(f"⏱ {len(batch_delays)} new images - delay after upload: "
+                          f"median {np.median(batch_delays):.1f}s, max {max(batch_delays):.1f}s")
+            
+            wake.wait(WATCH_SETTLE_SECONDS if waiting else WATCH_POLL_SECONDS)
+            wake.clear()
+    except KeyboardInterrupt:
+        print("\n⏹ Watch mode stopped")
+    finally:
+        if observer is not None:
+            observer.stop()
+            observer.join()
+    
+    if delays:
+        print(f"  {len(delays)} images, delay after upload: median {np.median(delays):.1f}s, "
+              f"p95 {np.percentile(delays, 95):.1f}s")
+    return delays
+
+# ===========================================================================
+# INFERENCE SERVER
+# ===========================================================================
+
+class DynamicBatcher:
+    """Groups concurrent requests into batches for one warm PipelineModel.
+    
+    A single thread runs the model. It takes the oldest request, waits up to
+    max_wait_ms for more to arrive, and runs them together as soon as
+    max_batch requests are queued or the wait is over. Under light load a
+    request waits at most max_wait_ms; under heavy load batches fill up.
+    """
+    
+    def __init__(self, pipeline_model, max_batch=None, max_wait_ms=None):
+        self.pipeline_model = pipeline_model
+        self.max_batch = max_batch or SERVE_MAX_BATCH
+        self.max_wait = (SERVE_MAX_WAIT_MS if max_wait_ms is None else max_wait_ms) / 1000
+        self.queue = queue.Queue()
+        self.lock = threading.Lock()
+        self.latencies = collections.deque(maxlen=SERVE_LATENCY_WINDOW)
+        self.requests = 0
+        self.batches = 0
+        self.errors = 0
+        self.started = time.time()
+        threading.Thread(target=self._run, daemon=True).start()
+    
+    def submit(self, ctx, received=None):
+        """Queue an ImageContext; the future resolves to its result dict.
+        
+        received is the perf_counter() time the request arrived, so latency
+        includes reading and decoding it.
+        """
+        future = concurrent.futures.Future()
+        self.queue.put((ctx, future, received or time.perf_counter()))
+        return future
+    
+    def _run(self):
+        while True:
+            batch = [self.queue.get()]
+            deadline = time.perf_counter() + self.max_wait
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.perf_counter()
+                try:
+                    batch.append(self.queue.get(timeout=remaining) if remaining > 0
+                                 else self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            
+            try:
+                results = self.pipeline_model.analyze_batch([ctx for ctx, _, _ in batch])
+            except Exception as e:
+                with self.lock:
+                    self.errors += len(batch)
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                continue
+            
+            finished = time.perf_counter()
+            with self.lock:
+                self.requests += len(batch)
+                self.batches += 1
+                self.latencies.extend(finished - received for _, _, received in batch)
+            for (ctx, future, _), result in zip(batch, results):
+                ctx.release()
+                future.set_result(result)
+    
+    def stats(self):
+        """Queue depth, batching and latency percentiles (ms) over recent requests."""
+        with self.lock:
+            latencies = list(self.latencies)
+            requests, batches, errors = self.requests, self.batches, self.errors
+        stats = {
+            'queue_depth': self.queue.qsize(),
+            'requests': requests,
+            'batches': batches,
+            'mean_batch_size': round(requests / batches, 2) if batches else 0,
+            'errors': errors,
+            'uptime_s': round(time.time() - self.started, 1),
+        }
+        if latencies:
+            p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) * 1000
+            stats['latency_ms'] = {
+                'p50': round(p50, 1), 'p95': round(p95, 1), 'p99': round(p99, 1),
+                'max': round(max(latencies) * 1000, 1)
+            }
+        return stats
+
+class InferenceHandler(BaseHTTPRequestHandler):
+    """HTTP API for the batcher.
+    
+    POST /analyze   image bytes as the body (optional ?name=), or JSON
+                    {"path": ...} for a file the server can read
+    GET  /stats     queue depth, batch sizes and latency percentiles
+    GET  /health    liveness check
+    """
+    
+    protocol_version = 'HTTP/1.1'  # Keep-alive, so small clients reuse connections
+    batcher = None                 # Set by serve()
+    
+    def do_GET(self):
+        path = urllib.parse.urlsplit(self.path).path
+        if path == '/stats':
+            self._send(200, self.batcher.stats())
+        elif path == '/health':
+            self._send(200, {'status': 'ok'})
+        else:
+            self._send(404, {'error': f"unknown endpoint {path}"})
+    
+    def do_POST(self):
+        received = time.perf_counter()
+        url = urllib.parse.urlsplit(self.path)
+        body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        if url.path != '/analyze':
+            self._send(404, {'error': f"unknown endpoint {url.path}"})
+            return
+        
+        try:
+            if self.headers.get('Content-Type', '').startswith('application/json'):
+                ctx = ImageContext(json.loads(body)['path'])
+            else:
+                name = urllib.parse.parse_qs(url.query).get('name', ['upload.jpg'])[0]
+                ctx = ImageContext(name, data=body)
+            ctx.image  # Decode in this request's thread, not the model thread
+        except Exception as e:
+            self._send(400, {'error': f"unreadable image: {e}"})
+            return
+        
+        try:
+            result = self.batcher.submit(ctx, received).result()
+        except Exception as e:
+            self._send(500, {'error': str(e)})
+            return
+        
+        self._send(200, {
+            'Pipeline_Total': result['Total'],
+            'Pipeline_Adult': result['Adult'],
+            'Pipeline_Child': result['Child'],
+            'crops': result['crops'],
+        })
+    
+    def _send(self, status, payload):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def log_message(self, format, *args):
+        pass  # One line per request would flood the output
+
+class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """ThreadingHTTPServer on a Unix socket (no TCP port, file permissions apply)."""
+    
+    daemon_threads = True
+
+def serve(pipeline_model):
+    """Serve the pipeline until Ctrl+C, then print the final stats."""
+    InferenceHandler.batcher = batcher = DynamicBatcher(pipeline_model)
+    
+    if SERVE_SOCKET:
+        if os.path.exists(SERVE_SOCKET):
+            os.remove(SERVE_SOCKET)  # Left over from an earlier server
+        server = UnixHTTPServer(SERVE_SOCKET, InferenceHandler)
+        address = f"unix:{SERVE_SOCKET}"
+    else:
+        server = ThreadingHTTPServer((SERVE_HOST, SERVE_PORT), InferenceHandler)
+        server.daemon_threads = True
+        address = f"http://{SERVE_HOST}:{SERVE_PORT}"
+    
+    print(f"✓ Serving on {address} "
+          f"(batches of up to {batcher.max_batch}, max wait {batcher.max_wait * 1000:.0f} ms)")
+    print("  POST /analyze  GET /stats  GET /health  (Ctrl+C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n⏹ Server stopped")
+    finally:
+        server.server_close()
+        if SERVE_SOCKET and os.path.exists(SERVE_SOCKET):
+            os.remove(SERVE_SOCKET)
+    
+    print(f"  {json.dumps(batcher.stats())}")
+
 # ===========================================================================
 # EXECUTION
 # ===========================================================================
@@ -292,19 +2302,59 @@ if __name__ == "__main__":
     print("INITIALIZING MODELS")
     print("="*70)
     
-    # Initialize pipeline
-    pipeline = PipelineModel()
+    if NUM_WORKERS > 1 and DEVICE != "cpu":
+        print("⚠ NUM_WORKERS > 1 is for CPU inference - using a single GPU process")
+        NUM_WORKERS = 1
+    if NUM_WORKERS > 1 and PREFILTER:
+        # Each worker would learn its backgrounds from whichever batches it
+        # happened to get, so skips would depend on the worker count
+        print("⚠ PREFILTER needs every frame of a site in one process - using NUM_WORKERS = 1")
+        NUM_WORKERS = 1
+    if BENCHMARK and PREFILTER:
+        print("⚠ The benchmark times the models on every frame - PREFILTER is off")
+        PREFILTER = False
+    if (BACKEND == "onnx" or EXPORT_ONNX) and DEVICE != "cpu":
+        print("⚠ The ONNX backend runs on CPU - using torch on the GPU")
+        BACKEND, EXPORT_ONNX = "torch", False
+    
+    # Initialize pipeline (worker processes load their own copies)
+    result_cache = ResultCache(os.path.join(CACHE_FOLDER, 'results_cache.sqlite')) if RESULT_CACHE else None
+    if (NUM_WORKERS > 1 or BENCHMARK or EXPORT_ONNX) and not SERVE:
+        pipeline = None
+        if NUM_WORKERS > 1:
+            print(f"✓ Using {NUM_WORKERS} CPU worker processes")
+    else:
+        pipeline = PipelineModel(cache=result_cache)
+    
+    if SERVE:
+        print("\n" + "="*70)
+        print("INFERENCE SERVER")
+        print("="*70)
+        serve(pipeline)
+        if result_cache is not None:
+            result_cache.flush()
+        sys.exit(0)
     
     # Gather image files
     print("\n" + "="*70)
     print("GATHERING IMAGE FILES")
     print("="*70)
     
+    manifest = FileManifest(MANIFEST_PATH, 'pipeline_only') if MANIFEST or WATCH else None
     all_files = []
     for site_name, folder_path in INPUT_FOLDERS.items():
-        if os.path.exists(folder_path):
+        if not os.path.exists(folder_path):
+            print(f"⚠ Folder not found: {folder_path}")
+        elif manifest is not None:
+            # Recursive, and only changed folders are listed again
+            changed, removed = manifest.scan(site_name, folder_path, full=RESCAN)
+            images = manifest.files(site_name, unprocessed=ONLY_UNPROCESSED)
+            print(f"✓ Found {len(images)} {'unprocessed ' if ONLY_UNPROCESSED else ''}images "
+                  f"in '{site_name}' ({changed} new/changed, {removed} removed since last scan)")
+            all_files.extend(images)
+        else:
             images = [
-                f for f in os.listdir(folder_path)
+                f for f in sorted(os.listdir(folder_path))
                 if f.lower().endswith(('.jpg', '.jpeg', '.png'))
             ]
             print(f"✓ Found {len(images)} images in '{site_name}'")
@@ -315,42 +2365,75 @@ if __name__ == "__main__":
                     'name': img,
                     'path': os.path.join(folder_path, img)
                 })
-        else:
-            print(f"⚠ Folder not found: {folder_path}")
     
-    if not all_files:
+    if not all_files and not WATCH:
         print("❌ No images found. Exiting.")
         sys.exit(1)
     
-    # Shuffle and limit
-    random.shuffle(all_files)
+    # Shuffle and limit (whole sequences stay together when grouping)
+    rng = random.Random(RANDOM_SEED)
+    if SEQUENCE_GROUPING:
+        sequences = build_sequences(all_files)
+        rng.shuffle(sequences)
+        all_files = [item for sequence in sequences for item in sequence]
+        print(f"✓ Grouped into {len(sequences)} sequences "
+              f"(avg {len(all_files) / len(sequences):.1f} frames)")
+    else:
+        rng.shuffle(all_files)
     if MAX_PRODUCTION:
         all_files = all_files[:MAX_PRODUCTION]
     
     print(f"\n✓ Total images to process: {len(all_files)}")
     
-    # Split into validation and production
-    validation_set = all_files[:VALIDATION_SIZE]
-    production_set = all_files[VALIDATION_SIZE:]
+    # Split into validation and production, at a sequence boundary
+    cut = min(VALIDATION_SIZE, len(all_files))
+    while SEQUENCE_GROUPING and 0 < cut < len(all_files) and \
+            all_files[cut]['sequence'] == all_files[cut - 1]['sequence']:
+        cut += 1
+    validation_set = all_files[:cut]
+    production_set = all_files[cut:]
+    
+    if BENCHMARK:
+        run_benchmark(all_files)
+        sys.exit(0)
+    
+    if EXPORT_ONNX:
+        run_onnx_parity(all_files)
+        sys.exit(0)
+    
+    # Skip images already finished by an earlier run
+    store = ResultsStore(RESULTS_DB_PATH)
+    journal = ResultJournal(JOURNAL_PATH, resume=RESUME or WATCH, manifest=manifest, store=store)
+    validation_set = [item for item in validation_set if item['path'] not in journal.done]
+    production_set = [item for item in production_set if item['path'] not in journal.done]
+    if WATCH:
+        # The watcher picks up the backlog and every later upload
+        validation_set, production_set = [], []
     
-    all_results = []
     validation_results = []
     
-    # Process validation set
-    print("\n" + "="*70)
-    print(f"PHASE 1: VALIDATION ({len(validation_set)} images)")
-    print("="*70)
+    # Next batches are read (and decoded, unless their result is cached) in the
+    # background during inference
+    prefetcher = Prefetcher(
+        decode=None if pipeline is None else lambda ctx: PREFILTER or not pipeline.is_cached(ctx)
+    )
+    worker_pool = WorkerPool(NUM_WORKERS, cache=result_cache) if NUM_WORKERS > 1 else None
     
-    for i, item in enumerate(validation_set, 1):
-        print(f"[{i:4d}/{len(validation_set)}] {item['name']:<40}", end=" ", flush=True)
+    # Process validation set
+    if validation_set:
+        print("\n" + "="*70)
+        print(f"PHASE 1: VALIDATION ({len(validation_set)} images)")
+        print("="*70)
         
-        try:
-            row, img_path = process_image(item, pipeline)
-            all_results.append(row)
-            validation_results.append((row, img_path))
-            print("✓")
-        except Exception as e:
-            print(f"✗ {e}")
+        for i, (row, image) in enumerate(iter_rows(validation_set, pipeline, prefetcher, worker_pool, audit=True), 1):
+            print(f"[{i:4d}/{len(validation_set)}] {row['Filename']:<40} ✓")
+            if isinstance(image, ImageContext):
+                journal.append(row, image.path)
+                validation_results.append((row, image.thumbnail() if VALIDATION_SHEETS else image.path))
+                image.release()
+            else:
+                journal.append(row, image)
+                validation_results.append((row, image))
     
     # Generate validation sheets
     if VALIDATION_SHEETS:
@@ -362,37 +2445,72 @@ if __name__ == "__main__":
         print(f"PHASE 2: PRODUCTION ({len(production_set)} images)")
         print("="*70)
         
-        for i, item in enumerate(production_set, 1):
-            print(f"[{i:4d}/{len(production_set)}] {item['name']:<40}", end=" ", flush=True)
-            
-            try:
-                row, _ = process_image(item, pipeline)
-                all_results.append(row)
-                print("✓")
-                
-                # Save checkpoint
-                if i % SAVE_INTERVAL == 0:
-                    checkpoint_path = os.path.join(
-                        OUTPUT_FOLDER,
-                        f"checkpoint_{i}_{TIMESTAMP}.csv"
-                    )
-                    pd.DataFrame(all_results).to_csv(checkpoint_path, index=False)
-                    print(f"  💾 Checkpoint saved")
-            
-            except Exception as e:
-                print(f"✗ {e}")
+        for i, (row, image) in enumerate(iter_rows(production_set, pipeline, prefetcher, worker_pool), 1):
+            print(f"[{i:4d}/{len(production_set)}] {row['Filename']:<40} ✓")
+            if isinstance(image, ImageContext):
+                journal.append(row, image.path)
+                image.release()
+            else:
+                journal.append(row, image)
+    
+    if WATCH:
+        print("\n" + "="*70)
+        print("WATCH MODE (Ctrl+C to stop)")
+        print("="*70)
+        
+        def handle(items):
+            finished = []
+            for row, image in iter_rows(items, pipeline, prefetcher, worker_pool):
+                path = image.path if isinstance(image, ImageContext) else image
+                print(f"[{row['Site']}] {row['Filename']:<40} ✓")
+                journal.append(row, path)
+                if isinstance(image, ImageContext):
+                    image.release()
+                finished.append(path)
+            journal.sync()
+            return finished
+        
+        watch_folders(manifest, handle)
+    
+    journal.close()
+    prefetcher.close()
+    if result_cache is not None:
+        result_cache.flush()
+    if manifest is not None:
+        manifest.close()
+    if worker_pool is not None:
+        worker_pool.close()
     
     # Save final results
     print("\n" + "="*70)
     print("SAVING RESULTS")
     print("="*70)
     
-    output_path = os.path.join(OUTPUT_FOLDER, f"Results_Pipeline_Only_{TIMESTAMP}.csv")
-    results_df = pd.DataFrame(all_results)
-    results_df.to_csv(output_path, index=False, encoding='utf-8-sig')
+    # Every journaled row (including resumed runs) is in the results store;
+    # the full table is only loaded for the optional analyses below
+    store.flush()
+    needs_frame = OUTPUT_FORMAT in ("parquet", "both") or any([SEQUENCE_GROUPING, PREFILTER])
+    results_df = store.dataframe() if needs_frame else None
+    
+    if OUTPUT_FORMAT in ("csv", "both"):
+        output_path = os.path.join(OUTPUT_FOLDER, f"Results_Pipeline_Only_{TIMESTAMP}.csv")
+        store.export_csv(output_path)
+        print(f"✓ Results saved: {output_path}")
     
-    print(f"✓ Results saved: {output_path}")
-    print(f"✓ Total images processed: {len(all_results)}")
+    db_path = os.path.join(OUTPUT_FOLDER, f"Results_Pipeline_Only_{TIMESTAMP}.sqlite")
+    store.backup(db_path)
+    print(f"✓ Results database saved: {db_path}")
+    
+    if SEQUENCE_GROUPING and 'Sequence_ID' in results_df:
+        sequences_path = os.path.join(OUTPUT_FOLDER, f"Sequences_Pipeline_Only_{TIMESTAMP}.csv")
+        summarize_sequences(results_df).to_csv(sequences_path, index=False, encoding='utf-8-sig')
+        print(f"✓ Sequence counts saved: {sequences_path}")
+    
+    if OUTPUT_FORMAT in ("parquet", "both") and not results_df.empty:
+        dataset_path = os.path.join(OUTPUT_FOLDER, f"Results_Pipeline_Only_{TIMESTAMP}.parquet")
+        save_parquet(results_df, dataset_path)
+        print(f"✓ Parquet dataset saved: {dataset_path}")
+    print(f"✓ Total images processed: {len(store)}")
     print(f"✓ Output folder: {OUTPUT_FOLDER}")
     
     # Summary statistics
@@ -400,12 +2518,26 @@ if __name__ == "__main__":
     print("SUMMARY STATISTICS")
     print("="*70)
     
+    totals = store.site_totals('Pipeline')
+    images = totals['Images'].sum()
     print("\nPipeline Method (MegaDetector + CLIP):")
-    print(f"  Total humans detected: {results_df['Pipeline_Total'].sum()}")
-    print(f"  Average per image: {results_df['Pipeline_Total'].mean():.2f}")
-    print(f"  Images with people: {(results_df['Pipeline_Total'] > 0).sum()}")
-    print(f"  Adults detected: {results_df['Pipeline_Adult'].sum()}")
-    print(f"  Children detected: {results_df['Pipeline_Child'].sum()}")
+    print(f"  Total humans detected: {totals['Total'].sum()}")
+    print(f"  Average per image: {totals['Total'].sum() / max(images, 1):.2f}")
+    print(f"  Images with people: {totals['Images_With_People'].sum()}")
+    print(f"  Adults detected: {totals['Adult'].sum()}")
+    print(f"  Children detected: {totals['Child'].sum()}")
+    
+    if PREFILTER and 'Prefilter_Empty' in results_df:
+        print_prefilter_audit(results_df, ['Pipeline_Total'])
+    
+    print("\nPrefetch:")
+    prefetcher.report()
+    
+    if result_cache is not None:
+        print("\nResult Cache:")
+        result_cache.report()
+    
+    store.close()
     
     print("\n" + "="*70)
     print("✅ COMPLETE!")
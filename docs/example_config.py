@@ -79,7 +79,7 @@ VALIDATION_SIZE = 200  # Larger validation for reliability
 MAX_PRODUCTION = None  # Process ALL images in folders
 DEVICE = "cuda"
 
-SAVE_INTERVAL = 100  # Save checkpoint every 100 images
+SAVE_INTERVAL = 100  # Fsync the result journal every 100 images (resume with --resume)
 
 
 # ===========================================================================
@@ -189,12 +189,15 @@ VALIDATION_SHEETS (boolean):
         - Useful for quality control
 
 SAVE_INTERVAL (integer):
-    Save checkpoint CSV every N images
+    Force the result journal to disk every N images
     Default: 50
     Notes:
-        - Saves progress in case of interruption
-        - Creates checkpoint_[number]_[timestamp].csv
-        - Useful for large jobs (100+ images)
+        - Every finished image is appended to
+          OUTPUT_FOLDER/results_journal_[version].jsonl right away
+        - Every N images the journal is also fsynced
+        - After an interruption, run again with --resume (or RESUME = True)
+          to skip images already in the journal
+        - Images whose Claude call failed are retried on --resume
 
 MD_THRESHOLD (float):
     MegaDetector confidence threshold (0.0-1.0)